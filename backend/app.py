@@ -1,18 +1,37 @@
-from fastapi import FastAPI, Query, HTTPException
+from log_config import configure_logging, log_pipeline, log_sampled, RequestContextMiddleware
+configure_logging()  # first: modules imported below may log while loading
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-import yt_dlp
 import os
 import subprocess
 import logging
-from datetime import datetime
 from downloader import get_download_path
-from downloader import preview_video, preview_playlist
-from downloader import download_video, download_playlist
+from downloader import preview_video, preview_playlist, stream_playlist_preview
+from downloader import download_video, download_playlist, resume_playlist_jobs, create_stream_link, serve_seekable
+from downloader import warm_extractors
+from jobs import job_store, stream_job_events
+from stream_links import stream_links
+from ydl_pool import ydl_pool
+from bandwidth import bandwidth, shape, BandwidthMiddleware, INTERACTIVE, BULK
+from preview import preview_renderer, parse_fields, VIDEO_PREVIEW_FIELDS, PLAYLIST_PREVIEW_FIELDS
 from model.download_request import DownloadRequest, PlaylistDownloadRequest
 from utils import sanitize_filename, sanitize_playlist_filename
+from concurrency import run_extraction, close_http_client, extraction_executor, stream_limiter
+from zip_stream import get_active_archive
+from media_cache import media_cache
+from reaper import temp_reaper
+from metadata_cache import metadata_cache
+from scheduler import download_scheduler
+from single_flight import stream_flights, file_flights
+from playlist_stream import playlist_cursors
+from cancellation import cancellation_stats
+from metrics import registry as metrics_registry
+from contextlib import asynccontextmanager
+from typing import Optional
 import shutil
+import asyncio
 import logging
 import time
 import threading
@@ -20,26 +39,21 @@ import threading
 # ────────────────────────────────────────────────
 # 🚀 App Setup
 # ────────────────────────────────────────────────
-app = FastAPI(title="YouTube Downloader API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shutdown: drop pooled upstream connections and pending extractions
+    await close_http_client()
+    extraction_executor.shutdown()
+
+
+app = FastAPI(title="YouTube Downloader API", lifespan=lifespan)
 
 
 
 # ────────────────────────────────────────────────
-# 🧾 Logging Configuration
+# 🧾 Logging — set up once by configure_logging() (log_config.py)
 # ────────────────────────────────────────────────
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = os.path.join(LOG_DIR, f"app_{datetime.now().strftime('%Y%m%d')}.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] — %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()  # prints to console too
-    ],
-)
-
 logger = logging.getLogger("Utility")
 
 
@@ -51,48 +65,46 @@ os.makedirs(BASE_DOWNLOAD_DIR, exist_ok=True)
 
 
 
-def cleanup_temp_dirs(base_dir: str = BASE_DOWNLOAD_DIR, max_age_minutes: int = 2):
-    """
-    Periodically removes old temp directories under download folder.
-    Keeps only active or recent ones.
-    """
-    logger.info(f"🧹 Starting temp folder cleanup task...")
-
-    while True:
-        try:
-            now = time.time()
-            deleted_count = 0
-
-            for root, dirs, _ in os.walk(base_dir):
-                for d in dirs:
-                    dir_path = os.path.join(root, d)
-                    # Only target temp directories created via tempfile
-                    if not os.path.basename(dir_path).startswith("tmp"):
-                        continue
-
-                    age_minutes = (now - os.path.getmtime(dir_path)) / 60
-                    if age_minutes > max_age_minutes:
-                        try:
-                            shutil.rmtree(dir_path)
-                            deleted_count += 1
-                        except Exception as e:
-                            logger.warning(f"⚠️ Failed to remove {dir_path}: {e}")
-
-            if deleted_count > 0:
-                logger.info(f"🧹 Removed {deleted_count} old temp dirs (> {max_age_minutes} mins old)")
-
-        except Exception as e:
-            logger.error(f"❌ Cleanup task error: {e}")
-
-        # Sleep before next cleanup cycle
-        time.sleep(600)  # every 10 minutes
-
-
-
-
-cleanup_thread = threading.Thread(target=cleanup_temp_dirs, daemon=True)
-cleanup_thread.start()
-logger.info("🧼 Background cleanup thread started successfully.")
+# 🧹 Temp dirs are leased by jobs and reaped on release / lease expiry.
+# One reaper per host: every worker calls start(), only the host-lock holder runs it
+# (and adopts leftovers from previous runs / dead workers when it takes over).
+temp_reaper.start(orphan_dirs=[BASE_DOWNLOAD_DIR])
+logger.info("🧼 Temp dir reaper scheduled (runs in one worker per host).")
+
+# 🔥 yt-dlp is imported and pooled YoutubeDL instances are built off the startup path;
+# `/` reports ready once that is done
+warm_extractors()
+
+# ♻️ Playlist jobs whose owner died (restart, crashed worker) continue here — one claimer each
+resumed_jobs = resume_playlist_jobs()
+if resumed_jobs:
+    logger.info(f"♻️ Resumed {resumed_jobs} interrupted playlist job(s).")
+
+# 📈 Component stats sampled on every /metrics scrape (cumulative keys as counters, the rest as gauges)
+for component, stats, help_text, counters in (
+    ("metadata_cache", metadata_cache.stats, "yt-dlp metadata cache", ("hits", "shared_hits", "misses", "evictions")),
+    ("extraction", extraction_executor.stats, "Extraction thread pool", ("rejected", "deferred")),
+    ("streams", stream_limiter.stats, "Upstream media stream slots", ("rejected",)),
+    ("scheduler", download_scheduler.stats, "Download scheduler", ("completed", "failed")),
+    ("stream_flights", stream_flights.stats, "Shared streaming fetches", ("started", "joined")),
+    ("file_flights", file_flights.stats, "Shared playlist downloads", ("started", "joined")),
+    ("media_cache", media_cache.stats, "On-disk media cache", ("hits", "misses", "evictions")),
+    ("temp_reaper", temp_reaper.stats, "Temp dir reaper", ("reclaimed_bytes", "reclaimed_dirs", "expired_leases")),
+    ("playlist_cursors", playlist_cursors.stats, "Playlist preview cursors", ("opened", "resumed")),
+    ("cancellation", cancellation_stats.stats, "Work abandoned after client disconnects",
+     tuple(cancellation_stats.stats())),
+    ("jobs", job_store.stats, "Playlist jobs by state", ()),
+    ("stream_links", stream_links.stats, "Seekable stream links", ("issued", "resolved", "missing")),
+    ("preview", preview_renderer.stats, "Preview payload renderer",
+     ("rendered", "reused", "not_modified", "encode_seconds", "bytes_raw", "bytes_sent")),
+    ("logging", log_pipeline.stats, "Log pipeline", ("dropped", "sampled_out")),
+    ("ydl_pool", ydl_pool.stats, "YoutubeDL instance pool", ("created", "reused", "discarded", "unpooled")),
+    ("bandwidth", bandwidth.stats, "Media egress shaping", ("sent_bytes", "wait_seconds")),
+):
+    metrics_registry.register_stats(component, stats, help_text, counters)
+
+# Media response bodies paced per client / job / global budget (endpoints opt in via shape())
+app.add_middleware(BandwidthMiddleware)
 
 # Enable CORS for frontend connection
 app.add_middleware(
@@ -101,10 +113,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser players / fetch() see range responses
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "Content-Disposition", "ETag",
+                    "X-Request-Id"],
 )
+# Request ID bound to every log line of the request (outermost, so it covers CORS preflights too)
+app.add_middleware(RequestContextMiddleware)
+
+
 
 
 
+def client_id_for(request: Request) -> str:
+    """
+    Fair-share identity for the scheduler: explicit X-Client-Id header if sent,
+    else the first X-Forwarded-For hop (ngrok / proxies), else the peer address.
+    """
+    explicit = request.headers.get("x-client-id")
+    if explicit:
+        return explicit[:64]
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "anonymous"
 
 
 # ────────────────────────────────────────────────
@@ -112,29 +143,89 @@ app.add_middleware(
 # ────────────────────────────────────────────────
 @app.get("/")
 def root():
-    logger.info("Root endpoint hit.")
-    return {"message": "YouTube Downloader API is running 🚀"}
+    """Liveness + readiness: 503 until the extractor pool is warm."""
+    log_sampled(logger, "root", "Root endpoint hit.")
+    ready = ydl_pool.ready.is_set()
+    return JSONResponse(
+        {"message": "YouTube Downloader API is running 🚀", "ready": ready, "warm_seconds": ydl_pool.warm_seconds},
+        status_code=200 if ready else 503,
+    )
+
+
+# 📈 Prometheus scrape endpoint
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # 🎥 Preview available formats (for UI)
 @app.get("/preview")
-def yt_preview_video(url: str, type: str = "single"):
-    logger.info(f"Preview request for URL: {url} as type: {type}")
+async def yt_preview_video(request: Request, url: str, type: str = "single",
+                           fields: Optional[str] = None, urls: bool = False):
+    """
+    Compact preview: null fields and signed URLs (per-format and `preview_url`)
+    are left out (`urls=1` adds them back), `fields=title,duration` selects top-level keys.
+    Bodies are compressed per Accept-Encoding and revalidate with If-None-Match.
+    """
+    log_sampled(logger, "preview_request", "Preview request for URL: %s as type: %s", url, type)
     if type == "playlist":
-        return preview_playlist(url)
+        selected = parse_fields(fields, PLAYLIST_PREVIEW_FIELDS)
+        rendered = await run_extraction(preview_playlist, url, selected, urls)
     else:
-        return preview_video(url)
+        selected = parse_fields(fields, VIDEO_PREVIEW_FIELDS)
+        rendered = await run_extraction(preview_video, url, selected, urls)
+    return preview_renderer.response(rendered, request.headers.get("if-none-match"),
+                                     request.headers.get("accept-encoding"))
+
+# 📋 Progressive playlist preview (paged, streamed as entries resolve)
+@app.get("/preview/playlist")
+async def yt_preview_playlist_stream(url: str, offset: int = 0, limit: Optional[int] = None, format: str = "ndjson"):
+    """
+    Stream one page of playlist entries as NDJSON (default) or SSE (`format=sse`).
+    The final `page_end` event carries `next_offset` for the following page.
+    """
+    log_sampled(logger, "playlist_preview_request", "Streaming playlist preview for URL: %s | offset=%s limit=%s",
+                url, offset, limit)
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(await stream_playlist_preview(url, offset, limit, fmt=format), media_type=media_type)
+
 
 @app.post("/download")
-def yt_download_video(req: DownloadRequest):
-    logger.info(f"Download request: {req}")
+async def yt_download_video(req: DownloadRequest, request: Request):
+    log_sampled(logger, "download_request", "Download request: %s", req)
+    shape(request, client_id_for(request), INTERACTIVE)
     try:
-        return download_video(req)
+        return await download_video(req, range_header=request.headers.get("range"),
+                                    if_range=request.headers.get("if-range"))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Download failed for {req.url} — {type(e).__name__}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# 🔗 Seekable links: resumable downloads and <video> seeking via HTTP Range
+@app.post("/download/link")
+async def yt_download_link(req: DownloadRequest):
+    """
+    Short-lived GET/HEAD URL for a plain video download. Range requests on it
+    are passed through to upstream as 206s (409 for trims / transcodes / merges).
+    """
+    log_sampled(logger, "link_request", "🔗 Seekable link request: %s", req.url)
+    return await create_stream_link(req)
+
+
+@app.api_route("/stream/{token}", methods=["GET", "HEAD"])
+async def stream_link(token: str, request: Request):
+    # Shared-store read + hit count — may wait on another worker's write lock
+    target = await asyncio.to_thread(stream_links.resolve, token)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Link expired or unknown")
+    shape(request, client_id_for(request), INTERACTIVE)
+    return await serve_seekable(target, request.headers.get("range"), request.headers.get("if-range"),
+                                head=request.method == "HEAD")
+
+
 # @app.get("/downloadplaylist")
 # def yt_download_playlist(req: PlaylistDownloadRequest):
 #     logger.info(f"🎧 Playlist download request received: {req.url} | {len(req.video_ids)} videos")
@@ -148,22 +239,60 @@ def yt_download_video(req: DownloadRequest):
 
 # ✅ Updated API endpoint using your request model
 @app.post("/downloadplaylist")
-async def yt_download_playlist(req: PlaylistDownloadRequest):
+async def yt_download_playlist(req: PlaylistDownloadRequest, request: Request):
     """
     POST endpoint for streaming playlist downloads via SSE.
     """
     logger.info(f"🎧 Received playlist download: {req.url} ({len(req.video_ids)} videos)")
 
-    return download_playlist(req)
+    # Job creation writes to the shared store — off the event loop
+    return await asyncio.to_thread(download_playlist, req, client_id=client_id_for(request),
+                                   is_disconnected=request.is_disconnected)
+
+
+# 🧾 Playlist job status / reconnectable event stream
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Snapshot of a playlist job: state, per-video progress and the ZIP link."""
+    snapshot = job_store.snapshot(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return snapshot
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, last_event_id: Optional[int] = Query(None)):
+    """
+    SSE feed of a job from any worker. Resumes after the `Last-Event-ID`
+    header (or `?last_event_id=`) — missed events are replayed, then live.
+    """
+    if await asyncio.to_thread(job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    header = request.headers.get("last-event-id", "")
+    resume_from = int(header) if header.isdigit() else (last_event_id or 0)
+    return StreamingResponse(stream_job_events(job_id, resume_from, request.is_disconnected),
+                             media_type="text/event-stream")
 
 
 # 📦 Serve ZIP file
 @app.get("/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     """
     Serve a downloaded ZIP file to the client.
+    Archives still being built are streamed as they grow (chunked, no Content-Length).
+    Paced as bulk traffic: it gets the capacity interactive downloads leave over.
     """
     file_path = os.path.join(get_download_path(), filename)
+    shape(request, client_id_for(request), BULK, job_id=filename)
+
+    archive = await asyncio.to_thread(get_active_archive, filename)  # shared registry read
+    if archive is not None and not archive.complete:
+        logger.info(f"📤 Streaming in-progress archive: {file_path}")
+        return StreamingResponse(
+            archive.follow(),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
 
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail=f"File not found: {filename}")
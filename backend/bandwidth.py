@@ -0,0 +1,287 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Optional
+
+from metrics import BANDWIDTH_WAIT_SECONDS
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Bandwidth Configuration
+# ────────────────────────────────────────────────
+# Host egress budget in bytes/s, split evenly across workers (0 = unlimited)
+BANDWIDTH_GLOBAL_BPS = int(os.getenv("BANDWIDTH_GLOBAL_BPS", "0"))
+# Cap per client (X-Client-Id / forwarded address) and per playlist job, per worker (0 = unlimited)
+BANDWIDTH_CLIENT_BPS = int(os.getenv("BANDWIDTH_CLIENT_BPS", "0"))
+BANDWIDTH_JOB_BPS = int(os.getenv("BANDWIDTH_JOB_BPS", "0"))
+# Bucket depth, in seconds of the bucket's rate
+BANDWIDTH_BURST_SECONDS = float(os.getenv("BANDWIDTH_BURST_SECONDS", "0.25"))
+# Share of the global budget per active flow when it is contended
+BANDWIDTH_INTERACTIVE_WEIGHT = float(os.getenv("BANDWIDTH_INTERACTIVE_WEIGHT", "4"))
+BANDWIDTH_BULK_WEIGHT = float(os.getenv("BANDWIDTH_BULK_WEIGHT", "1"))
+# Body messages are paced in pieces of at most this many bytes
+BANDWIDTH_QUANTUM = int(os.getenv("BANDWIDTH_QUANTUM", str(64 * 1024)))
+# Time constant of the live rate gauges
+BANDWIDTH_RATE_WINDOW = 2.0
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Scope key an endpoint sets (via shape()) to have its response body paced
+_FLOW_SCOPE_KEY = "avdl.bandwidth_flow"
+
+
+def _worker_count() -> int:
+    # serve.py exports the resolved worker count for its children
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1") or 1))
+
+
+class TokenBucket:
+    """`rate` bytes/s with `burst` bytes of credit; reservations may go into debt."""
+
+    def __init__(self, rate: float, burst_seconds: float = BANDWIDTH_BURST_SECONDS):
+        self.rate = rate
+        self.capacity = max(rate * burst_seconds, BANDWIDTH_QUANTUM)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, nbytes: int) -> float:
+        """Take `nbytes` now; returns the seconds to wait before sending them."""
+        self._refill()
+        self.tokens -= nbytes
+        return max(0.0, -self.tokens / self.rate)
+
+    def ready_in(self) -> float:
+        """Seconds until the bucket is out of debt (0 = can grant now)."""
+        self._refill()
+        return 0.0 if self.tokens > 0 else -self.tokens / self.rate
+
+
+class _Rate:
+    """Exponentially decayed bytes/s, updated per send and read at scrape time."""
+
+    def __init__(self, window: float = BANDWIDTH_RATE_WINDOW):
+        self.window = window
+        self.value = 0.0
+        self.updated = time.monotonic()
+        self.total = 0
+
+    def _decay(self, now: float) -> float:
+        return self.value * math.exp(-(now - self.updated) / self.window)
+
+    def add(self, nbytes: int):
+        now = time.monotonic()
+        self.value = self._decay(now) + nbytes / self.window
+        self.updated = now
+        self.total += nbytes
+
+    def current(self) -> float:
+        return self._decay(time.monotonic())
+
+
+class Flow:
+    """One shaped response body."""
+
+    def __init__(self, client_id: str, priority: str, job_id: Optional[str] = None):
+        self.client_id = client_id
+        self.priority = priority
+        self.job_id = job_id
+        self.weight = BANDWIDTH_INTERACTIVE_WEIGHT if priority == INTERACTIVE else BANDWIDTH_BULK_WEIGHT
+        self.finish_tag = 0.0
+        self.waited = 0.0
+
+
+class BandwidthManager:
+    """
+    Egress shaping for media responses (streams, seekable links, ZIPs).
+
+    A flow first pays its client's and its job's token buckets (hard caps),
+    then queues for the global budget. The global budget is shared by
+    start-time fair queuing: each piece is tagged with a virtual start time
+    and sizes are divided by the flow's weight, so when the budget is
+    contended an interactive download gets BANDWIDTH_INTERACTIVE_WEIGHT
+    times the share of a bulk playlist ZIP. Any capacity interactive flows
+    leave idle goes to bulk flows (work-conserving).
+
+    State is per worker process (one event loop): the global budget is
+    divided by the worker count, and client / job caps apply per worker.
+    """
+
+    def __init__(self, global_bps: int = BANDWIDTH_GLOBAL_BPS, client_bps: int = BANDWIDTH_CLIENT_BPS,
+                 job_bps: int = BANDWIDTH_JOB_BPS):
+        self.global_bps = global_bps / _worker_count() if global_bps > 0 else 0
+        self.client_bps = client_bps
+        self.job_bps = job_bps
+        self._global = TokenBucket(self.global_bps) if self.global_bps > 0 else None
+        self._clients: dict[str, list] = {}  # client id → [bucket, active flows]
+        self._jobs: dict[str, list] = {}     # job id → [bucket, active flows]
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._pump: Optional[asyncio.Task] = None
+        self._rates = {INTERACTIVE: _Rate(), BULK: _Rate()}
+        self._active = {INTERACTIVE: 0, BULK: 0}
+        self.wait_seconds = 0.0
+
+    @property
+    def limited(self) -> bool:
+        return bool(self._global or self.client_bps or self.job_bps)
+
+    # ── flow lifecycle ─────────────────────────────────────────────
+    @staticmethod
+    def _join(table: dict, key: str, rate: int):
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = [TokenBucket(rate), 0]
+        entry[1] += 1
+
+    @staticmethod
+    def _leave(table: dict, key: str):
+        entry = table.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del table[key]
+
+    def open(self, flow: Flow):
+        self._active[flow.priority] += 1
+        if self.client_bps:
+            self._join(self._clients, flow.client_id, self.client_bps)
+        if self.job_bps and flow.job_id:
+            self._join(self._jobs, flow.job_id, self.job_bps)
+
+    def close(self, flow: Flow):
+        self._active[flow.priority] -= 1
+        if self.client_bps:
+            self._leave(self._clients, flow.client_id)
+        if self.job_bps and flow.job_id:
+            self._leave(self._jobs, flow.job_id)
+        if self.limited:
+            BANDWIDTH_WAIT_SECONDS.observe(flow.waited, priority=flow.priority)
+
+    # ── pacing ─────────────────────────────────────────────────────
+    async def acquire(self, flow: Flow, nbytes: int):
+        """Wait until `flow` may send `nbytes`."""
+        started = time.monotonic()
+        delay = 0.0
+        if self.client_bps:
+            delay = self._clients[flow.client_id][0].reserve(nbytes)
+        if self.job_bps and flow.job_id:
+            delay = max(delay, self._jobs[flow.job_id][0].reserve(nbytes))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._global is not None:
+            await self._fair_share(flow, nbytes)
+        waited = time.monotonic() - started
+        flow.waited += waited
+        self.wait_seconds += waited
+
+    async def _fair_share(self, flow: Flow, nbytes: int):
+        start = max(self._vtime, flow.finish_tag)
+        flow.finish_tag = start + nbytes / flow.weight
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (start, next(self._seq), nbytes, future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Grant queued pieces in start-tag order as the global bucket refills."""
+        while self._heap:
+            start, _, nbytes, future = self._heap[0]
+            if future.done():  # waiter went away (client disconnected)
+                heapq.heappop(self._heap)
+                continue
+            delay = self._global.ready_in()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            heapq.heappop(self._heap)
+            self._vtime = start
+            self._global.reserve(nbytes)
+            future.set_result(None)
+
+    def sent(self, flow: Flow, nbytes: int):
+        self._rates[flow.priority].add(nbytes)
+
+    def stats(self) -> dict:
+        interactive = self._rates[INTERACTIVE].current()
+        bulk = self._rates[BULK].current()
+        return {
+            "egress_bps": round(interactive + bulk),
+            "interactive_bps": round(interactive),
+            "bulk_bps": round(bulk),
+            "interactive_flows": self._active[INTERACTIVE],
+            "bulk_flows": self._active[BULK],
+            "queued": len(self._heap),
+            "global_limit_bps": round(self.global_bps),
+            "sent_bytes": self._rates[INTERACTIVE].total + self._rates[BULK].total,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+bandwidth = BandwidthManager()
+
+
+def shape(request, client_id: str, priority: str = INTERACTIVE, job_id: Optional[str] = None):
+    """Pace this request's response body (see BandwidthMiddleware)."""
+    request.scope[_FLOW_SCOPE_KEY] = Flow(client_id, priority, job_id)
+
+
+class BandwidthMiddleware:
+    """
+    Pure ASGI middleware pacing the body of responses whose endpoint called
+    `shape()` — streaming generators and FileResponses alike. Other responses
+    pass through untouched.
+    """
+
+    def __init__(self, app, manager: BandwidthManager = bandwidth):
+        self.app = app
+        self.manager = manager
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        manager = self.manager
+        if manager.limited and "http.response.pathsend" in scope.get("extensions", {}):
+            # Zero-copy file sends would bypass pacing
+            scope["extensions"] = {k: v for k, v in scope["extensions"].items() if k != "http.response.pathsend"}
+        opened: list[Flow] = []
+
+        async def shaped_send(message):
+            flow = scope.get(_FLOW_SCOPE_KEY)
+            if flow is None or message["type"] != "http.response.body":
+                return await send(message)
+            if not opened:
+                manager.open(flow)
+                opened.append(flow)
+            body = message.get("body", b"")
+            if not manager.limited or len(body) <= BANDWIDTH_QUANTUM:
+                if body and manager.limited:
+                    await manager.acquire(flow, len(body))
+                manager.sent(flow, len(body))
+                return await send(message)
+
+            more_body = message.get("more_body", False)
+            view = memoryview(body)
+            for offset in range(0, len(body), BANDWIDTH_QUANTUM):
+                piece = bytes(view[offset:offset + BANDWIDTH_QUANTUM])
+                await manager.acquire(flow, len(piece))
+                manager.sent(flow, len(piece))
+                last = offset + BANDWIDTH_QUANTUM >= len(body)
+                await send({"type": "http.response.body", "body": piece, "more_body": more_body or not last})
+
+        try:
+            await self.app(scope, receive, shaped_send)
+        finally:
+            if opened:
+                manager.close(opened[0])
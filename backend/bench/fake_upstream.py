@@ -0,0 +1,205 @@
+"""
+Fake googlevideo-style media server for offline benchmarks.
+
+Every URL is self-describing, so the stub extractor can hand out format URLs
+without any shared config:
+
+    /media/<video_id>/<format_id>?size=BYTES&rate=BYTES_PER_SEC&fail403=N&drop=BYTES&sig=...
+
+- size     synthetic body length (deterministic bytes, so resumed/parallel
+           downloads can be verified byte for byte)
+- rate     per-connection throttle, 0 = unthrottled
+- fail403  the first N requests for this path (ignoring `sig`) get a 403,
+           like an expired signature
+- drop     the first request for this path that would cross this byte offset
+           closes the connection there, like a flaky CDN edge
+
+Range requests (`bytes=a-b`, `bytes=a-`) are answered with 206.
+
+    python -m bench.fake_upstream --port 8790
+"""
+import re
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+BLOCK_SIZE = 1024 * 1024
+WRITE_SIZE = 64 * 1024
+# 1 MiB repeating pattern; byte i of any body is PATTERN[i % BLOCK_SIZE]
+PATTERN = bytes(range(256)) * (BLOCK_SIZE // 256)
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def expected_bytes(start: int, length: int) -> bytes:
+    """The synthetic body slice [start, start + length) — for verifying downloads."""
+    out = bytearray()
+    while length > 0:
+        offset = start % BLOCK_SIZE
+        piece = PATTERN[offset:offset + length]
+        out += piece
+        start += len(piece)
+        length -= len(piece)
+    return bytes(out)
+
+
+class UpstreamState:
+    """Per-path fault counters, so injected failures happen once and retries recover."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.dropped = set()
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def hit(self, path: str) -> int:
+        with self._lock:
+            self.requests += 1
+            self.hits[path] += 1
+            return self.hits[path]
+
+    def claim_drop(self, path: str) -> bool:
+        with self._lock:
+            if path in self.dropped:
+                return False
+            self.dropped.add(path)
+            return True
+
+    def sent(self, n: int):
+        with self._lock:
+            self.bytes_sent += n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "bytes_sent": self.bytes_sent, "paths": len(self.hits)}
+
+
+class FakeMediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeUpstream/1.0"
+    state: UpstreamState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self) -> tuple[str, dict]:
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        return parts.path, query
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body: bool):
+        path, query = self._params()
+        if path == "/stats":
+            return self._send_json(json.dumps(self.state.stats()))
+        if not path.startswith("/media/"):
+            self.send_error(404)
+            return
+
+        size = int(query.get("size", 8 * BLOCK_SIZE))
+        rate = float(query.get("rate", 0))
+        fail403 = int(query.get("fail403", 0))
+        drop = int(query.get("drop", 0))
+
+        if self.state.hit(path) <= fail403:
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        header = self.headers.get("Range")
+        match = _RANGE_RE.match(header or "")
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        length = end - start + 1
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        if not body:
+            return
+
+        # Drop once, mid-body, if this request spans the drop offset
+        cut = None
+        if drop and start < drop <= end and self.state.claim_drop(path):
+            cut = drop
+
+        position = start
+        began = time.monotonic()
+        try:
+            while position <= end:
+                n = min(WRITE_SIZE, end - position + 1)
+                if cut is not None and position + n > cut:
+                    n = cut - position
+                if n > 0:
+                    self.wfile.write(expected_bytes(position, n))
+                    self.state.sent(n)
+                    position += n
+                if cut is not None and position >= cut:
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                if rate:
+                    ahead = (position - start) / rate - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_json(self, payload: str):
+        data = payload.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # 100+ clients × parallel ranges connect at once
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0) -> FakeUpstreamServer:
+    handler = type("Handler", (FakeMediaHandler,), {"state": UpstreamState()})
+    return FakeUpstreamServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake media upstream for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port)
+    print(f"fake upstream listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Offline benchmark runner.
+
+Starts the fake upstream, then for every (scenario, concurrency) pair a fresh
+backend process (so peak RSS belongs to that pair alone), drives it with N
+concurrent clients and records:
+
+- throughput   aggregate response bytes / wall time
+- TTFB         request sent → first response body byte (p50 / p99)
+- peak RSS     server high-water mark
+- CPU / GiB    server user+sys seconds per GiB delivered
+- upstream     requests and bytes pulled from the fake upstream
+
+    cd backend
+    python -m bench.run                                  # all scenarios at 1/10/100 clients
+    python -m bench.run -s download -c 1,10 --size 33554432
+    python -m bench.run --compare bench/results/baseline.json
+
+Results are written as JSON (bench/results/<timestamp>.json by default);
+`--compare` prints deltas against a previous file and exits 1 on regressions
+beyond `--tolerance`.
+"""
+import os
+import sys
+import json
+import time
+import math
+import base64
+import hashlib
+import socket
+import asyncio
+import argparse
+import platform
+import shutil
+import tempfile
+import subprocess
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from bench.fake_upstream import expected_bytes
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "bench", "results")
+MIB = 1024 * 1024
+GIB = 1024 * MIB
+
+
+# ────────────────────────────────────────────────
+# 🧪 Scenarios
+# ────────────────────────────────────────────────
+@dataclass
+class Sample:
+    ttfb: Optional[float] = None
+    nbytes: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    run: Callable[["RunContext", httpx.AsyncClient, str], Awaitable[Sample]]
+    min_requests: int = 20          # per level; spread across the clients
+    stub: dict = field(default_factory=dict)  # stub extractor overrides
+
+
+@dataclass
+class RunContext:
+    base_url: str
+    size: int
+    verify: bool
+    playlist_videos: int
+
+
+def make_video_id(*parts) -> str:
+    """Unique 11-char YouTube-style ID (shorter/longer IDs would collide in normalize_media_key)."""
+    digest = hashlib.sha1("/".join(map(str, parts)).encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode()[:11]
+
+
+def _watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+async def _read_body(response: httpx.Response, started: float, sample: Sample, verify: bool):
+    offset = 0
+    async for chunk in response.aiter_raw():
+        if sample.ttfb is None:
+            sample.ttfb = time.perf_counter() - started
+        if verify and chunk != expected_bytes(offset, len(chunk)):
+            raise ValueError(f"body mismatch at byte {offset}")
+        offset += len(chunk)
+    sample.nbytes = offset
+
+
+async def _post_download(ctx: RunContext, client: httpx.AsyncClient, video_id: str, **body) -> Sample:
+    sample = Sample()
+    started = time.perf_counter()
+    payload = {"url": _watch_url(video_id), "type": "single", "mode": "video", "format_id": "18", **body}
+    async with client.stream("POST", f"{ctx.base_url}/download", json=payload) as r:
+        if r.status_code != 200:
+            await r.aread()
+            sample.error = str(r.status_code)
+            return sample
+        await _read_body(r, started, sample, ctx.verify)
+    if sample.nbytes != ctx.size:
+        sample.error = "short_body"
+    return sample
+
+
+async def run_download(ctx, client, video_id):
+    return await _post_download(ctx, client, video_id)
+
+
+async def run_download_parallel(ctx, client, video_id):
+    return await _post_download(ctx, client, video_id, connections=4, chunk_size=MIB)
+
+
+async def run_preview(ctx, client, video_id):
+    sample = Sample()
+    started = time.perf_counter()
+    async with client.stream("GET", f"{ctx.base_url}/preview", params={"url": _watch_url(video_id)}) as r:
+        async for chunk in r.aiter_raw():
+            if sample.ttfb is None:
+                sample.ttfb = time.perf_counter() - started
+            sample.nbytes += len(chunk)
+    if r.status_code != 200:
+        sample.error = str(r.status_code)
+    return sample
+
+
+async def run_playlist(ctx, client, video_id):
+    """SSE job to completion, then fetch the ZIP. Bytes are the archive size."""
+    sample = Sample()
+    started = time.perf_counter()
+    body = {
+        "url": f"https://www.youtube.com/playlist?list={video_id}",
+        "video_ids": [make_video_id(video_id, i) for i in range(ctx.playlist_videos)],
+        "playlist_title": "bench",
+    }
+    zip_url = None
+    async with client.stream("POST", f"{ctx.base_url}/downloadplaylist", json=body) as r:
+        if r.status_code != 200:
+            await r.aread()
+            sample.error = str(r.status_code)
+            return sample
+        async for line in r.aiter_lines():
+            if sample.ttfb is None:
+                sample.ttfb = time.perf_counter() - started
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event["event"] == "completed":
+                zip_url = event["zip_url"]
+            elif event["event"] == "error" and event.get("video_index") is None:
+                sample.error = "job_error"
+    if not zip_url:
+        sample.error = sample.error or "no_archive"
+        return sample
+    async with client.stream("GET", f"{ctx.base_url}{zip_url}") as r:
+        async for chunk in r.aiter_raw():
+            sample.nbytes += len(chunk)
+    return sample
+
+
+SCENARIOS = {s.name: s for s in [
+    Scenario("preview", "GET /preview — extraction + format listing", run_preview, min_requests=50),
+    Scenario("download", "POST /download, single upstream connection", run_download),
+    Scenario("download_parallel", "POST /download, connections=4 × 1 MiB ranges", run_download_parallel),
+    Scenario("download_faults", "POST /download with a 403 and a mid-body drop per URL",
+             run_download, stub={"fail403": 1, "drop": "half"}),
+    Scenario("playlist", "POST /downloadplaylist → SSE → ZIP", run_playlist, min_requests=5),
+]}
+
+
+# ────────────────────────────────────────────────
+# 🚦 Processes
+# ────────────────────────────────────────────────
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with {proc.returncode} before becoming ready")
+        try:
+            # The app answers 503 until its extractor pool is warm
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _spawn(module: str, port: int, cwd: str, env: dict, log_name: str) -> subprocess.Popen:
+    log = open(os.path.join(cwd, log_name), "ab")
+    return subprocess.Popen(
+        [sys.executable, "-m", module, "--port", str(port)],
+        cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def _stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _base_env(extra: dict) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+    env.setdefault("MEDIA_CACHE_ENABLED", "0")  # every request should hit the upstream path
+    env.update(extra)
+    return env
+
+
+# ────────────────────────────────────────────────
+# 📏 Measurement
+# ────────────────────────────────────────────────
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 2)
+
+
+async def _drive(scenario: Scenario, ctx: RunContext, concurrency: int, tag: str) -> tuple[list[Sample], float]:
+    rounds = max(1, math.ceil(scenario.min_requests / concurrency))
+    limits = httpx.Limits(max_connections=concurrency * 2 + 10, max_keepalive_connections=concurrency + 10)
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(600.0), limits=limits) as client:
+        async def one_client(n: int) -> list[Sample]:
+            samples = []
+            for r in range(rounds):
+                video_id = make_video_id(tag, n, r)
+                try:
+                    samples.append(await scenario.run(ctx, client, video_id))
+                except Exception as e:
+                    samples.append(Sample(error=type(e).__name__))
+            return samples
+
+        started = time.perf_counter()
+        per_client = await asyncio.gather(*(one_client(n) for n in range(concurrency)))
+        wall = time.perf_counter() - started
+    return [s for batch in per_client for s in batch], wall
+
+
+def run_level(scenario: Scenario, concurrency: int, args, upstream_url: str, workdir: str) -> dict:
+    stub = {"upstream": upstream_url, "extract_delay": args.extract_delay, "rate": args.rate}
+    stub["formats"] = [
+        {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "height": 360,
+         "size": args.size},
+        {"format_id": "137", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none", "height": 1080,
+         "size": args.playlist_size},
+        {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2", "abr": 129.5,
+         "size": max(1, args.playlist_size // 8)},
+    ]
+    for key, value in scenario.stub.items():
+        stub[key] = args.size // 2 if value == "half" else value
+
+    level_dir = tempfile.mkdtemp(prefix=f"{scenario.name}-{concurrency}-", dir=workdir)
+    port = _free_port()
+    env = _base_env({**args.env, "BENCH_STUB_CONFIG": json.dumps(stub)})
+    server = _spawn("bench.server", port, level_dir, env, "server.log")
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(f"{base_url}/", server)
+        before = httpx.get(f"{base_url}/__bench__/usage").json()
+        upstream_before = httpx.get(f"{upstream_url}/stats").json()
+
+        ctx = RunContext(base_url, args.size, args.verify, args.playlist_videos)
+        samples, wall = asyncio.run(_drive(scenario, ctx, concurrency, f"{scenario.name}c{concurrency}"))
+
+        after = httpx.get(f"{base_url}/__bench__/usage").json()
+        upstream_after = httpx.get(f"{upstream_url}/stats").json()
+    finally:
+        _stop(server)
+
+    ok = [s for s in samples if s.error is None]
+    ttfbs = [s.ttfb for s in ok if s.ttfb is not None]
+    nbytes = sum(s.nbytes for s in ok)
+    cpu = after["cpu_s"] - before["cpu_s"]
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": dict(Counter(s.error for s in samples if s.error)),
+        "bytes": nbytes,
+        "wall_s": round(wall, 3),
+        "throughput_mib_s": round(nbytes / MIB / wall, 2) if wall else None,
+        "requests_per_s": round(len(ok) / wall, 2) if wall else None,
+        "ttfb_ms": {
+            "p50": _ms(percentile(ttfbs, 50)),
+            "p99": _ms(percentile(ttfbs, 99)),
+            "mean": _ms(sum(ttfbs) / len(ttfbs)) if ttfbs else None,
+        },
+        "server": {
+            "peak_rss_mib": round(after["peak_rss_bytes"] / MIB, 1),
+            "cpu_s": round(cpu, 3),
+            "cpu_s_per_gib": round(cpu / (nbytes / GIB), 3) if nbytes else None,
+        },
+        "upstream": {
+            "requests": upstream_after["requests"] - upstream_before["requests"],
+            "bytes": upstream_after["bytes_sent"] - upstream_before["bytes_sent"],
+        },
+    }
+
+
+# ────────────────────────────────────────────────
+# 📊 Reporting
+# ────────────────────────────────────────────────
+# (label, path into a result, True if higher is better)
+COMPARED = [
+    ("throughput", ("throughput_mib_s",), True),
+    ("req/s", ("requests_per_s",), True),
+    ("ttfb p50", ("ttfb_ms", "p50"), False),
+    ("ttfb p99", ("ttfb_ms", "p99"), False),
+    ("peak rss", ("server", "peak_rss_mib"), False),
+    ("cpu/GiB", ("server", "cpu_s_per_gib"), False),
+]
+
+
+def _dig(result: dict, path: tuple):
+    for key in path:
+        result = (result or {}).get(key)
+    return result
+
+
+def print_result(r: dict):
+    errors = f" errors={r['errors']}" if r["errors"] else ""
+    print(
+        f"  {r['scenario']:<18} c={r['concurrency']:<4} ok={r['ok']}/{r['requests']}"
+        f"  {r['throughput_mib_s'] or 0:>8.1f} MiB/s"
+        f"  ttfb p50={r['ttfb_ms']['p50']}ms p99={r['ttfb_ms']['p99']}ms"
+        f"  rss={r['server']['peak_rss_mib']}MiB  cpu/GiB={r['server']['cpu_s_per_gib']}s{errors}",
+        flush=True,
+    )
+
+
+def compare(current: list[dict], baseline_path: str, tolerance: float) -> int:
+    """Print per-metric deltas against a baseline file; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nComparison against {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in current:
+        old = baseline.get((r["scenario"], r["concurrency"]))
+        if not old:
+            continue
+        cells = []
+        for label, path, higher_is_better in COMPARED:
+            new_value, old_value = _dig(r, path), _dig(old, path)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                regressions += 1
+                flag = " ✗"
+            cells.append(f"{label} {change:+.1%}{flag}")
+        print(f"  {r['scenario']:<18} c={r['concurrency']:<4} " + "  ".join(cells))
+    return regressions
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_env(pairs: list[str]) -> dict:
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--env expects KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a fake upstream")
+    parser.add_argument("-s", "--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("-c", "--concurrency", default="1,10,100", help="comma-separated client counts")
+    parser.add_argument("--size", type=int, default=8 * MIB, help="bytes per /download response")
+    parser.add_argument("--playlist-size", type=int, default=2 * MIB, help="bytes per playlist video track")
+    parser.add_argument("--playlist-videos", type=int, default=3, help="videos per playlist job")
+    parser.add_argument("--rate", type=int, default=0, help="upstream bytes/s per connection (0 = unthrottled)")
+    parser.add_argument("--extract-delay", type=float, default=0.05, help="stub extraction latency in seconds")
+    parser.add_argument("--verify", action="store_true", help="check every /download body byte for byte")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the backend (repeatable)")
+    parser.add_argument("-o", "--output", help="results file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="previous results file to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--keep-scratch", action="store_true", help="keep server logs and downloads")
+    args = parser.parse_args(argv)
+    args.env = _parse_env(args.env)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="avdl-bench-")
+    upstream_port = _free_port()
+    upstream = _spawn("bench.fake_upstream", upstream_port, workdir, _base_env({}), "upstream.log")
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    results = []
+    try:
+        _wait_ready(f"{upstream_url}/stats", upstream)
+        print(f"🧪 benchmarking {', '.join(names)} at {levels} clients | scratch dir {workdir}")
+        for name in names:
+            for concurrency in levels:
+                result = run_level(SCENARIOS[name], concurrency, args, upstream_url, workdir)
+                results.append(result)
+                print_result(result)
+    finally:
+        _stop(upstream)
+        if not args.keep_scratch:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep_scratch")},
+    }
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"📄 results written to {output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+The real FastAPI app with the stub extractor installed, plus a
+`/__bench__/usage` route the runner reads for CPU time and peak RSS.
+Run from a scratch directory (the app writes logs/ and downloads/ to cwd):
+
+    BENCH_STUB_CONFIG='{"upstream": "http://127.0.0.1:8790"}' \
+        PYTHONPATH=/path/to/backend python -m bench.server --port 8791
+"""
+import sys
+import argparse
+import resource
+
+import uvicorn
+
+from bench import stub_extractor
+
+
+def usage() -> dict:
+    """Process CPU seconds and peak RSS (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {"cpu_s": ru.ru_utime + ru.ru_stime, "peak_rss_bytes": ru.ru_maxrss * scale}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend under benchmark (stubbed extractor)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8791)
+    args = parser.parse_args()
+
+    stub_extractor.install()
+    from app import app  # after install(): module-level code must see the stub
+
+    app.add_api_route("/__bench__/usage", usage, methods=["GET"])
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
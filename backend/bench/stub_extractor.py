@@ -0,0 +1,217 @@
+"""
+Drop-in stand-in for `yt_dlp.YoutubeDL` that never touches the network except
+the fake upstream. It covers the surface this backend uses:
+`extract_info(url, download=False)` for previews/streams and
+`extract_info(url, download=True)` with progress/postprocessor hooks for
+playlist jobs.
+
+Config (JSON in BENCH_STUB_CONFIG, see DEFAULT_CONFIG) sets the upstream,
+the format list, per-format sizes, extraction latency and injected faults.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import http.cookiejar
+import urllib.request
+from typing import Optional
+from urllib.parse import urlencode, urlsplit, parse_qs
+
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadCancelled
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CONFIG = {
+    "upstream": "http://127.0.0.1:8790",
+    "extract_delay": 0.05,  # seconds per extract_info — real yt-dlp is 0.5–3 s
+    "duration": 120,
+    "rate": 0,              # per-connection upstream throttle (bytes/s), 0 = unthrottled
+    "fail403": 0,           # 403s before each format URL starts working
+    "drop": 0,              # byte offset where the first fetch of each URL is cut
+    "formats": [
+        {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "height": 360,
+         "size": 8 * 1024 * 1024},
+        {"format_id": "137", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none", "height": 1080,
+         "size": 16 * 1024 * 1024},
+        {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2", "abr": 129.5,
+         "size": 2 * 1024 * 1024},
+    ],
+}
+
+DOWNLOAD_CHUNK = 256 * 1024
+
+
+def load_config(raw: Optional[str] = None) -> dict:
+    config = dict(DEFAULT_CONFIG)
+    config.update(json.loads(raw or os.getenv("BENCH_STUB_CONFIG") or "{}"))
+    return config
+
+
+def video_id_for(url: str) -> str:
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    if "v" in query:
+        return query["v"][0]
+    return parts.path.rstrip("/").rsplit("/", 1)[-1] or "video"
+
+
+class StubYoutubeDL:
+    config: dict = DEFAULT_CONFIG
+
+    def __init__(self, params: Optional[dict] = None, auto_init=True):
+        self.params = params or {}
+        self.cookiejar = http.cookiejar.CookieJar()  # cleared by the app's YoutubeDL pool on release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    # ── extraction ─────────────────────────────────────────────────
+    def _format(self, video_id: str, spec: dict) -> dict:
+        cfg = self.config
+        query = {"size": spec["size"], "sig": uuid.uuid4().hex[:12]}  # fresh "signature" per extraction
+        for fault in ("rate", "fail403", "drop"):
+            value = spec.get(fault, cfg[fault])
+            if value:
+                query[fault] = value
+        fmt = {
+            **spec,
+            "url": f"{cfg['upstream']}/media/{video_id}/{spec['format_id']}?{urlencode(query)}",
+            "filesize": spec["size"],
+            "protocol": "https",
+            "http_headers": {},
+        }
+        fmt.pop("size")
+        if fmt.get("height"):
+            fmt["resolution"] = f"{fmt['height']}p"
+        return fmt
+
+    def _info(self, url: str) -> dict:
+        video_id = video_id_for(url)
+        return {
+            "id": video_id,
+            "title": f"Bench video {video_id}",
+            "webpage_url": url,
+            "duration": self.config["duration"],
+            "thumbnail": f"{self.config['upstream']}/thumb/{video_id}.jpg",
+            "formats": [self._format(video_id, spec) for spec in self.config["formats"]],
+        }
+
+    sanitize_info = staticmethod(YoutubeDL.sanitize_info)
+
+    def extract_info(self, url: str, download: bool = True, process: bool = True, **kwargs) -> Optional[dict]:
+        time.sleep(self.config["extract_delay"])
+        return self.process_ie_result(self._info(url), download=download)
+
+    def process_ie_result(self, info: dict, download: bool = True, extra_info: Optional[dict] = None) -> Optional[dict]:
+        """Download from an already-extracted info dict (no extraction delay)."""
+        if not download:
+            return info
+        try:
+            self._download(info)
+        except DownloadCancelled:
+            raise
+        except Exception as e:
+            if not self.params.get("ignoreerrors"):
+                raise
+            self._report_error(f"{type(e).__name__}: {e}")
+            return None
+        return info
+
+    # ── download (playlist jobs) ───────────────────────────────────
+    def _pick(self, formats: list) -> list:
+        """`bestvideo+bestaudio/best` → one video-only + one audio-only when both exist."""
+        video = [f for f in formats if f.get("acodec") == "none"]
+        audio = [f for f in formats if f.get("vcodec") == "none"]
+        if "+" in (self.params.get("format") or "") and video and audio:
+            return [max(video, key=lambda f: f.get("height") or 0), max(audio, key=lambda f: f.get("abr") or 0)]
+        combined = [f for f in formats if f not in video and f not in audio] or formats
+        return [max(combined, key=lambda f: f.get("height") or 0)]
+
+    def _hooks(self, name: str, payload: dict):
+        for hook in self.params.get(name) or []:
+            hook(payload)
+
+    def _report_error(self, msg: str):
+        log = self.params.get("logger")
+        if log:
+            log.error(msg)
+        else:
+            logger.error(msg)
+
+    def _fetch(self, fmt: dict, path: str):
+        """Like yt-dlp: download to `<path>.part`, continuing a leftover one with a Range request."""
+        total = fmt["filesize"]
+        if os.path.exists(path):
+            return  # "has already been downloaded"
+        tmp = f"{path}.part"
+        done = os.path.getsize(tmp) if self.params.get("continuedl", True) and os.path.exists(tmp) else 0
+        request = urllib.request.Request(fmt["url"])
+        if done:
+            request.add_header("Range", f"bytes={done}-")
+        resumed_from = done
+        started = time.monotonic()
+        with urllib.request.urlopen(request, timeout=60) as r, open(tmp, "ab" if done else "wb") as out:
+            while True:
+                chunk = r.read(DOWNLOAD_CHUNK)
+                if not chunk:
+                    break
+                out.write(chunk)
+                done += len(chunk)
+                speed = (done - resumed_from) / max(time.monotonic() - started, 1e-6)
+                self._hooks("progress_hooks", {
+                    "status": "downloading", "filename": path, "downloaded_bytes": done, "total_bytes": total,
+                    "_percent_str": f"{done * 100 / total:5.1f}%", "_speed_str": f"{speed / 1048576:.2f}MiB/s",
+                    "_eta_str": f"{(total - done) / speed:.0f}s",
+                })
+        if done != total:
+            raise IOError(f"short read {done}/{total}")
+        os.replace(tmp, path)
+
+    def _download(self, info: dict):
+        template = self.params.get("outtmpl") or "%(title)s.%(ext)s"
+        if isinstance(template, dict):
+            template = template.get("default")
+        chosen = self._pick(info["formats"])
+        ext = self.params.get("merge_output_format") if len(chosen) > 1 else chosen[0]["ext"]
+        final_path = template % {"title": info["title"], "id": info["id"], "ext": ext or "mp4"}
+
+        parts = []
+        for fmt in chosen:
+            part = f"{os.path.splitext(final_path)[0]}.f{fmt['format_id']}.{fmt['ext']}"
+            self._fetch(fmt, part)
+            parts.append(part)
+
+        if len(parts) > 1:
+            # Stand-in for FFmpegMerger: a stream copy is I/O bound, so concatenation is a fair proxy
+            self._hooks("postprocessor_hooks", {"status": "started", "postprocessor": "Merger", "info_dict": info})
+            with open(final_path, "wb") as out:
+                for part in parts:
+                    with open(part, "rb") as src:
+                        while chunk := src.read(DOWNLOAD_CHUNK):
+                            out.write(chunk)
+                    os.remove(part)
+            self._hooks("postprocessor_hooks", {"status": "finished", "postprocessor": "Merger", "info_dict": info})
+        else:
+            os.replace(parts[0], final_path)
+
+        self._hooks("progress_hooks", {"status": "finished", "filename": final_path})
+        info["requested_downloads"] = [{"filepath": final_path, "ext": ext}]
+
+
+def install(config: Optional[dict] = None):
+    """Swap yt-dlp's YoutubeDL for the stub (modules call `yt_dlp.YoutubeDL(...)` at use time)."""
+    import yt_dlp
+
+    StubYoutubeDL.config = config or load_config()
+    yt_dlp.YoutubeDL = StubYoutubeDL
+    logger.info(f"🧪 [BENCH] stub extractor installed | upstream={StubYoutubeDL.config['upstream']}")
@@ -0,0 +1,31 @@
+import threading
+
+
+class CancellationStats:
+    """
+    Counters for work abandoned because the client went away:
+    - streams_cancelled: /download fetches stopped after the last listener left
+    - upstream_bytes_avoided: known bytes of those fetches that were never pulled
+    - ffmpeg_killed: ffmpeg children killed before finishing
+    - downloads_cancelled: yt-dlp downloads aborted from the progress hook
+    - queued_jobs_cancelled: scheduler jobs dropped before they started
+    - temp_dirs_released: job temp dirs handed to the reaper early
+    """
+
+    _COUNTERS = ("streams_cancelled", "upstream_bytes_avoided", "ffmpeg_killed",
+                 "downloads_cancelled", "queued_jobs_cancelled", "temp_dirs_released")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self._COUNTERS, 0)
+
+    def record(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+
+cancellation_stats = CancellationStats()
@@ -0,0 +1,149 @@
+import os
+import asyncio
+import threading
+import logging
+import contextvars
+import concurrent.futures
+from typing import Callable, Optional
+
+import httpx
+from fastapi import HTTPException
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Concurrency Configuration
+# ────────────────────────────────────────────────
+# Extraction (yt-dlp, CPU + blocking I/O) and streaming (async network I/O)
+# are limited independently so slow extractions can't starve active streams.
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "8"))
+EXTRACT_QUEUE_LIMIT = int(os.getenv("EXTRACT_QUEUE_LIMIT", "32"))
+STREAM_MAX_CONCURRENT = int(os.getenv("STREAM_MAX_CONCURRENT", "64"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a hard cap on queued work.
+    Submissions beyond `max_workers + queue_limit` are rejected with 503 instead
+    of piling up behind slow jobs.
+    """
+
+    def __init__(self, name: str, max_workers: int, queue_limit: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0   # queued + running
+        self.rejected = 0
+        self.deferred = 0   # background submissions skipped because no worker was idle
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_workers + self.queue_limit:
+                self.rejected += 1
+                logger.warning(f"🚦 [{self.name}] queue full ({self._pending} pending) — rejecting")
+                raise HTTPException(status_code=503, detail="Server busy, please retry shortly")
+            self._pending += 1
+
+        # Release via the worker future so a cancelled awaiter doesn't free a slot
+        # while its job is still running in the pool. The caller's context (request
+        # ID for logs) travels with the call.
+        future = self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def try_submit(self, fn: Callable, *args, **kwargs) -> Optional[concurrent.futures.Future]:
+        """
+        Background work (prefetch): runs only if a worker is idle right now,
+        so it never queues ahead of requests. Returns None otherwise.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers:
+                self.deferred += 1
+                return None
+            self._pending += 1
+        future = self._pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        future.add_done_callback(self._release)
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.queue_limit,
+                "pending": self._pending,
+                "rejected": self.rejected,
+                "deferred": self.deferred,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class StreamLimiter:
+    """
+    Counts active upstream media streams; new streams get 503 once the cap is hit.
+    """
+
+    def __init__(self, max_streams: int):
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.max_streams:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Too many active downloads, please retry shortly")
+            self.active += 1
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"max_streams": self.max_streams, "active": self.active, "rejected": self.rejected}
+
+
+extraction_executor = BoundedExecutor("extract", EXTRACT_WORKERS, EXTRACT_QUEUE_LIMIT)
+stream_limiter = StreamLimiter(STREAM_MAX_CONCURRENT)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+async def run_extraction(fn: Callable, *args, **kwargs):
+    """Run a blocking yt-dlp call on the dedicated extraction pool."""
+    return await extraction_executor.run(fn, *args, **kwargs)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Shared pooled async client for upstream media requests.
+    Created lazily on first use inside the running event loop.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+            timeout=httpx.Timeout(20.0),
+            follow_redirects=True,
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
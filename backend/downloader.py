@@ -1,50 +1,54 @@
 # ---------- Add at top of file if not already imported ----------
 import time
+import asyncio
 from typing import Optional, Tuple
-from requests.exceptions import HTTPError, RequestException
 # ---------------------------------------------------------------
 
 
 
 from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import yt_dlp
 import os
 import subprocess
 import logging
-from datetime import datetime
 from model.download_request import DownloadRequest, PlaylistDownloadRequest
 import tempfile
 from utils import sanitize_filename
 from typing import Generator
 import json
-import threading, queue
-from utils import sanitize_filename, sanitize_playlist_filename
-import requests
+import threading
+import contextvars
+from utils import sanitize_filename, sanitize_playlist_filename, parse_content_range, parse_timestamp, parse_range_header
+import httpx
 import concurrent.futures
 import shutil
+from metadata_cache import metadata_cache, normalize_media_key, signed_urls_fresh
+from range_fetcher import ParallelRangeFetcher, clamp_parallel_settings, probe_total_size
+from concurrency import run_extraction, get_http_client, stream_limiter
+from ffmpeg_pipe import (build_trim_args, build_merge_args, build_audio_transcode_args, resolve_audio_settings,
+                         stream_ffmpeg, FFmpegError, AUDIO_CODECS)
+from zip_stream import open_archive
+from scheduler import download_scheduler, Deferred, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from single_flight import stream_flights, file_flights, link_or_copy
+from media_cache import media_cache
+from reaper import temp_reaper
+from progress_channel import ProgressChannel
+from jobs import job_store, JobRecorder, stream_job_events, queued_message, JOB_DETACH_GRACE
+from prefetch import LookaheadPrefetcher
+from stream_links import stream_links, STREAM_LINK_TTL
+from preview import preview_renderer, RenderedPreview, compact, select_fields
+from ydl_pool import ydl_pool
+from cancellation import cancellation_stats
+from metrics import (EXTRACT_SECONDS, FORMAT_SELECT_SECONDS, UPSTREAM_CONNECT_SECONDS, STREAM_RETRIES,
+                     FFMPEG_SECONDS, MERGE_SECONDS, PLAYLIST_VIDEOS, observe_stream)
+from playlist_stream import PlaylistCursor, playlist_cursors, clamp_page, PLAYLIST_STREAM_BATCH
+from log_config import log_sampled, bind_log_context
 
 
 
-# ────────────────────────────────────────────────
-# 🧾 Logging Configuration
-# ────────────────────────────────────────────────
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = os.path.join(LOG_DIR, f"app_{datetime.now().strftime('%Y%m%d')}.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] — %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler()  # prints to console too
-    ],
-)
-
 logger = logging.getLogger(__name__)
 
 
@@ -66,189 +70,229 @@ def get_download_path(path: str = None) -> str:
     return os.path.abspath(path)
 
 
-def stream_youtube_video(url: str, format_id: str = None):
+def _extract_info(url: str, ydl_opts: dict, force_refresh: bool = False) -> dict:
     """
-    Use yt-dlp to get a direct media URL and stream it to client without saving to disk.
+    Read-through wrapper around yt-dlp `extract_info(download=False)`.
+    Results are shared via the process-wide metadata cache so that
+    preview → download runs a single extraction. The returned dict is shared:
+    do not mutate it.
     """
-    logger.info(f"🎬 [STREAM INIT] Request received | URL: {url} | format_id: {format_id}")
+    def extractor():
+        with EXTRACT_SECONDS.time(), ydl_pool.checkout(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
 
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "noplaylist": True,
-    }
-
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-
-        title = info.get("title", "Unknown Title")
-        total_formats = len(info.get("formats", []))
-        logger.info(f"📄 [STREAM INFO] Extracted metadata | Title: '{title}' | Formats: {total_formats}")
-
-        fmt = None
-        if format_id:
-            fmt = next((f for f in info["formats"] if f.get("format_id") == format_id), None)
-            if fmt:
-                logger.info(f"🎯 [FORMAT SELECTED] Found format_id: {format_id} | "
-                            f"Resolution: {fmt.get('height')}p | Codec: {fmt.get('vcodec')}/{fmt.get('acodec')}")
-            else:
-                logger.warning(f"⚠️ [FORMAT MISSING] Requested format_id '{format_id}' not found — falling back to best available format.")
-        else:
-            logger.info("ℹ️ [FORMAT SELECTED] No format_id provided — using best available format.")
+    return metadata_cache.get_or_extract(url, ydl_opts, extractor, force_refresh=force_refresh)
 
-        if not fmt:
-            fmt = info["formats"][-1]  # fallback
-            logger.info(f"🎬 [FORMAT FALLBACK] Using format_id: {fmt.get('format_id')} | "
-                        f"Resolution: {fmt.get('height')}p | Codec: {fmt.get('vcodec')}/{fmt.get('acodec')}")
 
-        stream_url = fmt["url"]
-        mime_type = fmt.get("ext", "mp4")
-        sanitized_title = sanitize_filename(title)
+def warm_extractors():
+    """Pre-build pooled YoutubeDL instances for the per-request extraction profiles (background)."""
+    ydl_pool.warm_in_background([_PREVIEW_VIDEO_OPTS, _PREVIEW_PLAYLIST_OPTS, _FORMAT_INFO_OPTS,
+                                 _stream_meta_opts(), _PLAYLIST_CURSOR_OPTS])
 
-        logger.info(f"✅ [STREAM READY] {sanitized_title}.{mime_type} | Direct stream URL prepared")
 
-        return stream_url, mime_type, sanitized_title
+def _playlist_entry_summary(entry: dict, i: int) -> dict:
+    """Preview fields for one flat playlist entry (`i` is its playlist index)."""
+    thumbnails = entry.get("thumbnails") or []
 
-    except Exception as e:
-        logger.exception(f"❌ [STREAM ERROR] Failed to prepare stream for URL: {url} | {type(e).__name__}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to prepare stream: {str(e)}")
+    # Pick a safe thumbnail index
+    thumb_url = None
+    if thumbnails:
+        if len(thumbnails) > i + 1:
+            thumb_url = thumbnails[i + 1]["url"]
+        else:
+            thumb_url = thumbnails[-1]["url"]  # fallback to last available thumbnail
+
+    return {
+        "id": entry.get("id"),
+        "title": entry.get("title"),
+        "url": entry.get("url"),
+        "duration": entry.get("duration"),
+        "webpage_url": entry.get("webpage_url"),
+        "thumbnail": thumb_url,
+    }
 
 
+_PREVIEW_PLAYLIST_OPTS = {"quiet": True, "skip_download": True, "dump_single_json": True, "extract_flat": True}
 
-def preview_playlist(url: str):
-    logger.info(f"📋 [PLAYLIST PREVIEW] Request received | URL: {url}")
 
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "dump_single_json": True,
-        "extract_flat": True,
-    }
+def preview_playlist(url: str, fields: Optional[tuple] = None, include_urls: bool = False) -> RenderedPreview:
+    log_sampled(logger, "playlist_preview", "📋 [PLAYLIST PREVIEW] Request received | URL: %s", url)
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        info = _extract_info(url, _PREVIEW_PLAYLIST_OPTS)
 
         if "entries" not in info:
             raise HTTPException(status_code=400, detail="URL is not a playlist")
 
-        playlist_title = info.get("title")
-        entries = info.get("entries", [])
-
-        videos = []
-        for i, entry in enumerate(entries):
-            thumbnails = entry.get("thumbnails", [])
-            
-            # Pick a safe thumbnail index
-            thumb_url = None
-            if thumbnails:
-                if len(thumbnails) > i + 1:
-                    thumb_url = thumbnails[i + 1]["url"]
-                else:
-                    thumb_url = thumbnails[-1]["url"]  # fallback to last available thumbnail
-
-            entry["thumbnail"] = thumb_url
-
-            videos.append({
-                "id": entry.get("id"),
-                "title": entry.get("title"),
-                "url": entry.get("url"),
-                "duration": entry.get("duration"),
-                "webpage_url": entry.get("webpage_url"),
-                "thumbnail": entry.get("thumbnail"),
-            })
-
-        logger.info(f"✅ [PLAYLIST PREVIEW] Found {len(videos)} videos in playlist '{playlist_title}'")
-
-        return {
-            "type": "playlist",
-            "playlist_title": playlist_title,
-            "thumbnail": info.get("thumbnails")[0]["url"] if info.get("thumbnails") else None,
-            "videos": videos,
-        }
+        def build():
+            playlist_title = info.get("title")
+            videos = []
+            for i, entry in enumerate(info.get("entries", [])):
+                summary = _playlist_entry_summary(entry, i)
+                if not include_urls:
+                    summary.pop("url")
+                videos.append(compact(summary))
+
+            logger.info(f"✅ [PLAYLIST PREVIEW] Found {len(videos)} videos in playlist '{playlist_title}'")
+
+            return select_fields({
+                "type": "playlist",
+                "playlist_title": playlist_title,
+                "thumbnail": info.get("thumbnails")[0]["url"] if info.get("thumbnails") else None,
+                "videos": videos,
+            }, fields)
+
+        return preview_renderer.render(info, ("playlist", fields, include_urls), build)
 
     except Exception as e:
         logger.error(f"❌ [PLAYLIST PREVIEW] Error processing {url} | {type(e).__name__}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch playlist info: {str(e)}")
 
 
+_PLAYLIST_CURSOR_OPTS = {"quiet": True, "skip_download": True, "extract_flat": "in_playlist"}
+
+
+def _open_playlist_cursor(url: str, key: str) -> PlaylistCursor:
+    """
+    Start a lazy playlist walk: `process=False` leaves yt-dlp's entry generator
+    unconsumed, so pages are fetched only as the cursor advances.
+    The pooled YoutubeDL instance is held as long as the cursor.
+    """
+    ydl = ydl_pool.acquire(_PLAYLIST_CURSOR_OPTS)
+    try:
+        info = ydl.extract_info(url, download=False, process=False)
+        # watch?v=…&list=… resolves to a redirect to the playlist tab first
+        for _ in range(3):
+            if info.get("_type") not in ("url", "url_transparent"):
+                break
+            info = ydl.extract_info(info["url"], download=False, process=False, ie_key=info.get("ie_key"))
+        if "entries" not in info:
+            raise HTTPException(status_code=400, detail="URL is not a playlist")
+    except Exception:
+        ydl_pool.release(ydl, reusable=False)
+        raise
+
+    header = {
+        "playlist_title": info.get("title"),
+        "thumbnail": info.get("thumbnails")[0]["url"] if info.get("thumbnails") else None,
+        "playlist_count": info.get("playlist_count"),
+    }
+    playlist_cursors.record_open()
+    return PlaylistCursor(key, header, info["entries"] or [], close=lambda: ydl_pool.release(ydl))
+
+
+def _preview_event(fmt: str, event: str, **data) -> str:
+    payload = json.dumps({"event": event, **data})
+    return f"data: {payload}\n\n" if fmt == "sse" else payload + "\n"
+
+
+async def stream_playlist_preview(url: str, offset: Optional[int] = None, limit: Optional[int] = None,
+                                  fmt: str = "ndjson"):
+    """
+    Paged playlist preview emitted entry by entry (NDJSON lines or SSE events):
+    `playlist` header → `entry` × ≤limit → `page_end` with `next_offset` / `has_more`.
+    Where a page stops, the live yt-dlp iterator is parked server-side, so
+    fetching the next page continues instead of re-walking the playlist.
+    """
+    offset, limit = clamp_page(offset, limit)
+    key = normalize_media_key(url, playlist=True)
+    log_sampled(logger, "playlist_stream", "📋 [PLAYLIST STREAM] %s | offset=%s limit=%s", key, offset, limit)
+
+    cursor = playlist_cursors.checkout(key, offset)
+    if cursor is None:
+        cursor = await run_extraction(_open_playlist_cursor, url, key)
+        if offset:
+            await run_extraction(cursor.skip, offset)
+
+    async def generator():
+        sent = 0
+        try:
+            yield _preview_event(fmt, "playlist", offset=offset, limit=limit, **cursor.header)
+            while sent < limit and not cursor.exhausted:
+                batch = await run_extraction(cursor.take, min(PLAYLIST_STREAM_BATCH, limit - sent))
+                for index, entry in batch:
+                    yield _preview_event(fmt, "entry", index=index, **_playlist_entry_summary(entry, index))
+                sent += len(batch)
+            yield _preview_event(fmt, "page_end", offset=offset, count=sent,
+                                 next_offset=cursor.position, has_more=not cursor.exhausted)
+            logger.info(f"✅ [PLAYLIST STREAM] {key} | sent {sent} entries from {offset}")
+        except Exception as e:
+            logger.error(f"❌ [PLAYLIST STREAM] {key} failed | {type(e).__name__}: {e}")
+            cursor.exhausted = True  # don't park a broken iterator
+            yield _preview_event(fmt, "error", message=str(e))
+        finally:
+            playlist_cursors.checkin(cursor)
+
+    return generator()
+
+
 # 🎥 Preview available formats (for UI)
-def preview_video(url: str):
-    logger.info(f"🎬 [PREVIEW] Request received | URL: {url}")
-
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "dump_single_json": True,
-        "noplaylist": True,
+def _format_summary(f: dict, include_urls: bool, *keys: str) -> dict:
+    summary = {k: f.get(k) for k in ("format_id", "ext") + keys}
+    if "resolution" in keys:
+        summary["resolution"] = f.get("resolution") or f"{f.get('height')}p"
+    if include_urls:
+        summary["url"] = f.get("url")
+    return compact(summary)
+
+
+def _video_preview_payload(info: dict, include_urls: bool) -> dict:
+    video_formats, audio_formats, combined_formats = [], [], []
+    combined_urls, video_urls = [], []
+
+    for f in info.get("formats", []):
+        vcodec = f.get("vcodec")
+        acodec = f.get("acodec")
+
+        # Combined video + audio
+        if vcodec != "none" and acodec != "none":
+            combined_formats.append(_format_summary(f, include_urls, "resolution", "fps", "filesize", "vcodec", "acodec"))
+            combined_urls.append(f.get("url"))
+
+        # Video-only formats
+        elif vcodec != "none" and acodec == "none":
+            video_formats.append(_format_summary(f, include_urls, "resolution", "fps", "filesize", "vcodec"))
+            video_urls.append(f.get("url"))
+
+        # Audio-only formats
+        elif vcodec == "none" and acodec != "none":
+            audio_formats.append(_format_summary(f, include_urls, "abr", "filesize", "acodec"))
+
+    payload = {
+        "type": "single",
+        "title": info.get("title"),
+        "thumbnail": info.get("thumbnail"),
+        "duration": info.get("duration"),
+        "video_formats": video_formats,
+        "audio_formats": audio_formats,
+        "combined_formats": combined_formats,
     }
+    if include_urls:
+        # The one URL the UI plays inline — signed, so it changes on every extraction
+        payload["preview_url"] = (combined_urls or video_urls or [None])[0]
+    return payload
+
+
+_PREVIEW_VIDEO_OPTS = {"quiet": True, "skip_download": True, "dump_single_json": True, "noplaylist": True}
+
+
+def preview_video(url: str, fields: Optional[tuple] = None, include_urls: bool = False) -> RenderedPreview:
+    log_sampled(logger, "preview", "🎬 [PREVIEW] Request received | URL: %s", url)
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-
-        title = info.get("title")
-        logger.info(f"✅ [PREVIEW] Metadata extracted | Title: {title}")
-
-        video_formats, audio_formats, combined_formats = [], [], []
-
-        for f in info.get("formats", []):
-            vcodec = f.get("vcodec")
-            acodec = f.get("acodec")
-            ext = f.get("ext")
-
-            # Combined video + audio
-            if vcodec != "none" and acodec != "none":
-                combined_formats.append({
-                    "format_id": f.get("format_id"),
-                    "ext": ext,
-                    "resolution": f.get("resolution") or f"{f.get('height')}p",
-                    "fps": f.get("fps"),
-                    "filesize": f.get("filesize"),
-                    "vcodec": vcodec,
-                    "acodec": acodec,
-                    "url": f.get("url"),
-                })
-
-            # Video-only formats
-            elif vcodec != "none" and acodec == "none":
-                video_formats.append({
-                    "format_id": f.get("format_id"),
-                    "ext": ext,
-                    "resolution": f.get("resolution") or f"{f.get('height')}p",
-                    "fps": f.get("fps"),
-                    "filesize": f.get("filesize"),
-                    "vcodec": vcodec,
-                    "url": f.get("url"),
-                })
-
-            # Audio-only formats
-            elif vcodec == "none" and acodec != "none":
-                audio_formats.append({
-                    "format_id": f.get("format_id"),
-                    "ext": ext,
-                    "abr": f.get("abr"),
-                    "filesize": f.get("filesize"),
-                    "acodec": acodec,
-                    "url": f.get("url"),
-                })
-
-        logger.info(
-            f"🎞️ [PREVIEW] Found {len(video_formats)} video-only, "
-            f"{len(audio_formats)} audio-only, "
-            f"{len(combined_formats)} combined formats"
-        )
+        info = _extract_info(url, _PREVIEW_VIDEO_OPTS)
+        log_sampled(logger, "preview", "✅ [PREVIEW] Metadata extracted | Title: %s", info.get("title"))
+
+        def build():
+            payload = _video_preview_payload(info, include_urls)
+            logger.info(
+                f"🎞️ [PREVIEW] Found {len(payload['video_formats'])} video-only, "
+                f"{len(payload['audio_formats'])} audio-only, "
+                f"{len(payload['combined_formats'])} combined formats"
+            )
+            return select_fields(payload, fields)
 
-        return {
-            "type": "single",
-            "title": title,
-            "thumbnail": info.get("thumbnail"),
-            "duration": info.get("duration"),
-            "video_formats": video_formats,
-            "audio_formats": audio_formats,
-            "combined_formats": combined_formats,
-        }
+        return preview_renderer.render(info, ("single", fields, include_urls), build)
 
     except Exception as e:
         logger.error(f"❌ [PREVIEW] Error processing {url} | {type(e).__name__}: {e}")
@@ -256,26 +300,25 @@ def preview_video(url: str):
 
 
 
-def _extract_playable_format_info(url: str, format_id: Optional[str] = None, cookies: Optional[str] = None, ydl_opts_extra: dict = None) -> dict:
+# keep full metadata so we can pick formats
+_FORMAT_INFO_OPTS = {"quiet": True, "skip_download": True, "noplaylist": True, "forcejson": True}
+
+
+def _extract_playable_format_info(url: str, format_id: Optional[str] = None, cookies: Optional[str] = None, ydl_opts_extra: dict = None, force_refresh: bool = False) -> dict:
     """
     Use yt_dlp to extract info and pick a playable format dict.
     Returns a format dict (contains 'url', 'ext', 'format_id', etc).
+    Pass `force_refresh=True` to bypass the metadata cache (e.g. after a 403
+    on a signed URL).
     Raises RuntimeError on failure.
     """
-    opts = {
-        "quiet": True,
-        "skip_download": True,
-        "noplaylist": True,
-        # keep full metadata so we can pick formats
-        "forcejson": True,
-    }
+    opts = dict(_FORMAT_INFO_OPTS)
     if ydl_opts_extra:
         opts.update(ydl_opts_extra)
     if cookies:
         opts["cookiefile"] = cookies
 
-    with yt_dlp.YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+    info = _extract_info(url, opts, force_refresh=force_refresh)
 
     formats = info.get("formats", []) or []
     if not formats:
@@ -303,28 +346,101 @@ def _extract_playable_format_info(url: str, format_id: Optional[str] = None, coo
     raise RuntimeError("Unable to select a playable format")
 
 
-def stream_youtube_video(url: str, format_id: str = None, cookies: Optional[str] = None, max_retries: int = 3, user_agent: Optional[str] = None, chunk_size: int = 1024*1024):
+def _extract_audio_format_info(url: str, audio_id: Optional[str] = None, cookies: Optional[str] = None,
+                               force_refresh: bool = False) -> dict:
     """
-    Streams a YouTube video by repeatedly extracting a fresh signed URL using yt-dlp,
-    then opening a streaming request to that URL. On 403 (or transient errors) it will
-    re-extract and retry up to `max_retries`.
-    Returns (StreamingResponse generator, mime_ext, sanitized_title) when called from download_video.
+    Pick the audio-only format to transcode from: `audio_id` if it exists,
+    otherwise the highest-bitrate audio-only format. Falls back to any playable
+    format (which still carries audio) when the site has no audio-only streams.
     """
-    logger.info(f"🎬 [STREAM INIT] Request received | URL: {url} | format_id: {format_id}")
+    opts = dict(_FORMAT_INFO_OPTS)
+    if cookies:
+        opts["cookiefile"] = cookies
 
-    # common http headers
-    base_headers = {
+    info = _extract_info(url, opts, force_refresh=force_refresh)
+    audio_only = [
+        f for f in (info.get("formats") or [])
+        if f.get("url") and f.get("vcodec") == "none" and f.get("acodec") not in (None, "none")
+    ]
+
+    if audio_id:
+        for f in audio_only:
+            if str(f.get("format_id")) == str(audio_id):
+                return f
+
+    if audio_only:
+        return max(audio_only, key=lambda f: f.get("abr") or f.get("tbr") or 0)
+
+    return _extract_playable_format_info(url, format_id=audio_id, cookies=cookies, force_refresh=force_refresh)
+
+
+def _response_total_size(r) -> Optional[int]:
+    """Full resource size from a 200 (Content-Length) or 206 (Content-Range) response."""
+    if r.status_code == 206:
+        return parse_content_range(r.headers.get("Content-Range"))[2]
+    length = r.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def _stream_meta_opts(cookies: Optional[str] = None) -> dict:
+    """yt-dlp options for the title/duration lookup done before streaming."""
+    opts = {"quiet": True, "skip_download": True, "noplaylist": True}
+    if cookies:
+        opts["cookiefile"] = cookies
+    return opts
+
+
+def _stream_headers(user_agent: Optional[str] = None) -> dict:
+    """Common upstream headers for googlevideo requests."""
+    return {
         "Accept-Encoding": "identity;q=1, *;q=0",  # avoid compressed responses for streaming
         "Connection": "keep-alive",
-    }
-    if user_agent:
-        base_headers["User-Agent"] = user_agent
-    else:
-        base_headers["User-Agent"] = (
+        "User-Agent": user_agent or (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
             "AppleWebKit/537.36 (KHTML, like Gecko) "
             "Chrome/115.0.0.0 Safari/537.36"
-        )
+        ),
+    }
+
+
+def _resolve_trim_window(start_time: Optional[str], end_time: Optional[str], duration: Optional[float]) -> Optional[Tuple[float, Optional[float]]]:
+    """
+    Turn the request's start/end strings into (start_seconds, clip_duration).
+    Returns None when the window covers the whole video — the frontend always
+    sends end_time, usually equal to the full duration.
+    Raises ValueError for malformed or inverted ranges.
+    """
+    start = parse_timestamp(start_time) if start_time else 0.0
+    end = parse_timestamp(end_time) if end_time else None
+
+    if duration and end is not None and end >= duration - 1:
+        end = None  # "until the end" — no need to cut the tail
+    if end is not None and end <= start:
+        raise ValueError(f"end_time ({end_time}) must be after start_time ({start_time})")
+    if start < 1 and end is None:
+        return None
+    return start, (end - start if end is not None else None)
+
+
+async def stream_youtube_video(url: str, format_id: str = None, cookies: Optional[str] = None, max_retries: int = 3, user_agent: Optional[str] = None, chunk_size: int = 1024*1024,
+                               connections: int = 1, range_chunk_size: Optional[int] = None,
+                               byte_range: Optional[Tuple[int, int]] = None):
+    """
+    Streams a YouTube video by repeatedly extracting a fresh signed URL using yt-dlp,
+    then opening a streaming request to that URL. On 403 (or transient errors) it will
+    re-extract and retry up to `max_retries`. Retries after bytes have been sent
+    resume with `Range: bytes=N-` so the client never receives duplicated data.
+    With `connections > 1` and a known size, the body is fetched as parallel byte
+    ranges of `range_chunk_size` via ParallelRangeFetcher.
+    `byte_range` (inclusive start, end) streams only that window of the file,
+    for Range requests; retries resume inside it the same way.
+    yt-dlp runs on the extraction pool; upstream I/O uses the shared async client.
+    Returns (async generator factory, sanitized_title) when called from download_video.
+    """
+    log_sampled(logger, "stream_init", "🎬 [STREAM INIT] Request received | URL: %s | format_id: %s", url, format_id)
+
+    # common http headers
+    base_headers = _stream_headers(user_agent)
 
     # We'll try several times: re-extract a fresh URL each attempt
     attempt = 0
@@ -332,76 +448,185 @@ def stream_youtube_video(url: str, format_id: str = None, cookies: Optional[str]
 
     # We also extract some metadata once so we can name the file
     try:
-        with yt_dlp.YoutubeDL({"quiet": True, "skip_download": True, "noplaylist": True}) as ydl:
-            info = ydl.extract_info(url, download=False)
+        info = await run_extraction(_extract_info, url, _stream_meta_opts(cookies))
         title = info.get("title", "video")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"❌ [STREAM ERROR] metadata extraction failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to extract metadata: {e}")
 
     sanitized_title = sanitize_filename(title)
 
-    def generator():
+    range_start, range_end = byte_range or (0, None)
+
+    async def generator():
         nonlocal attempt, last_exc
-        while attempt < max_retries:
-            attempt += 1
-            try:
-                fmt = _extract_playable_format_info(url, format_id=format_id, cookies=cookies)
-                stream_url = fmt.get("url")
-                ext = fmt.get("ext", "mp4")
-                logger.info(f"🔗 [PLAYBACK URL] attempt={attempt} | chosen format_id={fmt.get('format_id')} | ext={ext} | url_preview={ (stream_url[:120] + '...') if stream_url else 'NONE' }")
-
-                # Stream with requests
-                headers = base_headers.copy()
-
-                # Some formats provide http_headers inside format dict; merge them if present
-                fmt_http_headers = fmt.get("http_headers") or fmt.get("headers")
-                if isinstance(fmt_http_headers, dict):
-                    headers.update(fmt_http_headers)
-
-                # Use stream=True and iterate
-                with requests.get(stream_url, headers=headers, stream=True, timeout=20) as r:
-                    try:
-                        r.raise_for_status()
-                    except HTTPError as he:
-                        status = getattr(he.response, "status_code", None)
-                        logger.warning(f"[HTTP] status={status} on attempt {attempt} for stream_url")
-                        # if 403 -> try re-extract (maybe signature expired)
-                        if status == 403:
-                            last_exc = he
-                            # tiny backoff and retry
-                            time.sleep(0.5 * attempt)
-                            continue
-                        # other 4xx/5xx -> raise out (non-recoverable)
-                        raise
+        bytes_sent = 0          # bytes already yielded to the client
+        total_size = None       # full upstream size, learned from the first response
+        wanted = None           # bytes this response should carry, once the size is known
+        pinned_format_id = format_id
+        client = get_http_client()
+        started = time.perf_counter()
+        first_byte = None
+        path = "parallel" if connections > 1 else "direct"
+        outcome = "error"
+        try:
 
-                    for chunk in r.iter_content(chunk_size=chunk_size):
-                        if chunk:
+            while attempt < max_retries:
+                attempt += 1
+                progress_mark = bytes_sent
+                try:
+                    # First attempt reuses cached metadata; retries need freshly signed URLs
+                    with FORMAT_SELECT_SECONDS.time(kind="stream"):
+                        fmt = await run_extraction(_extract_playable_format_info, url, format_id=pinned_format_id,
+                                                   cookies=cookies, force_refresh=attempt > 1)
+                    # Once bytes are out, every retry must hit the exact same format
+                    pinned_format_id = fmt.get("format_id") or pinned_format_id
+                    stream_url = fmt.get("url")
+                    ext = fmt.get("ext", "mp4")
+                    log_sampled(logger, "playback_url",
+                                "🔗 [PLAYBACK URL] attempt=%s | chosen format_id=%s | ext=%s | offset=%s | url_preview=%.120s...",
+                                attempt, fmt.get("format_id"), ext, bytes_sent, stream_url or "NONE")
+
+                    # Stream with the shared async client
+                    headers = base_headers.copy()
+
+                    # Some formats provide http_headers inside format dict; merge them if present
+                    fmt_http_headers = fmt.get("http_headers") or fmt.get("headers")
+                    if isinstance(fmt_http_headers, dict):
+                        headers.update(fmt_http_headers)
+
+                    # ⚡ Multi-connection path: needs the total size to split into ranges
+                    if connections > 1:
+                        if total_size is None:
+                            total_size = fmt.get("filesize") or await probe_total_size(client, stream_url, headers)
+                        if total_size:
+                            last = range_end if range_end is not None else total_size - 1
+                            wanted = last + 1 - range_start
+                            log_sampled(logger, "parallel_fetch",
+                                        "⚡ [STREAM] parallel fetch | connections=%s | chunk=%s | offset=%s/%s",
+                                        connections, range_chunk_size, range_start + bytes_sent, total_size)
+                            fetcher = ParallelRangeFetcher(client, stream_url, headers, start=range_start + bytes_sent,
+                                                           end=last, connections=connections, chunk_size=range_chunk_size)
+                            async for chunk in fetcher:
+                                if first_byte is None:
+                                    first_byte = time.perf_counter()
+                                bytes_sent += len(chunk)
+                                yield chunk
+                            logger.info(f"✅ [STREAM] completed successfully | bytes={bytes_sent}")
+                            outcome = "ok"
+                            return
+                        logger.info("ℹ️ [STREAM] size unknown — falling back to single connection")
+                        path = "direct"
+
+                    # Resume from where the client left off instead of restarting at byte 0
+                    offset = range_start + bytes_sent
+                    if offset or range_end is not None:
+                        headers["Range"] = f"bytes={offset}-{'' if range_end is None else range_end}"
+
+                    connect_started = time.perf_counter()
+                    async with client.stream("GET", stream_url, headers=headers) as r:
+                        UPSTREAM_CONNECT_SECONDS.observe(time.perf_counter() - connect_started)
+                        if r.status_code == 416 and total_size is not None and offset >= total_size:
+                            logger.info("✅ [STREAM] completed successfully (nothing left to resume)")
+                            outcome = "ok"
+                            return
+                        try:
+                            r.raise_for_status()
+                        except httpx.HTTPStatusError as he:
+                            status = he.response.status_code
+                            logger.warning(f"[HTTP] status={status} on attempt {attempt} for stream_url")
+                            # if 403 -> try re-extract (maybe signature expired)
+                            if status == 403:
+                                STREAM_RETRIES.inc(reason="403")
+                                last_exc = he
+                                # tiny backoff and retry
+                                await asyncio.sleep(0.5 * attempt)
+                                continue
+                            # other 4xx/5xx -> raise out (non-recoverable)
+                            raise
+
+                        skip = 0
+                        if "Range" in headers:
+                            if r.status_code == 206:
+                                start, _, total = parse_content_range(r.headers.get("Content-Range"))
+                                if start != offset or (total is not None and total_size is not None and total != total_size):
+                                    raise RuntimeError(
+                                        f"Upstream Content-Range mismatch: expected start={offset} total={total_size}, "
+                                        f"got {r.headers.get('Content-Range')!r}"
+                                    )
+                                total_size = total_size or total
+                            else:
+                                # Range ignored: discard the prefix the client already has
+                                logger.warning(f"[STREAM] upstream ignored Range, skipping {offset} bytes")
+                                skip = offset
+                                total_size = total_size or _response_total_size(r)
+                        else:
+                            total_size = _response_total_size(r)
+                        if total_size is not None:
+                            wanted = (range_end + 1 if range_end is not None else total_size) - range_start
+
+                        async for chunk in r.aiter_bytes(chunk_size=chunk_size):
+                            if not chunk:
+                                continue
+                            if skip:
+                                if len(chunk) <= skip:
+                                    skip -= len(chunk)
+                                    continue
+                                chunk = chunk[skip:]
+                                skip = 0
+                            if wanted is not None and bytes_sent + len(chunk) > wanted:
+                                chunk = chunk[:wanted - bytes_sent]  # upstream sent past the window
+                            if first_byte is None:
+                                first_byte = time.perf_counter()
+                            bytes_sent += len(chunk)
                             yield chunk
-
-                    # If we finished streaming without exception - done.
-                    logger.info("✅ [STREAM] completed successfully")
-                    return
-
-            except HTTPError as he:
-                last_exc = he
-                logger.warning(f"[STREAM] HTTPError on attempt {attempt}: {he}")
-                time.sleep(0.5 * attempt)
-                continue
-            except RequestException as rexc:
-                last_exc = rexc
-                logger.warning(f"[STREAM] RequestException on attempt {attempt}: {rexc}")
-                time.sleep(0.5 * attempt)
-                continue
-            except Exception as exc:
-                last_exc = exc
-                logger.exception(f"[STREAM] Unexpected error on attempt {attempt}: {exc}")
-                time.sleep(0.5 * attempt)
-                continue
-
-        logger.error("❌ [STREAM] exhausted retries, failing")
-        # Raise so FastAPI returns 500
-        raise RuntimeError("Failed to stream after retries") from last_exc
+                            if wanted is not None and bytes_sent >= wanted:
+                                break
+
+                        if wanted is not None and bytes_sent < wanted:
+                            raise httpx.RemoteProtocolError(f"Upstream closed early at {bytes_sent}/{wanted} bytes")
+
+                        # If we finished streaming without exception - done.
+                        logger.info(f"✅ [STREAM] completed successfully | bytes={bytes_sent}")
+                        outcome = "ok"
+                        return
+
+                except httpx.HTTPStatusError as he:
+                    STREAM_RETRIES.inc(reason="http")
+                    last_exc = he
+                    logger.warning(f"[STREAM] HTTPError on attempt {attempt}: {he}")
+                    await asyncio.sleep(0.5 * attempt)
+                    continue
+                except httpx.TransportError as rexc:
+                    STREAM_RETRIES.inc(reason="transport")
+                    last_exc = rexc
+                    logger.warning(f"[STREAM] TransportError on attempt {attempt} at offset {bytes_sent}: {rexc}")
+                    await asyncio.sleep(0.5 * attempt)
+                    # A drop after real progress doesn't burn the retry budget
+                    if bytes_sent > progress_mark:
+                        attempt = 1
+                    continue
+                except Exception as exc:
+                    STREAM_RETRIES.inc(reason="other")
+                    last_exc = exc
+                    logger.exception(f"[STREAM] Unexpected error on attempt {attempt}: {exc}")
+                    await asyncio.sleep(0.5 * attempt)
+                    continue
+
+            logger.error("❌ [STREAM] exhausted retries, failing")
+            # Raise so FastAPI returns 500
+            raise RuntimeError("Failed to stream after retries") from last_exc
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            # Client gone — nothing more is pulled from upstream
+            if wanted:
+                cancellation_stats.record("upstream_bytes_avoided", max(0, wanted - bytes_sent))
+            logger.info(f"🛑 [STREAM] cancelled at {bytes_sent}/{wanted or '?'} bytes")
+            raise
+        finally:
+            observe_stream(path, started, first_byte, bytes_sent, outcome)
 
     # we return the generator and metadata (mime ext, sanitized title)
     # the caller uses generator() inside StreamingResponse
@@ -410,30 +635,385 @@ def stream_youtube_video(url: str, format_id: str = None, cookies: Optional[str]
     return generator, sanitized_title
 
 
-def download_video(req: DownloadRequest):
+def _ffmpeg_stream_generator(tag: str, kind: str, select_formats, build_args, headers: dict, max_retries: int):
     """
-    streaming path (no save-to-disk). Uses stream_youtube_video generator and returns StreamingResponse.
+    Generator factory around one ffmpeg job reading signed URLs.
+    `select_formats(force_refresh)` picks the yt-dlp format(s) to read,
+    `build_args([(url, headers), ...])` builds the ffmpeg command; `kind` labels
+    its metrics (trim / audio / merge). Fails over to
+    freshly signed URLs only if ffmpeg dies before producing output — a
+    half-sent stream can't be resumed.
+    """
+    async def generator():
+        last_exc = None
+        started = time.perf_counter()
+        first_byte = None
+        bytes_sent = 0
+        outcome = "error"
+        try:
+            for attempt in range(1, max_retries + 1):
+                bytes_sent = 0
+                try:
+                    with FORMAT_SELECT_SECONDS.time(kind=kind):
+                        fmts = await run_extraction(select_formats, attempt > 1)
+                    inputs = [(f["url"], {**headers, **(f.get("http_headers") or {})}) for f in fmts]
+                    logger.info(f"{tag} attempt={attempt} | format_id={'+'.join(str(f.get('format_id')) for f in fmts)}")
+
+                    async for chunk in stream_ffmpeg(build_args(inputs)):
+                        if first_byte is None:
+                            first_byte = time.perf_counter()
+                        bytes_sent += len(chunk)
+                        yield chunk
+
+                    logger.info(f"✅ {tag} streamed | bytes={bytes_sent}")
+                    outcome = "ok"
+                    return
+                except FFmpegError as exc:
+                    last_exc = exc
+                    if bytes_sent:
+                        raise
+                    STREAM_RETRIES.inc(reason="ffmpeg")
+                    logger.warning(f"{tag} ffmpeg failed on attempt {attempt}: {exc}")
+                    await asyncio.sleep(0.5 * attempt)
+
+            raise RuntimeError(f"{tag} failed after retries") from last_exc
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            observe_stream(kind, started, first_byte, bytes_sent, outcome)
+            FFMPEG_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+
+    return generator
+
+
+async def stream_trimmed_clip(url: str, start: float, duration: Optional[float], format_id: str = None,
+                              cookies: Optional[str] = None, user_agent: Optional[str] = None,
+                              include_video: bool = True, max_retries: int = 3):
     """
-    logger.info(f"🎬 Streaming directly | mode={req.mode} | url={req.url}")
+    Stream only [start, start + duration) of a video: ffmpeg reads the signed URL
+    directly with input-side seeking and stream-copies into fragmented MP4 on a pipe,
+    so a short clip of a long video transfers roughly the clip, not the whole file.
+    Returns (async generator factory, sanitized_title).
+    """
+    logger.info(f"✂️ [TRIM INIT] URL: {url} | format_id: {format_id} | start={start} | duration={duration}")
+
+    info = await run_extraction(_extract_info, url, _stream_meta_opts(cookies))
+    sanitized_title = sanitize_filename(info.get("title", "video"))
+
+    generator = _ffmpeg_stream_generator(
+        "✂️ [TRIM]", "trim",
+        lambda force_refresh: [_extract_playable_format_info(url, format_id=format_id, cookies=cookies,
+                                                             force_refresh=force_refresh)],
+        lambda inputs: build_trim_args(*inputs[0], start, duration, include_video=include_video),
+        _stream_headers(user_agent),
+        max_retries,
+    )
+    return generator, sanitized_title
+
+
+async def stream_audio_transcode(url: str, codec: str, bitrate: int, audio_id: Optional[str] = None,
+                                 cookies: Optional[str] = None, user_agent: Optional[str] = None,
+                                 trim: Optional[Tuple[float, Optional[float]]] = None, max_retries: int = 3):
+    """
+    Stream audio only: the best audio-only format is decoded by ffmpeg straight
+    from the signed URL and re-encoded to `codec` at `bitrate` kbps on a pipe.
+    Nothing touches disk and only the audio track is fetched upstream.
+    Returns (async generator factory, sanitized_title).
+    """
+    start, duration = trim or (None, None)
+    logger.info(f"🎧 [AUDIO INIT] URL: {url} | audio_id: {audio_id} | {codec}@{bitrate}k | start={start} | duration={duration}")
+
+    info = await run_extraction(_extract_info, url, _stream_meta_opts(cookies))
+    sanitized_title = sanitize_filename(info.get("title", "audio"))
+
+    generator = _ffmpeg_stream_generator(
+        "🎧 [AUDIO]", "audio",
+        lambda force_refresh: [_extract_audio_format_info(url, audio_id=audio_id, cookies=cookies,
+                                                          force_refresh=force_refresh)],
+        lambda inputs: build_audio_transcode_args(*inputs[0], codec, bitrate, start=start, duration=duration),
+        _stream_headers(user_agent),
+        max_retries,
+    )
+    return generator, sanitized_title
 
+
+def _select_merge_formats(url: str, video_id: Optional[str], audio_id: Optional[str],
+                          cookies: Optional[str] = None, force_refresh: bool = False) -> list:
+    """
+    Formats to mux for merged mode: the requested video format plus the
+    requested (or best) audio-only format. A video format that already carries
+    audio is used on its own unless an audio_id was asked for explicitly.
+    """
+    video = _extract_playable_format_info(url, format_id=video_id, cookies=cookies, force_refresh=force_refresh)
+    if not audio_id and video.get("acodec") not in (None, "none"):
+        return [video]
+    audio = _extract_audio_format_info(url, audio_id=audio_id, cookies=cookies, force_refresh=force_refresh)
+    if audio.get("url") == video.get("url"):
+        return [video]
+    return [video, audio]
+
+
+async def stream_merged(url: str, video_id: Optional[str], audio_id: Optional[str],
+                        cookies: Optional[str] = None, user_agent: Optional[str] = None,
+                        trim: Optional[Tuple[float, Optional[float]]] = None, max_retries: int = 3):
+    """
+    Merged mode without the disk round-trip: ffmpeg reads the video-only and
+    audio-only signed URLs side by side and stream-copies them into fragmented
+    MP4 on a pipe, so playback can start after the first fragment while memory
+    stays bounded by the pipe buffer.
+    Returns (async generator factory, sanitized_title).
+    """
+    start, duration = trim or (None, None)
+    logger.info(f"🎬 [MERGE INIT] URL: {url} | video_id: {video_id} | audio_id: {audio_id} | start={start} | duration={duration}")
+
+    info = await run_extraction(_extract_info, url, _stream_meta_opts(cookies))
+    sanitized_title = sanitize_filename(info.get("title", "video"))
+
+    generator = _ffmpeg_stream_generator(
+        "🎬 [MERGE]", "merge",
+        lambda force_refresh: _select_merge_formats(url, video_id, audio_id, cookies=cookies,
+                                                    force_refresh=force_refresh),
+        lambda inputs: build_merge_args(inputs, start=start, duration=duration),
+        _stream_headers(user_agent),
+        max_retries,
+    )
+    return generator, sanitized_title
+
+
+# ────────────────────────────────────────────────
+# 🎯 Seekable (Range-capable) Downloads
+# ────────────────────────────────────────────────
+_SEEKABLE_CONTENT_TYPES = {"mp4": "video/mp4", "webm": "video/webm", "m4a": "audio/mp4"}
+_BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"
+
+
+async def _resolve_seekable_target(req: DownloadRequest) -> dict:
+    """
+    Pin a request to one direct format and its exact byte size.
+    409 when the output is produced on the fly (audio transcode, merge, trim)
+    and so has no stable bytes to address.
+    """
+    if req.mode != "video":
+        raise HTTPException(status_code=409, detail="Seekable links are only available for single-format video downloads")
+    cookies = getattr(req, "cookies", None)
+    info = await run_extraction(_extract_info, req.url, _stream_meta_opts(cookies))
     try:
-        # Prepare cookies path if provided in request object (optional)
-        cookies = getattr(req, "cookies", None)
+        if _resolve_trim_window(req.start_time, req.end_time, info.get("duration")):
+            raise HTTPException(status_code=409, detail="Trimmed clips are cut on the fly and can't be range-requested")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    fmt = await run_extraction(_extract_playable_format_info, req.url, format_id=req.video_id or req.format_id,
+                               cookies=cookies)
+    size = fmt.get("filesize")
+    if not size:
+        headers = {**_stream_headers(_BROWSER_USER_AGENT), **(fmt.get("http_headers") or {})}
+        size = await probe_total_size(get_http_client(), fmt["url"], headers)
+    if not size:
+        raise HTTPException(status_code=409, detail="Upstream doesn't report a size for this format")
+
+    ext = fmt.get("ext") or "mp4"
+    format_id = str(fmt.get("format_id"))
+    return {
+        "request": req.model_dump(),
+        "format_id": format_id,
+        "size": size,
+        "content_type": _SEEKABLE_CONTENT_TYPES.get(ext, "application/octet-stream"),
+        "filename": f"{sanitize_filename(info.get('title') or 'video')}.{ext}",
+        "etag": f'"{normalize_media_key(req.url)}-{format_id}-{size}"',
+    }
 
-        # get generator factory and title (generator is created but will do extraction on first iteration)
-        generator_factory, title = stream_youtube_video(req.url, format_id=(req.video_id or req.format_id), cookies=cookies,
-                                                       max_retries=5,
-                                                       user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36")
 
-        # streaming generator instance
-        def iter_content():
-            yield from generator_factory()
+async def create_stream_link(req: DownloadRequest) -> dict:
+    """Issue a GET/HEAD link browsers, download managers and <video> can resume and seek in."""
+    target = await _resolve_seekable_target(req)
+    token = await asyncio.to_thread(stream_links.issue, target)
+    logger.info(f"🔗 [STREAM LINK] {token} → format {target['format_id']} ({target['size']} bytes)")
+    return {
+        "token": token,
+        "url": f"/stream/{token}",
+        "filename": target["filename"],
+        "content_type": target["content_type"],
+        "size": target["size"],
+        "expires_in": STREAM_LINK_TTL,
+    }
+
+
+async def serve_seekable(target: dict, range_header: Optional[str] = None, if_range: Optional[str] = None,
+                         head: bool = False):
+    """
+    Serve a pinned format with HTTP range semantics: HEAD → length and type,
+    GET → 200 or 206 (416 when unsatisfiable). Only the requested bytes are
+    pulled from upstream, and an expired signed URL is re-resolved mid-transfer.
+    """
+    req = DownloadRequest(**target["request"])
+    size = target["size"]
+    content_type = target["content_type"]
+
+    # 💾 Same bytes already on disk — FileResponse does ranges and HEAD itself
+    media_key = (normalize_media_key(req.url), req.video_id or req.format_id, req.mode, None)
+    cached = await asyncio.to_thread(media_cache.lookup, media_key)
+    if cached and cached["size"] == size:
+        return FileResponse(cached["path"], media_type=content_type, filename=target["filename"])
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": target["etag"],
+        "Content-Disposition": f'attachment; filename="{target["filename"]}"',
+    }
+    if if_range and if_range != target["etag"]:
+        range_header = None  # client's copy is of other bytes — send it the whole file
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    start, end = byte_range or (0, size - 1)
+    status_code = 206 if byte_range else 200
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if head:
+        return Response(status_code=status_code, headers=headers, media_type=content_type)
+
+    # A seeking player sends a burst of these — sampled
+    log_sampled(logger, "seekable", "🎯 [SEEKABLE] %s | format=%s | bytes %s-%s/%s",
+                req.url, target["format_id"], start, end, size)
+    stream_limiter.acquire()
+    try:
+        generator_factory, _ = await stream_youtube_video(req.url, format_id=target["format_id"],
+                                                          cookies=getattr(req, "cookies", None), max_retries=5,
+                                                          user_agent=_BROWSER_USER_AGENT, byte_range=(start, end))
+    except BaseException:
+        stream_limiter.release()
+        raise
+
+    async def iter_content():
+        try:
+            async for chunk in generator_factory():
+                yield chunk
+        finally:
+            stream_limiter.release()
+
+    return StreamingResponse(iter_content(), status_code=status_code, headers=headers, media_type=content_type)
+
+
+async def download_video(req: DownloadRequest, range_header: Optional[str] = None, if_range: Optional[str] = None):
+    """
+    streaming path (no save-to-disk). Uses stream_youtube_video generator and returns StreamingResponse.
+    Takes a stream slot up front so overload is reported as 503 before any bytes go out.
+    Media cache hits are served straight from disk without touching upstream.
+    A `Range` header on a plain video download is answered with a 206 of just those bytes.
+    """
+    log_sampled(logger, "stream_direct", "🎬 Streaming directly | mode=%s | url=%s", req.mode, req.url)
+
+    if range_header and req.mode == "video":
+        try:
+            target = await _resolve_seekable_target(req)
+        except HTTPException as e:
+            if e.status_code != 409:
+                raise
+            logger.info(f"ℹ️ Range ignored for {req.url}: {e.detail}")
+        else:
+            return await serve_seekable(target, range_header, if_range)
+
+    # Prepare cookies path if provided in request object (optional)
+    cookies = getattr(req, "cookies", None)
+
+    # ✂️ Resolve trim window against the (cached) duration
+    trim = None
+    if req.start_time or req.end_time:
+        try:
+            info = await run_extraction(_extract_info, req.url, _stream_meta_opts(cookies))
+            trim = _resolve_trim_window(req.start_time, req.end_time, info.get("duration"))
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception(f"❌ Streaming failed for {req.url}: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    # 🎧 Audio is transcoded on the fly — codec and bitrate are part of the output identity
+    variant = req.mode
+    format_id = req.video_id or req.format_id
+    if req.mode == "audio":
+        try:
+            audio_codec, audio_bitrate = resolve_audio_settings(req.audio_codec, req.audio_bitrate)
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        variant = f"audio:{audio_codec}@{audio_bitrate}k"
+        format_id = req.audio_id or req.format_id
+    elif req.mode == "merged":
+        format_id = f"{format_id}+{req.audio_id or 'bestaudio'}"
+
+    # Same key identifies an in-flight fetch (fan-out) and a finished file (media cache)
+    media_key = (normalize_media_key(req.url), format_id, variant, trim)
+
+    # A hit also bumps its access stats in the shared index — keep the write off the event loop
+    cached = await asyncio.to_thread(media_cache.lookup, media_key)
+    if cached:
+        logger.info(f"💾 [MEDIA CACHE] hit | {cached['filename']} ({cached['size']} bytes)")
+        return FileResponse(cached["path"], media_type=cached["content_type"], filename=cached["filename"])
+
+    stream_limiter.acquire()
+    released = False
+
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            stream_limiter.release()
+
+    try:
+        connections, range_chunk_size = clamp_parallel_settings(req.connections, req.chunk_size)
+        user_agent = _BROWSER_USER_AGENT
+
+        if req.mode == "audio":
+            generator_factory, title = await stream_audio_transcode(req.url, audio_codec, audio_bitrate,
+                                                                    audio_id=format_id, cookies=cookies,
+                                                                    user_agent=user_agent, trim=trim)
+            _, _, ext, content_type = AUDIO_CODECS[audio_codec]
+        elif req.mode == "merged":
+            # 🎬 Separate video + audio formats are muxed on the fly
+            generator_factory, title = await stream_merged(req.url, req.video_id or req.format_id, req.audio_id,
+                                                           cookies=cookies, user_agent=user_agent, trim=trim)
+            ext = "mp4"
+            content_type = "video/mp4"
+        elif trim:
+            start, clip_duration = trim
+            generator_factory, title = await stream_trimmed_clip(req.url, start, clip_duration,
+                                                                 format_id=format_id,
+                                                                 cookies=cookies, user_agent=user_agent)
+            ext = "mp4"
+            content_type = "video/mp4"
+        else:
+            # get generator factory and title (generator is created but will do extraction on first iteration)
+            generator_factory, title = await stream_youtube_video(req.url, format_id=format_id, cookies=cookies,
+                                                                 max_retries=5,
+                                                                 user_agent=user_agent,
+                                                                 connections=connections,
+                                                                 range_chunk_size=range_chunk_size)
+            ext = "mp4"
+            content_type = "video/mp4"
 
-        ext = "mp3" if req.mode == "audio" else "mp4"
         filename = f"{title}.{ext}"
-        content_type = "audio/mpeg" if req.mode == "audio" else "video/mp4"
 
-        logger.info(f"📡 [STREAM PREP] filename={filename} content_type={content_type}")
+        def publish_to_cache(spill_path: str) -> bool:
+            return media_cache.publish(media_key, spill_path, ext, filename, content_type)
+
+        # streaming generator instance
+        async def iter_content():
+            try:
+                # 🔁 Identical concurrent requests share one upstream fetch
+                flight = stream_flights.join(media_key, generator_factory, publish=publish_to_cache)
+                async for chunk in flight.subscribe():
+                    yield chunk
+            finally:
+                release_slot()
+
+        log_sampled(logger, "stream_prep", "📡 [STREAM PREP] filename=%s content_type=%s", filename, content_type)
 
         return StreamingResponse(
             iter_content(),
@@ -441,7 +1021,11 @@ def download_video(req: DownloadRequest):
             headers={"Content-Disposition": f'attachment; filename="{filename}"'},
         )
 
+    except HTTPException:
+        release_slot()
+        raise
     except Exception as e:
+        release_slot()
         logger.exception(f"❌ Streaming failed for {req.url}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -503,14 +1087,16 @@ def download_video(req: DownloadRequest):
 #     return download_video_save_to_server_then_stream_to_client(req)
 
 
-def download_video_save_to_server_then_stream_to_client(req: DownloadRequest):
+def download_video_save_to_server_then_stream_to_client(req: DownloadRequest, client_id: str = "anonymous"):
     logger.info(f"🎬 Downloading video | mode={req.mode} | url={req.url}")
 
+    tmp_dir = None
+    lease = None
     try:
         # ✅ Step 1️⃣ Resolve download and temp directories
         download_dir = get_download_path(req.download_path)
-        os.makedirs(download_dir, exist_ok=True)
-        tmp_dir = tempfile.mkdtemp(dir=download_dir)  # ✅ temp folder INSIDE downloads
+        lease = temp_reaper.lease(download_dir)  # ✅ temp folder INSIDE downloads, held until streamed
+        tmp_dir = lease.path
         output_path = os.path.join(tmp_dir, "%(title)s.%(ext)s")
 
         # ✅ Step 2️⃣ Prepare yt-dlp options based on mode
@@ -533,29 +1119,8 @@ def download_video_save_to_server_then_stream_to_client(req: DownloadRequest):
             }
 
         elif req.mode == "audio":
-            ydl_opts = {
-                "format": req.audio_id or req.format_id or "bestaudio/best",
-                "outtmpl": output_path,
-                "restrictfilenames": True,
-                "postprocessors": [
-                    {
-                        "key": "FFmpegExtractAudio",
-                        "preferredcodec": "mp3",
-                        "preferredquality": "192",
-                    }
-                ],
-                "keepvideo": False,
-                "noplaylist": True,
-                "retries": 10,
-                "fragment_retries": 10,
-                "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
-                "http_headers": {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-                    "Accept-Language": "en-US,en;q=0.5",
-                    "DNT": "1",
-                },
-            }
+            # 🎧 Audio is transcoded on the fly by download_video — no temp file round-trip
+            raise HTTPException(status_code=400, detail="Audio mode is served by the streaming download path")
 
         elif req.mode == "merged":
             if not (req.video_id and req.audio_id):
@@ -581,20 +1146,20 @@ def download_video_save_to_server_then_stream_to_client(req: DownloadRequest):
         else:
             raise HTTPException(status_code=400, detail="Invalid mode")
 
-        logger.info(f"🔧 yt-dlp options: {ydl_opts}")
+        logger.debug("🔧 yt-dlp options: %s", ydl_opts)
 
-        # ✅ Step 3️⃣ Download file
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(req.url, download=True)
-            raw_path = ydl.prepare_filename(info)
+        # ✅ Step 3️⃣ Download file (interactive job on the global scheduler)
+        def run_ydl():
+            import yt_dlp  # deferred (see ydl_pool); per-request hooks and outtmpl — not pooled
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(req.url, download=True)
+                return ydl.prepare_filename(info)
 
-        # ✅ Step 4️⃣ Handle renamed audio
-        if req.mode == "audio":
-            base, _ = os.path.splitext(raw_path)
-            audio_path = base + ".mp3"
-            final_path = audio_path if os.path.exists(audio_path) else raw_path
-        else:
-            final_path = raw_path
+        raw_path = download_scheduler.submit(run_ydl, client_id=client_id,
+                                             priority=PRIORITY_INTERACTIVE).future.result()
+
+        # ✅ Step 4️⃣ Locate the output file
+        final_path = raw_path
 
         if not os.path.exists(final_path):
             raise HTTPException(status_code=500, detail=f"File not found: {final_path}")
@@ -626,9 +1191,12 @@ def download_video_save_to_server_then_stream_to_client(req: DownloadRequest):
 
         # ✅ Step 6️⃣ Stream final file to client
         def iterfile():
-            with open(final_path, "rb") as f:
-                while chunk := f.read(1024 * 1024):
-                    yield chunk
+            try:
+                with open(final_path, "rb") as f:
+                    while chunk := f.read(1024 * 1024):
+                        yield chunk
+            finally:
+                temp_reaper.release(lease)
 
         filename = os.path.basename(final_path)
         filesize = os.path.getsize(final_path)
@@ -637,14 +1205,20 @@ def download_video_save_to_server_then_stream_to_client(req: DownloadRequest):
 
         return StreamingResponse(
             iterfile(),
-            media_type="audio/mpeg" if req.mode == "audio" else "video/mp4",
+            media_type="video/mp4",
             headers={
                 "Content-Disposition": f'attachment; filename="{filename}"',
                 "Content-Length": str(filesize),
             },
         )
 
+    except HTTPException:
+        if lease:
+            temp_reaper.release(lease)
+        raise
     except Exception as e:
+        if lease:
+            temp_reaper.release(lease)
         logger.exception(f"❌ Download failed for {req.url}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -653,36 +1227,145 @@ def download_video_save_to_server_then_stream_to_client(req: DownloadRequest):
 
 
 
-def download_playlist(req: PlaylistDownloadRequest):
+def _completed_until(cancelled: threading.Event, futures: list, poll: float = 0.5):
+    """Like as_completed(), but stops early once `cancelled` is set."""
+    pending = set(futures)
+    while pending and not cancelled.is_set():
+        done, pending = concurrent.futures.wait(pending, timeout=poll,
+                                                return_when=concurrent.futures.FIRST_COMPLETED)
+        yield from done
+
+
+def download_playlist(req: PlaylistDownloadRequest, client_id: str = "anonymous", is_disconnected=None):
     """
-    Downloads multiple videos in parallel with per-video progress updates via SSE.
+    Starts a durable playlist job and streams its events via SSE.
+    The first event (`job`) carries the job id: a client that loses the
+    connection reconnects to /jobs/{id}/events with Last-Event-ID and gets
+    the missed events replayed. The job itself is only cancelled once nobody
+    has watched it for JOB_DETACH_GRACE seconds.
     """
-    playlist_title = req.playlist_title or "playlist"
-    zip_base = sanitize_filename(playlist_title)
-    if not zip_base.endswith(".zip"):
-        zip_base += ".zip"
+    job_id = start_playlist_job(req, client_id)
+    return StreamingResponse(stream_job_events(job_id, 0, is_disconnected), media_type="text/event-stream")
+
+
+def start_playlist_job(req: PlaylistDownloadRequest, client_id: str = "anonymous") -> str:
+    # Random suffix: the archive is served while still growing, so two jobs
+    # with the same title must never share a file
+    zip_base = sanitize_playlist_filename(req.playlist_title or "playlist")
 
     download_dir = get_download_path(req.download_path)
     os.makedirs(download_dir, exist_ok=True)
 
-    tmp_dir = tempfile.mkdtemp(dir=download_dir)
+    # Leased for the whole job — the reaper never touches it while we're writing
+    lease = temp_reaper.lease(download_dir)
+    job_id = job_store.create("playlist", req.model_dump(), client_id, req.video_ids, lease.path, zip_base)
+    # Logged before the job starts so it is the first frame every subscriber sees
+    job_store.record(job_id, [{"event": "job", "job_id": job_id, "events_url": f"/jobs/{job_id}/events",
+                               "status_url": f"/jobs/{job_id}"}], {})
+    _launch_playlist_job(job_id, req, client_id, lease, zip_base)
+    return job_id
+
+
+def resume_playlist_jobs() -> int:
+    """
+    Picks up playlist jobs left running by a dead process (restart, crashed
+    worker). Videos rerun in the same temp dir, so yt-dlp continues their
+    .part files and finished ones come straight from the media cache.
+    """
+    resumed = 0
+    for job in job_store.claim_orphans("playlist"):
+        try:
+            req = PlaylistDownloadRequest(**job["request"])
+            lease = temp_reaper.reclaim(job["tmp_dir"])
+            if lease.path != job["tmp_dir"]:
+                logger.info(f"📂 Temp dir of job {job['id']} is gone — starting over in {lease.path}")
+                job_store.set_state(job["id"], "running", tmp_dir=lease.path)
+            job_store.set_video(job["id"], state="pending", percent=None, speed=None, eta=None)
+            _launch_playlist_job(job["id"], req, job["client_id"], lease, job["zip_name"], resumed=True)
+            resumed += 1
+        except Exception as e:
+            logger.exception(f"❌ Could not resume job {job['id']}")
+            job_store.record(job["id"], [{"event": "error", "message": f"❌ Could not resume after restart: {e}"}], {})
+            job_store.set_state(job["id"], "failed")
+    return resumed
+
+
+# Metadata-only extraction for playlist videos; shares cache entries with /preview
+_PLAYLIST_VIDEO_META_OPTS = {"quiet": True, "skip_download": True, "noplaylist": True}
+PLAYLIST_VIDEO_FORMAT = "bestvideo+bestaudio/best"
+
+
+def _playlist_video_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def _playlist_media_key(video_url: str) -> tuple:
+    return normalize_media_key(video_url), PLAYLIST_VIDEO_FORMAT, "playlist", None
+
+
+def _launch_playlist_job(job_id: str, req: PlaylistDownloadRequest, client_id: str, lease, zip_base: str,
+                         resumed: bool = False):
+    """
+    Runs the job in a background thread. Each video is a bulk job on the
+    global download scheduler; queue positions are reported as `queued`
+    events. Once the job is cancelled, queued videos are dropped, running
+    yt-dlp downloads abort from their progress hook, and the temp dir is released.
+    """
+    import yt_dlp  # deferred (see ydl_pool); downloads carry per-video hooks — not pooled
+    from yt_dlp.utils import DownloadCancelled, DownloadError, ReExtractInfo
+
+    playlist_title = req.playlist_title or "playlist"
+    download_dir = os.path.dirname(lease.path)
+    tmp_dir = lease.path
     logger.info(f"📂 Using temp dir: {tmp_dir}")
 
-    q = queue.Queue()
+    # 📨 Coalesced, rate-limited feed (latest progress per video, terminal events always kept),
+    # persisted by the recorder for every subscriber of the job
+    channel = ProgressChannel()
+    emit = channel.emit
+    cancelled = threading.Event()  # cancellation token checked by every video
+    recorder = JobRecorder(job_id, channel, cancelled)
+    recorder.start()
+
+    def prefetch_metadata(index: int) -> Optional[dict]:
+        """Metadata stage: resolve formats ahead of the download stage (not needed for cached media)."""
+        video_url = _playlist_video_url(req.video_ids[index])
+        if cancelled.is_set() or media_cache.contains(_playlist_media_key(video_url)):
+            return None
+        return _extract_info(video_url, _PLAYLIST_VIDEO_META_OPTS)
 
-    def emit(event_type: str, **kwargs):
-        """Push structured JSON events into the SSE queue."""
-        q.put(json.dumps({"event": event_type, **kwargs}))
+    # 🔭 Extraction for upcoming videos overlaps with the downloads in flight
+    prefetcher = LookaheadPrefetcher(len(req.video_ids), prefetch_metadata)
 
     def download_single_video(video_url, index):
         """
         Downloads a single video while emitting progress events.
+        Returns the final (merged) file path, or None on failure — or a
+        Deferred of it when another job is already downloading the same video.
         """
+        if cancelled.is_set():
+            # Dequeued after the job was abandoned — nothing to do
+            cancellation_stats.record("queued_jobs_cancelled")
+            PLAYLIST_VIDEOS.inc(result="skipped")
+            return None
+
+        ydl_format = PLAYLIST_VIDEO_FORMAT
+        media_key = _playlist_media_key(video_url)
+        info = prefetcher.take(index)
+        if info is not None and not signed_urls_fresh(info):
+            info = None  # waited too long in the queue — extract again at download time
+
+        def check_cancelled():
+            # Keep going if another playlist job is waiting on this same download
+            if cancelled.is_set() and not file_flights.waiting(media_key):
+                raise DownloadCancelled("job abandoned")
+
         try:
             video_name = f"video_{index+1}"
-            emit("status", message=f"🎬 Starting download for video #{index + 1}")
+            emit("status", video_index=index, message=f"🎬 Starting download for video #{index + 1}")
 
             def progress_hook(d):
+                check_cancelled()
                 if d["status"] == "downloading":
                     emit(
                         "progress",
@@ -700,86 +1383,217 @@ def download_playlist(req: PlaylistDownloadRequest):
                         message="✅ Finished downloading this video.",
                     )
 
+            pp_started = {}
+
+            def postprocessor_hook(d):
+                if d["status"] == "started":
+                    check_cancelled()  # don't start the merge for nobody
+                    pp_started[d.get("postprocessor")] = time.perf_counter()
+                elif d["status"] == "finished" and d.get("postprocessor") in pp_started:
+                    name = d.get("postprocessor")
+                    MERGE_SECONDS.observe(time.perf_counter() - pp_started.pop(name), postprocessor=name)
+
             class QueueLogger:
                 def debug(self, msg):
                     msg = msg.strip()
                     if any(k in msg for k in ["[download]", "[Merger]", "[ExtractAudio]"]):
-                        emit("log", level="info", message=f"[{video_name}] {msg}")
+                        emit("log", video_index=index, level="info", message=f"[{video_name}] {msg}")
 
                 def warning(self, msg):
-                    emit("log", level="warning", message=f"[{video_name}] ⚠️ {msg.strip()}")
+                    emit("log", video_index=index, level="warning", message=f"[{video_name}] ⚠️ {msg.strip()}")
 
                 def error(self, msg):
-                    emit("log", level="error", message=f"[{video_name}] ❌ {msg.strip()}")
+                    emit("log", video_index=index, level="error", message=f"[{video_name}] ❌ {msg.strip()}")
 
             ydl_opts = {
+                # Stable per-index name: a resumed job continues the same .part file
                 "outtmpl": os.path.join(tmp_dir, f"{index+1} - %(title)s.%(ext)s"),
-                "format": "bestvideo+bestaudio/best",
+                "continuedl": True,
+                "format": ydl_format,
                 "merge_output_format": "mp4",
                 "progress_hooks": [progress_hook],
+                "postprocessor_hooks": [postprocessor_hook],
                 "logger": QueueLogger(),
                 "noplaylist": True,
                 "quiet": True,
                 "ignoreerrors": True,
             }
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-
-            return True
-
+            def fetch() -> Optional[str]:
+                result = None
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    if info is not None:
+                        # Formats already resolved by the prefetch stage — straight to the transfer
+                        # (what --load-info-json does; sanitize_info copies, the cached dict stays untouched)
+                        try:
+                            result = ydl.process_ie_result(ydl.sanitize_info(dict(info), remove_private_keys=True),
+                                                           download=True)
+                        except (DownloadError, ReExtractInfo) as e:
+                            logger.info(f"🔁 Video #{index + 1}: prefetched formats unusable ({e}) — re-extracting")
+                        if not result:
+                            # Signed URLs rejected after all: drop the cached copy and extract afresh
+                            metadata_cache.invalidate(video_url, _PLAYLIST_VIDEO_META_OPTS)
+                    if not result:
+                        result = ydl.extract_info(video_url, download=True)
+                downloads = (result or {}).get("requested_downloads") or []
+                return downloads[0].get("filepath") if downloads else None
+
+            def adopt(shared_path: str) -> str:
+                # Same video fetched by another job — link it in under our own index prefix
+                _, _, name = os.path.basename(shared_path).partition(" - ")
+                emit("status", message=f"🔁 Video #{index + 1} shared with a concurrent download")
+                return link_or_copy(shared_path, os.path.join(tmp_dir, f"{index+1} - {name}"))
+
+            # 💾 Served before? Link it from the media cache instead of downloading
+            cached = media_cache.lookup(media_key)
+            if cached:
+                emit("status", message=f"💾 Video #{index + 1} served from cache")
+                PLAYLIST_VIDEOS.inc(result="cached")
+                emit("video_finished", video_index=index, filename=cached["filename"], message="✅ Finished downloading this video.")
+                return link_or_copy(cached["path"], os.path.join(tmp_dir, f"{index+1} - {cached['filename']}"))
+
+            def fetch_and_cache() -> Optional[str]:
+                path = fetch()
+                if path and os.path.exists(path):
+                    _, _, name = os.path.basename(path).partition(" - ")
+                    ext = os.path.splitext(path)[1].lstrip(".") or "mp4"
+                    media_cache.publish(media_key, path, ext, name, "video/mp4", move=False)
+                return path
+
+            flight = file_flights.run(media_key, fetch_and_cache, adopt)
         except Exception as e:
-            emit("error", message=f"❌ Video #{index + 1} failed: {str(e)}")
-            return False
+            emit("error", video_index=index, message=f"❌ Video #{index + 1} failed: {str(e)}")
+            PLAYLIST_VIDEOS.inc(result="failed")
+            return None
+
+        def finish(flight) -> Optional[str]:
+            try:
+                final_path = flight.result()
+            except DownloadCancelled:
+                cancellation_stats.record("downloads_cancelled")
+                PLAYLIST_VIDEOS.inc(result="cancelled")
+                logger.info(f"🛑 Video #{index + 1} download cancelled (job abandoned)")
+                return None
+            except Exception as e:
+                emit("error", video_index=index, message=f"❌ Video #{index + 1} failed: {str(e)}")
+                PLAYLIST_VIDEOS.inc(result="failed")
+                return None
+
+            if not final_path or not os.path.exists(final_path):
+                emit("error", video_index=index, message=f"❌ Video #{index + 1} produced no file")
+                PLAYLIST_VIDEOS.inc(result="failed")
+                return None
+            PLAYLIST_VIDEOS.inc(result="ok")
+            return final_path
+
+        if flight.done():
+            return finish(flight)
+        # Duplicate of an in-flight download: free this worker slot while the leader finishes
+        return Deferred(flight, finish)
+
+    zip_path = os.path.join(download_dir, zip_base)
+    if resumed and os.path.exists(zip_path):
+        # The dead owner's archive was cut off mid-entry; rebuild it from the top
+        os.remove(zip_path)
+    archive = open_archive(zip_path)
 
     def run_downloader():
+        bind_log_context(job_id=job_id, client_id=client_id)
+        finished = set()
         try:
             total = len(req.video_ids)
-            emit("status", message=f"🚀 Starting playlist download ({total} videos)...")
-
-            # 🧵 Parallel download
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [
-                    executor.submit(
-                        download_single_video,
-                        f"https://www.youtube.com/watch?v={vid_id}",
-                        idx,
-                    )
-                    for idx, vid_id in enumerate(req.video_ids)
-                ]
+            if resumed:
+                # The archive is rebuilt from scratch — clients re-fetch it
+                emit("resumed", message=f"♻️ Resuming playlist download ({total} videos)...",
+                     zip_url=f"/download/{zip_base}")
+            else:
+                emit("status", message=f"🚀 Starting playlist download ({total} videos)...")
+
+            def position_reporter(index):
+                def report(position):
+                    if position > 0:
+                        emit("queued", video_index=index, position=position,
+                             message=queued_message(index, position))
+                return report
+
+            # 🧵 Parallel download via the global scheduler (shared worker cap)
+            prefetcher.start()
+            jobs = [
+                download_scheduler.submit(
+                    download_single_video,
+                    _playlist_video_url(vid_id),
+                    idx,
+                    client_id=client_id,
+                    priority=PRIORITY_BULK,
+                    on_position=position_reporter(idx),
+                )
+                for idx, vid_id in enumerate(req.video_ids)
+            ]
 
+            indices = {job.future: idx for idx, job in enumerate(jobs)}
+            try:
                 completed = 0
-                for future in concurrent.futures.as_completed(futures):
-                    _ = future.result()
+                for future in _completed_until(cancelled, list(indices)):
+                    final_path = future.result()
                     completed += 1
+                    finished.add(indices[future])
+                    # Final row carries the archived name: the recorder's own video_finished
+                    # update may land after this and is ignored once the state is final
+                    if final_path:
+                        job_store.set_video(job_id, indices[future], state="done",
+                                            filename=os.path.basename(final_path))
+                    else:
+                        job_store.set_video(job_id, indices[future], state="failed")
+                    temp_reaper.renew(lease)  # long playlists keep their temp dir alive
+                    # 📦 Append each finished video straight into the archive
+                    if final_path:
+                        archive.add_file(final_path)
+                        if archive.entries == 1:
+                            emit(
+                                "archive_ready",
+                                message="📦 ZIP download available — more videos will follow",
+                                zip_url=f"/download/{zip_base}",
+                            )
                     emit("status", message=f"✅ {completed}/{total} videos completed")
+            finally:
+                # Don't leave queued work behind if we bail out early
+                dropped = sum(download_scheduler.cancel(job) for job in jobs)
+                if dropped:
+                    cancellation_stats.record("queued_jobs_cancelled", dropped)
+
+            if cancelled.is_set():
+                # Running jobs stop at their next progress tick; wait so the temp dir is free to go
+                concurrent.futures.wait([job.future for job in jobs if not job.future.cancelled()])
+                raise DownloadCancelled("job abandoned")
 
-            # 📦 Create ZIP archive
-            emit("status", message="📦 Creating ZIP archive...")
-            zip_path = os.path.join(download_dir, zip_base)
-            shutil.make_archive(zip_path[:-4], "zip", tmp_dir)
+            archive.finalize()
 
+            recorder.final_state = "completed"
             emit(
                 "completed",
                 message="✅ Playlist download finished!",
                 zip_url=f"/download/{zip_base}",
             )
 
+        except DownloadCancelled:
+            logger.info(f"🛑 Playlist '{playlist_title}' cancelled — no subscriber within {JOB_DETACH_GRACE}s")
+            archive.abort()
+            recorder.final_state = "cancelled"
+            for idx in set(range(len(req.video_ids))) - finished:
+                job_store.set_video(job_id, idx, state="cancelled")
+            emit("error", message=f"🛑 Playlist download cancelled — nobody was watching for {JOB_DETACH_GRACE}s")
+            cancellation_stats.record("temp_dirs_released")
         except Exception as e:
             logger.exception("Playlist download failed")
+            archive.abort()
+            recorder.final_state = "failed"
             emit("error", message=f"❌ {e}")
         finally:
-            q.put("__done__")
+            prefetcher.close()
+            temp_reaper.release(lease)
+            channel.close()
 
     # 🔄 Start background thread
-    threading.Thread(target=run_downloader, daemon=True).start()
-
-    def event_stream():
-        """Stream JSON messages to client via SSE."""
-        while True:
-            msg = q.get()
-            if msg == "__done__":
-                break
-            yield f"data: {msg}\n\n"
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+    # (with the starting request's log context, so its request ID stays on the job's lines)
+    threading.Thread(target=contextvars.copy_context().run, args=(run_downloader,), daemon=True,
+                     name=f"playlist-{job_id}").start()
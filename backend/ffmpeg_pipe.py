@@ -0,0 +1,185 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from cancellation import cancellation_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ ffmpeg Pipe Configuration
+# ────────────────────────────────────────────────
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFMPEG_READ_CHUNK = int(os.getenv("FFMPEG_READ_CHUNK", str(256 * 1024)))
+# asyncio pauses the pipe once ~2x this is buffered, so ffmpeg blocks instead of us growing memory
+FFMPEG_PIPE_LIMIT = int(os.getenv("FFMPEG_PIPE_LIMIT", str(1024 * 1024)))
+
+# Fragmented MP4 can be written to a non-seekable pipe and played while still arriving
+FRAGMENTED_MP4_FLAGS = ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4"]
+
+# codec → (encoder, muxer, file ext, content type); every muxer here writes to a pipe without seeking
+AUDIO_CODECS = {
+    "mp3": ("libmp3lame", "mp3", "mp3", "audio/mpeg"),
+    "opus": ("libopus", "ogg", "opus", "audio/ogg"),
+    "aac": ("aac", "adts", "aac", "audio/aac"),
+}
+DEFAULT_AUDIO_CODEC = os.getenv("DEFAULT_AUDIO_CODEC", "mp3")
+DEFAULT_AUDIO_BITRATE = int(os.getenv("DEFAULT_AUDIO_BITRATE", "192"))  # kbps
+MIN_AUDIO_BITRATE = 32
+MAX_AUDIO_BITRATE = 320
+
+
+class FFmpegError(RuntimeError):
+    def __init__(self, returncode: int, stderr_tail: str):
+        super().__init__(f"ffmpeg exited with code {returncode}: {stderr_tail}")
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+
+
+def http_input_args(url: str, headers: Optional[dict] = None, seek: Optional[float] = None) -> list[str]:
+    """
+    ffmpeg input options for reading a signed HTTP URL directly.
+    `-ss` before `-i` makes ffmpeg seek via HTTP range requests instead of
+    downloading and discarding everything before the start point.
+    """
+    args = ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+    if headers:
+        headers = dict(headers)
+        user_agent = headers.pop("User-Agent", None)
+        if user_agent:
+            args += ["-user_agent", user_agent]
+        extra = "".join(f"{k}: {v}\r\n" for k, v in headers.items() if k.lower() not in ("range", "connection"))
+        if extra:
+            args += ["-headers", extra]
+    if seek:
+        args += ["-ss", f"{seek:.3f}"]
+    args += ["-i", url]
+    return args
+
+
+def build_trim_args(url: str, headers: Optional[dict], start: float, duration: Optional[float],
+                    include_video: bool = True) -> list[str]:
+    """
+    Stream-copy [start, start + duration) of a remote media URL into fragmented MP4 on stdout.
+    """
+    args = ["-hide_banner", "-loglevel", "error", "-nostdin"]
+    args += http_input_args(url, headers, seek=start)
+    if duration:
+        args += ["-t", f"{duration:.3f}"]
+    if include_video:
+        args += ["-map", "0:v?"]
+    args += [
+        "-map", "0:a?",
+        "-c", "copy",
+        "-avoid_negative_ts", "make_zero",
+        *FRAGMENTED_MP4_FLAGS,
+        "pipe:1",
+    ]
+    return args
+
+
+def build_merge_args(inputs: list[tuple[str, Optional[dict]]], start: Optional[float] = None,
+                     duration: Optional[float] = None) -> list[str]:
+    """
+    Stream-copy the video of the first input and the audio of the last one
+    (a single input supplies both) into fragmented MP4 on stdout.
+    Each input seeks on its own, so a trim window fetches only the clip from both URLs.
+    """
+    args = ["-hide_banner", "-loglevel", "error", "-nostdin"]
+    for url, headers in inputs:
+        args += http_input_args(url, headers, seek=start)
+    if duration:
+        args += ["-t", f"{duration:.3f}"]
+    args += [
+        "-map", "0:v:0",
+        "-map", f"{len(inputs) - 1}:a:0?",
+        "-c", "copy",
+        "-avoid_negative_ts", "make_zero",
+        *FRAGMENTED_MP4_FLAGS,
+        "pipe:1",
+    ]
+    return args
+
+
+def resolve_audio_settings(codec: Optional[str], bitrate: Optional[int]) -> tuple[str, int]:
+    """
+    Validate a requested audio codec / bitrate (kbps), falling back to the defaults.
+    Raises ValueError for an unknown codec; the bitrate is clamped.
+    """
+    codec = (codec or DEFAULT_AUDIO_CODEC).lower()
+    if codec not in AUDIO_CODECS:
+        raise ValueError(f"Unsupported audio codec '{codec}' (expected one of: {', '.join(AUDIO_CODECS)})")
+    bitrate = bitrate or DEFAULT_AUDIO_BITRATE
+    return codec, max(MIN_AUDIO_BITRATE, min(int(bitrate), MAX_AUDIO_BITRATE))
+
+
+def build_audio_transcode_args(url: str, headers: Optional[dict], codec: str, bitrate: int,
+                               start: Optional[float] = None, duration: Optional[float] = None) -> list[str]:
+    """
+    Decode the first audio stream of a remote media URL and re-encode it to
+    `codec` at `bitrate` kbps on stdout. Optionally limited to [start, start + duration).
+    """
+    encoder, muxer, _, _ = AUDIO_CODECS[codec]
+    args = ["-hide_banner", "-loglevel", "error", "-nostdin"]
+    args += http_input_args(url, headers, seek=start)
+    if duration:
+        args += ["-t", f"{duration:.3f}"]
+    args += [
+        "-map", "0:a:0",
+        "-vn",
+        "-c:a", encoder,
+        "-b:a", f"{bitrate}k",
+        "-f", muxer,
+        "pipe:1",
+    ]
+    return args
+
+
+async def _drain_stderr(stream: asyncio.StreamReader, tail: deque):
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        tail.append(line.decode(errors="replace").rstrip())
+
+
+async def stream_ffmpeg(args: list[str], chunk_size: int = FFMPEG_READ_CHUNK) -> AsyncIterator[bytes]:
+    """
+    Run ffmpeg and yield its stdout in chunks.
+    The child is killed if the consumer stops early (client disconnect, error),
+    and a non-zero exit raises FFmpegError with the last stderr lines.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG_BIN, *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=FFMPEG_PIPE_LIMIT,
+    )
+    stderr_tail: deque = deque(maxlen=20)
+    stderr_task = asyncio.create_task(_drain_stderr(proc.stderr, stderr_tail))
+    logger.info(f"🎞️ [FFMPEG] started pid={proc.pid}")
+
+    try:
+        while True:
+            chunk = await proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+        returncode = await proc.wait()
+        await stderr_task
+        if returncode != 0:
+            raise FFmpegError(returncode, " | ".join(stderr_tail))
+        logger.info(f"✅ [FFMPEG] pid={proc.pid} finished")
+    finally:
+        if proc.returncode is None:
+            logger.info(f"🛑 [FFMPEG] killing pid={proc.pid} (consumer stopped)")
+            proc.kill()
+            cancellation_stats.record("ffmpeg_killed")
+            await proc.wait()
+        stderr_task.cancel()
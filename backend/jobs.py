@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+import logging
+from typing import Awaitable, Callable, Optional
+
+from progress_channel import ProgressChannel, PROGRESS_FLUSH_HZ, PROGRESS_HEARTBEAT_SECS, sse_frame
+from shared_state import SharedStore, shared_store, owner_token, owner_alive
+from log_config import bind_log_context
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Job Configuration
+# ────────────────────────────────────────────────
+# A running job with no SSE subscriber for this long is cancelled (reconnects within it resume)
+JOB_DETACH_GRACE = int(os.getenv("JOB_DETACH_GRACE", "30"))
+# Finished jobs (and their event logs) are kept this long for GET /jobs/{id}
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(24 * 3600)))
+# How often a connected subscriber marks the job as watched
+JOB_WATCH_INTERVAL = 2.0
+# Video rows are re-read this far back each tick, so a write committed just after a read isn't missed
+JOB_POLL_OVERLAP = 1.0
+
+ACTIVE_JOB_STATES = ("running",)
+# Per-video state implied by an event; FINAL_VIDEO_STATES are set by the job and never overwritten by events
+VIDEO_STATE_EVENTS = {"queued": "queued", "progress": "downloading", "video_finished": "downloaded", "error": "failed"}
+FINAL_VIDEO_STATES = ("done", "failed", "cancelled")
+# Only the latest of these matters — kept as per-video state, never appended to the event log
+# (so are a video's info-level yt-dlp log lines: the latest one is kept on its row)
+SNAPSHOT_EVENTS = frozenset({"progress", "queued"})
+
+
+def queued_message(index: int, position: int) -> str:
+    return f"⏳ Video #{index + 1} queued (position {position})"
+
+
+class JobStore:
+    """
+    Durable playlist jobs in the shared store: the job row, per-video state,
+    and an append-only log of the events worth replaying (everything except
+    progress ticks, queue positions and info-level yt-dlp lines, whose latest
+    value lives on the video row instead).
+    Any worker can read a job; only the owner process writes its log.
+    """
+
+    def __init__(self, store: SharedStore = shared_store):
+        self.store = store
+
+    # ── owner side ─────────────────────────────────────────────────
+    def create(self, kind: str, request: dict, client_id: str, video_ids: list[str],
+               tmp_dir: str, zip_name: str) -> str:
+        job_id = uuid.uuid4().hex[:16]
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, state, request, client_id, tmp_dir, zip_name, total, owner, "
+                "last_seen, created, updated) VALUES (?, ?, 'running', ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(request), client_id, tmp_dir, zip_name, len(video_ids), owner_token(),
+                 now, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO job_videos (job_id, idx, video_id, state, updated) VALUES (?, ?, ?, 'pending', ?)",
+                [(job_id, i, vid, now) for i, vid in enumerate(video_ids)],
+            )
+            expired = "SELECT id FROM jobs WHERE state != 'running' AND updated < ?"
+            conn.execute(f"DELETE FROM job_events WHERE job_id IN ({expired})", (now - JOB_RETENTION,))
+            conn.execute(f"DELETE FROM job_videos WHERE job_id IN ({expired})", (now - JOB_RETENTION,))
+            conn.execute("DELETE FROM jobs WHERE state != 'running' AND updated < ?", (now - JOB_RETENTION,))
+        return job_id
+
+    def record(self, job_id: str, events: list[dict], videos: dict[int, dict], final: bool = False) -> int:
+        """
+        Append `events` (assigning ids) and apply per-video updates in one transaction.
+        Updates only touch videos not yet in a final state, unless `final` is set.
+        """
+        now = time.time()
+        guard = "" if final else f" AND state NOT IN {FINAL_VIDEO_STATES}"
+        with self.store.transaction() as conn:
+            seq = conn.execute("SELECT last_seq FROM jobs WHERE id = ?", (job_id,)).fetchone()["last_seq"]
+            rows = []
+            for event in events:
+                seq += 1
+                event["id"] = seq
+                rows.append((job_id, seq, json.dumps(event)))
+            conn.executemany("INSERT INTO job_events (job_id, seq, event) VALUES (?, ?, ?)", rows)
+            for idx, fields in videos.items():
+                columns = ", ".join(f"{name} = ?" for name in fields)
+                conn.execute(f"UPDATE job_videos SET {columns}, updated = ? WHERE job_id = ? AND idx = ?{guard}",
+                             (*fields.values(), now, job_id, idx))
+            conn.execute("UPDATE jobs SET last_seq = ?, updated = ? WHERE id = ?", (seq, now, job_id))
+        return seq
+
+    def set_video(self, job_id: str, idx: Optional[int] = None, **fields):
+        """Authoritative per-video update (`idx=None` = every video of the job)."""
+        if idx is None:
+            columns = "".join(f", {name} = ?" for name in fields)
+            self.store.execute(f"UPDATE job_videos SET updated = ?{columns} WHERE job_id = ?",
+                               (time.time(), *fields.values(), job_id))
+            return
+        self.record(job_id, [], {idx: fields}, final=True)
+
+    def set_state(self, job_id: str, state: str, **fields):
+        columns = "".join(f", {name} = ?" for name in fields)
+        self.store.execute(f"UPDATE jobs SET state = ?, updated = ?{columns} WHERE id = ?",
+                           (state, time.time(), *fields.values(), job_id))
+
+    def claim_orphans(self, kind: str) -> list[dict]:
+        """
+        Take ownership of running jobs whose owner process is gone (restart,
+        crashed worker). The owner compare-and-set makes each claim unique.
+        """
+        claimed = []
+        for row in self.store.query("SELECT id, owner FROM jobs WHERE kind = ? AND state = 'running'", (kind,)):
+            if owner_alive(row["owner"]):
+                continue
+            cur = self.store.execute("UPDATE jobs SET owner = ?, last_seen = ?, updated = ? "
+                                     "WHERE id = ? AND owner = ?",
+                                     (owner_token(), time.time(), time.time(), row["id"], row["owner"]))
+            if cur.rowcount:
+                claimed.append(self.get(row["id"]))
+        return claimed
+
+    def last_seen(self, job_id: str) -> float:
+        row = self.store.query_one("SELECT last_seen FROM jobs WHERE id = ?", (job_id,))
+        return row["last_seen"] if row else 0.0
+
+    # ── reader side (any worker) ───────────────────────────────────
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self.store.query_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if row is None:
+            return None
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        return job
+
+    def touch(self, job_id: str):
+        """A subscriber is watching — keeps the job from being cancelled as abandoned."""
+        self.store.execute("UPDATE jobs SET last_seen = ? WHERE id = ?", (time.time(), job_id))
+
+    def events_after(self, job_id: str, seq: int) -> list[dict]:
+        rows = self.store.query("SELECT event FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                                (job_id, seq))
+        return [json.loads(row["event"]) for row in rows]
+
+    def videos(self, job_id: str, changed_since: float = 0.0) -> list[dict]:
+        rows = self.store.query("SELECT * FROM job_videos WHERE job_id = ? AND updated > ? ORDER BY idx",
+                                (job_id, changed_since))
+        return [dict(row) for row in rows]
+
+    def poll(self, job_id: str, after_seq: int, changed_since: float,
+             touch: bool = False) -> Optional[tuple[dict, list[dict], list[dict], float]]:
+        """
+        One subscriber tick, meant for a worker thread: (job, videos changed
+        since `changed_since`, events after `after_seq`, time of the video read),
+        or None if the job is unknown. The job row is read before the log, so
+        a finished job's last events are always included.
+        """
+        if touch:
+            self.touch(job_id)
+        job = self.get(job_id)
+        if job is None:
+            return None
+        polled_at = time.time()
+        return job, self.videos(job_id, changed_since), self.events_after(job_id, after_seq), polled_at
+
+    def snapshot(self, job_id: str) -> Optional[dict]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        videos = self.videos(job_id)
+        counts: dict[str, int] = {}
+        for video in videos:
+            counts[video["state"]] = counts.get(video["state"], 0) + 1
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "state": job["state"],
+            "playlist_title": job["request"].get("playlist_title"),
+            "total": job["total"],
+            "counts": counts,
+            "zip_url": f"/download/{job['zip_name']}" if job["zip_name"] else None,
+            "events_url": f"/jobs/{job['id']}/events",
+            "last_event_id": job["last_seq"],
+            "created": job["created"],
+            "updated": job["updated"],
+            "videos": [
+                {k: video[k] for k in ("idx", "video_id", "state", "percent", "speed", "eta", "position",
+                                       "filename", "message")}
+                for video in videos
+            ],
+        }
+
+    def stats(self) -> dict:
+        counts = {state: 0 for state in (*ACTIVE_JOB_STATES, "completed", "failed", "cancelled")}
+        for row in self.store.query("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+            counts[row["state"]] = row["n"]
+        return counts
+
+
+job_store = JobStore()
+
+
+class JobRecorder:
+    """
+    Owner-side pump for one job: drains its ProgressChannel at the flush rate
+    into the store (so hooks still cost a dict assignment), and cancels the
+    job once nobody has watched it for JOB_DETACH_GRACE seconds.
+    """
+
+    def __init__(self, job_id: str, channel: ProgressChannel, cancelled: threading.Event,
+                 store: JobStore = job_store):
+        self.job_id = job_id
+        self.channel = channel
+        self.cancelled = cancelled
+        self.store = store
+        self.final_state = "failed"  # set by the job before it closes the channel
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"job-{job_id}")
+
+    def start(self):
+        self._thread.start()
+
+    def _persist(self, batch: list[dict]):
+        events, videos = [], {}
+        for event in batch:
+            idx = event.get("video_index")
+            name = event["event"]
+            if idx is not None:
+                fields = videos.setdefault(idx, {})
+                if name in VIDEO_STATE_EVENTS:
+                    fields["state"] = VIDEO_STATE_EVENTS[name]
+                if name == "progress":
+                    fields.update(percent=event.get("percent"), speed=event.get("speed"), eta=event.get("eta"))
+                elif name == "queued":
+                    fields["position"] = event.get("position")
+                elif name == "log" and event.get("level") == "info":
+                    fields["log"] = event.get("message")
+                    continue
+                if event.get("filename"):
+                    fields["filename"] = event["filename"]
+                if event.get("message"):
+                    fields["message"] = event["message"]
+            if name in SNAPSHOT_EVENTS:
+                continue
+            events.append(event)
+        if events or videos:
+            self.store.record(self.job_id, events, {i: f for i, f in videos.items() if f})
+
+    def _run(self):
+        bind_log_context(job_id=self.job_id)
+        interval = 1.0 / max(PROGRESS_FLUSH_HZ, 0.1)
+        while True:
+            batch, closed = self.channel.drain()
+            try:
+                self._persist(batch)
+            except Exception as e:
+                logger.warning(f"⚠️ [JOB {self.job_id}] failed to persist {len(batch)} events: {e}")
+            if closed:
+                self.store.set_state(self.job_id, self.final_state)
+                logger.info(f"🏁 [JOB {self.job_id}] {self.final_state}")
+                return
+            if not self.cancelled.is_set() and time.time() - self.store.last_seen(self.job_id) > JOB_DETACH_GRACE:
+                logger.info(f"🛑 [JOB {self.job_id}] no subscriber for {JOB_DETACH_GRACE}s — cancelling")
+                self.cancelled.set()
+            time.sleep(interval)
+
+
+def _video_state_events(video: dict) -> list[dict]:
+    """The coalesced per-video frames a job_videos row stands for."""
+    events = []
+    if video["state"] == "queued" and video["position"]:
+        events.append({"event": "queued", "video_index": video["idx"], "position": video["position"],
+                       "message": queued_message(video["idx"], video["position"])})
+    elif video["state"] == "downloading" and video["percent"]:
+        events.append({"event": "progress", "video_index": video["idx"], "filename": video["filename"] or "",
+                       "percent": video["percent"], "speed": video["speed"] or "", "eta": video["eta"] or ""})
+    if video["log"]:
+        events.append({"event": "log", "video_index": video["idx"], "level": "info", "message": video["log"]})
+    return events
+
+
+async def stream_job_events(job_id: str, last_event_id: int = 0,
+                            is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                            store: JobStore = job_store):
+    """
+    SSE feed of a job from any worker: replays logged events after
+    `last_event_id`, then follows the log plus per-video progress, queue
+    positions and latest yt-dlp line at the flush rate until the job ends.
+    Those per-video frames carry no id — on reconnect the current state of
+    every video is sent again instead.
+    """
+    interval = 1.0 / max(PROGRESS_FLUSH_HZ, 0.1)
+    progress_since = 0.0
+    sent_state: dict[tuple, dict] = {}  # (video index, event) → last per-video frame sent to this subscriber
+    last_watch = 0.0
+    last_write = time.monotonic()
+    while True:
+        if is_disconnected and await is_disconnected():
+            logger.info(f"🔌 [JOB {job_id}] subscriber disconnected at event {last_event_id}")
+            return
+        touch = time.monotonic() - last_watch >= JOB_WATCH_INTERVAL
+        # SQLite may wait on another worker's write lock — never on the event loop
+        polled = await asyncio.to_thread(store.poll, job_id, last_event_id, progress_since, touch)
+        if touch:
+            last_watch = time.monotonic()
+        if polled is None:
+            yield sse_frame({"event": "error", "message": f"❌ Unknown job {job_id}"})
+            return
+        job, videos, events, polled_at = polled
+        progress_since = polled_at - JOB_POLL_OVERLAP
+        finished = job["state"] not in ACTIVE_JOB_STATES
+
+        frames = []
+        for video in videos:
+            for event in _video_state_events(video):
+                key = (video["idx"], event["event"])
+                if sent_state.get(key) != event:
+                    sent_state[key] = event
+                    frames.append(sse_frame(event))
+        for event in events:
+            last_event_id = event["id"]
+            frames.append(sse_frame(event))
+
+        if frames:
+            yield "".join(frames)
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= PROGRESS_HEARTBEAT_SECS:
+            yield ": heartbeat\n\n"
+            last_write = time.monotonic()
+        if finished:
+            return
+        await asyncio.sleep(interval)
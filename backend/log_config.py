@@ -0,0 +1,241 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from uuid import uuid4
+from datetime import datetime, timezone
+from typing import Optional
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Logging Configuration
+# ────────────────────────────────────────────────
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text" (human-readable, for local dev)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+# Records buffered for the writer thread; beyond this they are dropped, never waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Sampled hot-path logs: at most LOG_SAMPLE_BURST lines per key every LOG_SAMPLE_INTERVAL seconds
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "1.0"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "5"))
+
+# Request / job identity attached to every record emitted in this context
+_log_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+
+# LogRecord attributes that aren't `extra=` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def bind_log_context(**fields) -> contextvars.Token:
+    """Add fields (request_id, job_id, client_id, …) to every log record in the current context."""
+    return _log_context.set({**_log_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+
+
+def reset_log_context(token: contextvars.Token):
+    _log_context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, bound context and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Copies the bound context onto the record on the emitting thread (contextvars don't cross the queue)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread. Only %-interpolation (and traceback
+    rendering) happens on the caller; timestamps, JSON and I/O happen on the
+    writer. A full queue drops the record instead of stalling the caller.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Args may be mutable objects owned by the caller — resolve them now
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    The process's single logging setup: every logger (including uvicorn's)
+    feeds a bounded queue drained by one background thread that formats and
+    writes to the daily log file and stderr. Request handlers and download
+    threads never wait on disk or on a handler lock held by another thread.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.handler = _NonBlockingQueueHandler(self._queue)
+        self.handler.addFilter(_ContextFilter())
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._lock = threading.Lock()
+
+    def configure(self):
+        """Idempotent: the first caller in the process installs the pipeline."""
+        with self._lock:
+            if self._listener is not None:
+                return
+            os.makedirs(LOG_DIR, exist_ok=True)
+            log_file = os.path.join(LOG_DIR, f"app_{datetime.now().strftime('%Y%m%d')}.log")
+            if LOG_FORMAT == "text":
+                formatter = logging.Formatter("%(asctime)s [%(levelname)s] — %(message)s")
+            else:
+                formatter = JsonFormatter()
+            writers = [logging.FileHandler(log_file), logging.StreamHandler(sys.stderr)]
+            for writer in writers:
+                writer.setFormatter(formatter)
+
+            root = logging.getLogger()
+            for existing in list(root.handlers):
+                root.removeHandler(existing)
+            root.addHandler(self.handler)
+            root.setLevel(LOG_LEVEL)
+            # uvicorn installs its own synchronous handlers; route them through the queue too
+            for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+                uv_logger = logging.getLogger(name)
+                uv_logger.handlers = []
+                uv_logger.propagate = True
+
+            self._listener = logging.handlers.QueueListener(self._queue, *writers)
+            self._listener.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Flush what is queued and stop the writer (at interpreter exit)."""
+        with self._lock:
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "dropped": self.handler.dropped, "sampled_out": log_sampler.suppressed}
+
+
+class LogSampler:
+    """Per-key fixed-window limit for hot-path logs (a seeking player, per-attempt stream logs)."""
+
+    def __init__(self, interval: float = LOG_SAMPLE_INTERVAL, burst: int = LOG_SAMPLE_BURST):
+        self.interval = interval
+        self.burst = burst
+        self._windows: dict[str, list] = {}  # key → [window start, lines emitted, lines suppressed]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def allow(self, key: str) -> Optional[int]:
+        """None if this line should be skipped, else how many were skipped since the last one."""
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                skipped = window[2] if window else 0
+                if len(self._windows) > 1024:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                return skipped
+            if window[1] < self.burst:
+                window[1] += 1
+                skipped, window[2] = window[2], 0
+                return skipped
+            window[2] += 1
+            self.suppressed += 1
+            return None
+
+
+log_pipeline = LogPipeline()
+log_sampler = LogSampler()
+
+
+def configure_logging():
+    log_pipeline.configure()
+
+
+def log_sampled(logger: logging.Logger, key: str, msg: str, *args, level: int = logging.INFO):
+    """
+    Lazily formatted, rate-limited log line: nothing is formatted when the
+    level is disabled or the key is over its budget; the next line that gets
+    through reports how many were skipped.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    skipped = log_sampler.allow(key)
+    if skipped is None:
+        return
+    logger.log(level, msg, *args, extra={"skipped": skipped} if skipped else None)
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware (streaming bodies pass straight through): binds a
+    request ID — the caller's X-Request-Id or a fresh one — for every log line
+    of the request, and echoes it in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid4().hex[:16]
+        raw_id = request_id.encode("latin-1")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", raw_id)]
+            await send(message)
+
+        token = bind_log_context(request_id=request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            reset_log_context(token)
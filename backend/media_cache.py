@@ -0,0 +1,163 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+from typing import Optional
+
+from shared_state import SharedStore, shared_store
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Media Cache Configuration
+# ────────────────────────────────────────────────
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(os.getcwd(), "downloads", ".media_cache"))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))  # 10 GiB
+MEDIA_CACHE_POLICY = os.getenv("MEDIA_CACHE_POLICY", "lru").lower()  # "lru" or "lfu"
+MEDIA_CACHE_ENABLED = os.getenv("MEDIA_CACHE_ENABLED", "1") != "0"
+
+
+class MediaCache:
+    """
+    Content-addressed on-disk cache of finished media files.
+
+    Files are named by a hash of their cache key (video id, format id, mode,
+    trim window) and published atomically with rename, so a reader never sees
+    a partial file. The index (size / access stats per entry) lives in the
+    host-wide shared store, so every worker sees the same entries and a single
+    byte budget; lookups are one primary-key read and never scan the directory.
+    When the budget is exceeded, entries are evicted LRU (or LFU).
+    """
+
+    def __init__(self, root: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES,
+                 policy: str = MEDIA_CACHE_POLICY, store: SharedStore = shared_store):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.store = store
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    # ── keys / paths ───────────────────────────────────────────────
+    @staticmethod
+    def digest(key: tuple) -> str:
+        return hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+
+    def _path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, f"{digest}.{ext}")
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    # ── public API ─────────────────────────────────────────────────
+    def contains(self, key: tuple) -> bool:
+        """Cheap membership check (no hit/miss accounting, no access bump)."""
+        if not MEDIA_CACHE_ENABLED:
+            return False
+        row = self.store.query_one("SELECT ext FROM media_cache WHERE digest = ?", (self.digest(key),))
+        return row is not None and os.path.exists(self._path_for(self.digest(key), row["ext"]))
+
+    def lookup(self, key: tuple) -> Optional[dict]:
+        """
+        Return {"path", "size", "filename", "content_type"} for a cached key, or None.
+        """
+        if not MEDIA_CACHE_ENABLED:
+            return None
+        digest = self.digest(key)
+        row = self.store.query_one("SELECT * FROM media_cache WHERE digest = ?", (digest,))
+        if row is None:
+            self._count("misses")
+            return None
+        path = self._path_for(digest, row["ext"])
+        if not os.path.exists(path):
+            # File vanished behind our back (or another worker evicted it) — forget it
+            self.store.execute("DELETE FROM media_cache WHERE digest = ?", (digest,))
+            self._count("misses")
+            return None
+        now = time.time()
+        self.store.execute("UPDATE media_cache SET last_access = ?, hits = hits + 1 WHERE digest = ?", (now, digest))
+        self._count("hits")
+        entry = dict(row)
+        entry.update(last_access=now, hits=row["hits"] + 1, path=path)
+        return entry
+
+    def publish(self, key: tuple, src_path: str, ext: str, filename: str, content_type: str,
+                move: bool = True) -> bool:
+        """
+        Atomically add a finished file to the cache.
+        `move=True` renames `src_path` into place (it must be on the same filesystem);
+        `move=False` hard-links it so the caller keeps its copy.
+        Returns False if the file was not cached (disabled / larger than the budget).
+        """
+        if not MEDIA_CACHE_ENABLED:
+            return False
+        size = os.path.getsize(src_path)
+        if size > self.max_bytes:
+            return False
+
+        digest = self.digest(key)
+        final_path = self._path_for(digest, ext)
+
+        if not move:
+            # Link under a temp name first so the final name only ever appears complete
+            staged = os.path.join(self.root, f".staged-{digest}-{os.getpid()}-{threading.get_ident()}")
+            try:
+                os.link(src_path, staged)
+            except OSError:
+                return False
+            src_path = staged
+
+        now = time.time()
+        with self.store.transaction() as conn:
+            os.replace(src_path, final_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO media_cache (digest, key, ext, size, filename, content_type, created, "
+                "last_access, hits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (digest, repr(key), ext, size, filename, content_type, now, now),
+            )
+            self._evict_locked(conn, keep=digest)
+
+        logger.info(f"💾 [MEDIA CACHE] stored {filename} ({size} bytes) as {digest}")
+        return True
+
+    def _evict_locked(self, conn, keep: Optional[str] = None):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM media_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        order = "hits, last_access" if self.policy == "lfu" else "last_access"
+        for row in conn.execute(f"SELECT digest, ext, size, filename FROM media_cache ORDER BY {order}").fetchall():
+            if total <= self.max_bytes:
+                break
+            if row["digest"] == keep:
+                continue
+            try:
+                os.remove(self._path_for(row["digest"], row["ext"]))
+            except FileNotFoundError:
+                pass
+            conn.execute("DELETE FROM media_cache WHERE digest = ?", (row["digest"],))
+            total -= row["size"]
+            self._count("evictions")
+            logger.info(f"🧹 [MEDIA CACHE] evicted {row['filename']} ({row['size']} bytes)")
+
+    def stats(self) -> dict:
+        row = self.store.query_one("SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes FROM media_cache")
+        with self._lock:
+            return {
+                "entries": row["entries"],
+                "bytes": row["bytes"],
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+media_cache = MediaCache()
@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Optional
+from urllib.parse import urlparse, parse_qs
+
+from shared_state import SharedStore, shared_store
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Cache Configuration
+# ────────────────────────────────────────────────
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "256"))
+METADATA_CACHE_DEFAULT_TTL = int(os.getenv("METADATA_CACHE_DEFAULT_TTL", "1800"))  # 30 minutes
+# Signed googlevideo URLs carry an `expire=` timestamp; drop the entry this many
+# seconds before that so a cached URL is never handed out right as it dies.
+METADATA_CACHE_EXPIRY_MARGIN = int(os.getenv("METADATA_CACHE_EXPIRY_MARGIN", "300"))
+# Second level in the host-wide shared store, so a preview on one worker warms the others
+METADATA_CACHE_SHARED = os.getenv("METADATA_CACHE_SHARED", "1") != "0"
+
+# Only these yt-dlp options change what extract_info returns — output flags such as
+# quiet / dump_single_json / forcejson must not split the cache.
+_KEY_OPTS = ("extract_flat", "noplaylist", "cookiefile", "playlist_items")
+
+_YT_ID_PATTERNS = [
+    re.compile(r"(?:v=|/shorts/|/embed/|/live/|youtu\.be/)([A-Za-z0-9_-]{11})"),
+]
+_YT_LIST_PATTERN = re.compile(r"[?&]list=([A-Za-z0-9_-]+)")
+
+
+def normalize_media_key(url: str, playlist: bool = False) -> str:
+    """
+    Reduce a YouTube URL to a stable identifier so that
+    `youtu.be/ID`, `watch?v=ID&t=10` and `/shorts/ID` share one cache entry.
+    Falls back to the stripped URL for anything we don't recognise.
+    """
+    if playlist:
+        match = _YT_LIST_PATTERN.search(url)
+        if match:
+            return f"list:{match.group(1)}"
+    else:
+        for pattern in _YT_ID_PATTERNS:
+            match = pattern.search(url)
+            if match:
+                return f"video:{match.group(1)}"
+    return f"url:{url.strip()}"
+
+
+def _signed_url_expiry(info: dict) -> Optional[float]:
+    """
+    Return the earliest `expire=` epoch found in the format URLs of an info dict,
+    or None if no signed URL is present (e.g. flat playlist extraction).
+    """
+    earliest = None
+    for f in info.get("formats") or []:
+        stream_url = f.get("url")
+        if not stream_url:
+            continue
+        expire = parse_qs(urlparse(stream_url).query).get("expire")
+        if not expire:
+            continue
+        try:
+            ts = float(expire[0])
+        except ValueError:
+            continue
+        earliest = ts if earliest is None else min(earliest, ts)
+    return earliest
+
+
+def signed_urls_fresh(info: dict, margin: int = METADATA_CACHE_EXPIRY_MARGIN) -> bool:
+    """False once the signed format URLs of `info` are within `margin` seconds of expiring."""
+    expiry = _signed_url_expiry(info)
+    return expiry is None or expiry - margin > time.time()
+
+
+class MetadataCache:
+    """
+    Process-wide LRU + TTL cache for yt-dlp `extract_info` results.
+
+    Entries expire at whichever comes first: the default TTL, or the signed
+    format URL expiry minus a safety margin. Concurrent misses on the same key
+    wait on a single extraction instead of each running their own.
+    Cached info dicts are shared — callers must treat them as read-only.
+
+    Local misses fall through to the shared store before extracting, and fresh
+    extractions are written back to it (as JSON, on the extraction thread), so
+    other workers on the host reuse them.
+    """
+
+    def __init__(self, max_entries: int = METADATA_CACHE_MAX_ENTRIES,
+                 default_ttl: int = METADATA_CACHE_DEFAULT_TTL,
+                 expiry_margin: int = METADATA_CACHE_EXPIRY_MARGIN,
+                 store: Optional[SharedStore] = shared_store if METADATA_CACHE_SHARED else None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.expiry_margin = expiry_margin
+        self.store = store
+        self._entries: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple, threading.Lock] = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(url: str, ydl_opts: dict) -> tuple:
+        playlist = bool(ydl_opts.get("extract_flat")) or not ydl_opts.get("noplaylist", False)
+        media_key = normalize_media_key(url, playlist=playlist)
+        opts_key = tuple((k, ydl_opts.get(k)) for k in _KEY_OPTS)
+        return media_key, opts_key
+
+    def _expires_at(self, info: dict) -> float:
+        now = time.time()
+        expires_at = now + self.default_ttl
+        signed_expiry = _signed_url_expiry(info)
+        if signed_expiry is not None:
+            expires_at = min(expires_at, signed_expiry - self.expiry_margin)
+        return expires_at
+
+    def _lookup(self, key: tuple) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return info
+
+    def _store(self, key: tuple, info: dict, expires_at: Optional[float] = None) -> Optional[float]:
+        expires_at = expires_at or self._expires_at(info)
+        if expires_at <= time.time():
+            return None  # URLs already about to expire — not worth caching
+        self._entries[key] = (expires_at, info)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return expires_at
+
+    # ── shared level (no self._lock held: these touch SQLite) ──────
+    def _load_shared(self, key: tuple) -> Optional[tuple[float, dict]]:
+        if self.store is None:
+            return None
+        try:
+            row = self.store.query_one("SELECT expires_at, info FROM metadata WHERE key = ? AND expires_at > ?",
+                                       (repr(key), time.time()))
+            return (row["expires_at"], json.loads(row["info"])) if row else None
+        except Exception as e:
+            logger.warning(f"⚠️ [METADATA CACHE] shared read failed: {e}")
+            return None
+
+    def _save_shared(self, key: tuple, expires_at: float, info: dict):
+        if self.store is None:
+            return
+        try:
+            payload = json.dumps(info, default=str)
+            with self.store.transaction() as conn:
+                conn.execute("INSERT OR REPLACE INTO metadata (key, expires_at, info) VALUES (?, ?, ?)",
+                             (repr(key), expires_at, payload))
+                conn.execute("DELETE FROM metadata WHERE expires_at <= ?", (time.time(),))
+        except Exception as e:
+            logger.warning(f"⚠️ [METADATA CACHE] shared write failed: {e}")
+
+    def get_or_extract(self, url: str, ydl_opts: dict, extractor: Callable[[], dict],
+                       force_refresh: bool = False) -> dict:
+        """
+        Return cached metadata for (url, ydl_opts), running `extractor()` on a miss.
+        `force_refresh=True` bypasses and replaces the entry (used after a 403 on a
+        signed URL, where the cached copy is known to be stale).
+        """
+        key = self.make_key(url, ydl_opts)
+
+        with self._lock:
+            if not force_refresh:
+                info = self._lookup(key)
+                if info is not None:
+                    self.hits += 1
+                    return info
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            try:
+                # Another thread may have filled the entry while we waited
+                if not force_refresh:
+                    with self._lock:
+                        info = self._lookup(key)
+                        if info is not None:
+                            self.hits += 1
+                            return info
+
+                    # Another worker may have extracted it
+                    shared = self._load_shared(key)
+                    if shared is not None:
+                        expires_at, info = shared
+                        with self._lock:
+                            self._store(key, info, expires_at)
+                            self.hits += 1
+                            self.shared_hits += 1
+                        return info
+
+                with self._lock:
+                    self.misses += 1
+
+                info = extractor()
+                with self._lock:
+                    expires_at = self._store(key, info)
+                if expires_at is not None:
+                    self._save_shared(key, expires_at, info)
+                return info
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is key_lock:
+                        del self._inflight[key]
+
+    def invalidate(self, url: str, ydl_opts: dict):
+        key = self.make_key(url, ydl_opts)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.execute("DELETE FROM metadata WHERE key = ?", (repr(key),))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.execute("DELETE FROM metadata")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared instance used by preview + download paths
+metadata_cache = MetadataCache()
@@ -0,0 +1,217 @@
+import time
+import bisect
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Metrics Configuration
+# ────────────────────────────────────────────────
+METRICS_PREFIX = "avdl"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+THROUGHPUT_BUCKETS = tuple(64 * 1024 * 4 ** i for i in range(8))  # 64 KiB/s … 1 GiB/s
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: tuple, values: tuple, le: Optional[str] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally labelled."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_str(self.labelnames, key)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and one locked increment."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}  # key → [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][idx] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block; `outcome` is set to "error" if it raises."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            if "outcome" in self.labelnames:
+                labels.setdefault("outcome", outcome)
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, str(bound))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, '+Inf')} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics in Prometheus text exposition format.
+    Instruments are recorded at stage boundaries only (never per chunk);
+    component stats() dicts are sampled at scrape time.
+
+    Values are per process: under `serve.py` each uvicorn worker answers
+    /metrics with its own instruments and counters (only stats read from the
+    shared SQLite store — job counts, media cache size, temp leases, live
+    stream links — are host-wide).
+    """
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: list = []
+        self._collectors: dict[str, tuple[Callable[[], dict], str, frozenset]] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, component: str, stats: Callable[[], dict], help_text: str, counters: tuple = ()):
+        """
+        Expose every numeric value of `stats()` as `<prefix>_<component>_<key>`.
+        Keys in `counters` are cumulative: they are exported as counters with a
+        `_total` suffix (so rate() and reset detection work); the rest are gauges.
+        """
+        self._collectors[component] = (stats, help_text, frozenset(counters))
+
+    def _render_collectors(self) -> list[str]:
+        lines = []
+        for component, (stats, help_text, counters) in self._collectors.items():
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"⚠️ [METRICS] stats for {component} failed: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name, kind = f"{self.prefix}_{component}_{key}", "gauge"
+                if key in counters:
+                    name, kind = f"{name}_total", "counter"
+                lines += [f"# HELP {name} {help_text}: {key.replace('_', ' ')}", f"# TYPE {name} {kind}",
+                          f"{name} {_fmt(value)}"]
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        lines += self._render_collectors()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# ────────────────────────────────────────────────
+# 📈 Stage Instruments
+# ────────────────────────────────────────────────
+EXTRACT_SECONDS = registry.histogram(
+    "extract_info_seconds", "yt-dlp metadata extraction latency (cache misses only)", ("outcome",))
+FORMAT_SELECT_SECONDS = registry.histogram(
+    "format_select_seconds", "Time to pick a playable format, including any extraction", ("kind",))
+UPSTREAM_CONNECT_SECONDS = registry.histogram(
+    "upstream_connect_seconds", "Time until upstream response headers arrive")
+FIRST_BYTE_SECONDS = registry.histogram(
+    "first_byte_seconds", "Stream start to first byte yielded", ("path",))
+STREAM_SECONDS = registry.histogram(
+    "stream_seconds", "Total upstream stream duration", ("path", "outcome"))
+STREAM_THROUGHPUT = registry.histogram(
+    "stream_throughput_bytes_per_second", "Average bytes/sec of completed streams", ("path",),
+    buckets=THROUGHPUT_BUCKETS)
+STREAM_BYTES = registry.counter("stream_bytes_total", "Bytes yielded by upstream streams", ("path",))
+STREAM_RETRIES = registry.counter("stream_retries_total", "Upstream stream retries by cause", ("reason",))
+FFMPEG_SECONDS = registry.histogram(
+    "ffmpeg_seconds", "Streaming ffmpeg job duration", ("kind", "outcome"))
+MERGE_SECONDS = registry.histogram("merge_seconds", "yt-dlp post-processing (merge) duration", ("postprocessor",))
+ZIP_APPEND_SECONDS = registry.histogram("zip_append_seconds", "Time to append one file to a playlist ZIP")
+ZIP_BYTES = registry.counter("zip_bytes_total", "Bytes appended to playlist ZIPs")
+CLEANUP_SECONDS = registry.histogram("cleanup_seconds", "Temp dir removal duration")
+PLAYLIST_VIDEOS = registry.counter("playlist_videos_total", "Playlist videos by result", ("result",))
+PREFETCH_RESULTS = registry.counter(
+    "prefetch_total", "Playlist metadata at download time: ready, waited, inline or failed", ("result",))
+PREFETCH_WAIT_SECONDS = registry.histogram(
+    "prefetch_wait_seconds", "Time a download worker waited on an in-flight metadata prefetch")
+BANDWIDTH_WAIT_SECONDS = registry.histogram(
+    "bandwidth_wait_seconds", "Time a shaped response spent waiting for bandwidth tokens", ("priority",))
+
+
+def observe_stream(path: str, started: float, first_byte: Optional[float], nbytes: int, outcome: str):
+    """Record the end of one upstream stream (called once per stream, never per chunk)."""
+    elapsed = time.perf_counter() - started
+    STREAM_SECONDS.observe(elapsed, path=path, outcome=outcome)
+    STREAM_BYTES.inc(nbytes, path=path)
+    if first_byte is not None:
+        FIRST_BYTE_SECONDS.observe(first_byte - started, path=path)
+    if outcome == "ok" and elapsed > 0:
+        STREAM_THROUGHPUT.observe(nbytes / elapsed, path=path)
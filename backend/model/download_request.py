@@ -15,6 +15,14 @@ class DownloadRequest(BaseModel):
     start_time: Optional[str] = None  # e.g. "00:01:23" (1 min 23 sec)
     end_time: Optional[str] = None    # e.g. "00:02:45" (2 min 45 sec)
 
+    # ⚡ Optional parallel fetch tuning (server clamps both)
+    connections: Optional[int] = None  # upstream connections; 1 = single stream
+    chunk_size: Optional[int] = None   # bytes per range request when connections > 1
+
+    # 🎧 Optional audio transcoding (mode="audio")
+    audio_codec: Optional[str] = None    # "mp3" (default), "opus" or "aac"
+    audio_bitrate: Optional[int] = None  # kbps, clamped to 32–320 (default 192)
+
 
 
 class PlaylistDownloadRequest(BaseModel):
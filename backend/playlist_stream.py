@@ -0,0 +1,131 @@
+import os
+import time
+import itertools
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Playlist Preview Configuration
+# ────────────────────────────────────────────────
+PLAYLIST_PAGE_SIZE = int(os.getenv("PLAYLIST_PAGE_SIZE", "50"))
+PLAYLIST_MAX_PAGE_SIZE = int(os.getenv("PLAYLIST_MAX_PAGE_SIZE", "500"))
+# Entries pulled from yt-dlp per executor job (a yt-dlp page is ~100 entries)
+PLAYLIST_STREAM_BATCH = int(os.getenv("PLAYLIST_STREAM_BATCH", "10"))
+PLAYLIST_CURSOR_TTL = int(os.getenv("PLAYLIST_CURSOR_TTL", "600"))
+PLAYLIST_MAX_CURSORS = int(os.getenv("PLAYLIST_MAX_CURSORS", "64"))
+
+
+def clamp_page(offset: Optional[int], limit: Optional[int]) -> tuple[int, int]:
+    """Normalise client-supplied pagination."""
+    offset = max(0, offset or 0)
+    limit = limit or PLAYLIST_PAGE_SIZE
+    return offset, max(1, min(limit, PLAYLIST_MAX_PAGE_SIZE))
+
+
+class PlaylistCursor:
+    """
+    Position inside a lazily paged playlist.
+    Only the entry iterator is held (never the entries already returned), so
+    memory stays flat however long the playlist is. `close` releases whatever
+    owns the iterator (e.g. the YoutubeDL instance).
+    """
+
+    def __init__(self, key: str, header: dict, entries: Iterable[Any], close: Optional[Callable[[], None]] = None):
+        self.key = key
+        self.header = header
+        self.position = 0
+        self.exhausted = False
+        self.last_used = time.time()
+        self._entries = iter(entries)
+        self._close = close
+        self._lock = threading.Lock()
+
+    def take(self, n: int) -> list[tuple[int, Any]]:
+        """Next `n` (index, entry) pairs — blocking, run it off the event loop."""
+        with self._lock:
+            batch = list(zip(itertools.count(self.position), itertools.islice(self._entries, n)))
+            self.position += len(batch)
+            if len(batch) < n:
+                self.exhausted = True
+            self.last_used = time.time()
+            return batch
+
+    def skip(self, n: int):
+        """Advance to entry `n` without keeping anything."""
+        while n > 0 and not self.exhausted:
+            n -= len(self.take(min(n, PLAYLIST_MAX_PAGE_SIZE)))
+
+    def close(self):
+        if self._close:
+            try:
+                self._close()
+            except Exception as e:
+                logger.warning(f"⚠️ [PLAYLIST CURSOR] close failed for {self.key}: {e}")
+            self._close = None
+
+
+class PlaylistCursorCache:
+    """
+    Continuations of paged playlist previews, keyed by (playlist key, next offset).
+    A page request at the offset where the previous page stopped resumes the
+    live yt-dlp iterator instead of re-paging the playlist from the start.
+    """
+
+    def __init__(self, max_cursors: int = PLAYLIST_MAX_CURSORS, ttl: int = PLAYLIST_CURSOR_TTL):
+        self.max_cursors = max_cursors
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cursors: "OrderedDict[tuple[str, int], PlaylistCursor]" = OrderedDict()
+        self.resumed = 0
+        self.opened = 0
+
+    def _expire_locked(self) -> list[PlaylistCursor]:
+        now = time.time()
+        dropped = []
+        for slot, cursor in list(self._cursors.items()):
+            if now - cursor.last_used > self.ttl:
+                dropped.append(self._cursors.pop(slot))
+        while len(self._cursors) > self.max_cursors:
+            dropped.append(self._cursors.popitem(last=False)[1])
+        return dropped
+
+    def checkout(self, key: str, offset: int) -> Optional[PlaylistCursor]:
+        """Take exclusive ownership of the continuation at `offset`, if any."""
+        with self._lock:
+            dropped = self._expire_locked()
+            cursor = self._cursors.pop((key, offset), None)
+            if cursor:
+                self.resumed += 1
+        for stale in dropped:
+            stale.close()
+        return cursor
+
+    def record_open(self):
+        with self._lock:
+            self.opened += 1
+
+    def checkin(self, cursor: PlaylistCursor):
+        """Park a cursor for the next page, or close it if the playlist is done."""
+        if cursor.exhausted:
+            cursor.close()
+            return
+        with self._lock:
+            previous = self._cursors.pop((cursor.key, cursor.position), None)
+            self._cursors[(cursor.key, cursor.position)] = cursor
+            dropped = self._expire_locked()
+        for stale in filter(None, [previous, *dropped]):
+            if stale is not cursor:
+                stale.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cursors": len(self._cursors), "opened": self.opened, "resumed": self.resumed}
+
+
+playlist_cursors = PlaylistCursorCache()
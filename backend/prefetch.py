@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+import logging
+import concurrent.futures
+from typing import Any, Callable, Optional
+
+from concurrency import BoundedExecutor, extraction_executor
+from metrics import PREFETCH_RESULTS, PREFETCH_WAIT_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Prefetch Configuration
+# ────────────────────────────────────────────────
+# Playlist videos whose metadata is resolved ahead of the download stage (0 = off)
+PLAYLIST_PREFETCH_AHEAD = int(os.getenv("PLAYLIST_PREFETCH_AHEAD", "4"))
+
+
+class LookaheadPrefetcher:
+    """
+    Metadata stage of a playlist job: resolves items `ahead` positions in
+    front of the download stage on idle extraction threads, so download
+    workers pick up ready-to-fetch info instead of extracting cold.
+
+    The window is counted from the items already taken, which bounds how
+    long a result sits unused (signed URLs expire). Extraction never queues
+    in front of interactive requests: when the pool is busy the item is
+    simply resolved inline by the download worker.
+    """
+
+    def __init__(self, count: int, resolve: Callable[[int], Any], ahead: int = PLAYLIST_PREFETCH_AHEAD,
+                 executor: BoundedExecutor = extraction_executor):
+        self.count = count
+        self.resolve = resolve
+        self.ahead = max(0, ahead)
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._futures: dict[int, concurrent.futures.Future] = {}
+        self._taken: set[int] = set()
+        self._next = 0
+        self._closed = False
+
+    def _fill(self):
+        """Schedule untaken items until `ahead` are outstanding (or the pool is busy)."""
+        with self._lock:
+            while not self._closed and self._next < self.count:
+                if len(self._futures) >= self.ahead:
+                    return
+                if self._next in self._taken:
+                    self._next += 1
+                    continue
+                future = self.executor.try_submit(self.resolve, self._next)
+                if future is None:
+                    return  # no idle extraction thread — retried on the next take()
+                self._futures[self._next] = future
+                self._next += 1
+
+    def start(self) -> "LookaheadPrefetcher":
+        self._fill()
+        return self
+
+    def take(self, index: int) -> Optional[Any]:
+        """
+        Result prefetched for `index` (waiting if it is still being resolved),
+        or None if it was never scheduled or failed — the caller resolves it
+        inline then. Each take moves the window forward.
+        """
+        with self._lock:
+            self._taken.add(index)
+            future = self._futures.pop(index, None)
+        self._fill()
+        if future is None:
+            PREFETCH_RESULTS.inc(result="inline")
+            return None
+
+        ready = future.done()
+        started = time.perf_counter()
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.info(f"⚠️ [PREFETCH] item #{index + 1} failed ahead of time ({e}) — resolving inline")
+            PREFETCH_RESULTS.inc(result="failed")
+            return None
+        if not ready:
+            PREFETCH_WAIT_SECONDS.observe(time.perf_counter() - started)
+        PREFETCH_RESULTS.inc(result="ready" if ready else "waited")
+        return result
+
+    def close(self):
+        """Stop scheduling; queued (not yet running) resolutions are dropped."""
+        with self._lock:
+            self._closed = True
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,190 @@
+import os
+import gzip
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional — stdlib json with compact separators
+    orjson = None
+    import json
+
+try:
+    import brotli
+except ImportError:  # optional — gzip only
+    brotli = None
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Preview Payload Configuration
+# ────────────────────────────────────────────────
+# Encoded preview bodies kept per cached metadata entry
+PREVIEW_CACHE_ENTRIES = int(os.getenv("PREVIEW_CACHE_ENTRIES", "256"))
+# Bodies smaller than this are sent uncompressed
+PREVIEW_COMPRESS_MIN_BYTES = int(os.getenv("PREVIEW_COMPRESS_MIN_BYTES", "512"))
+PREVIEW_GZIP_LEVEL = int(os.getenv("PREVIEW_GZIP_LEVEL", "6"))
+PREVIEW_BROTLI_QUALITY = int(os.getenv("PREVIEW_BROTLI_QUALITY", "5"))
+
+VIDEO_PREVIEW_FIELDS = ("type", "title", "thumbnail", "duration", "preview_url",
+                        "video_formats", "audio_formats", "combined_formats")
+PLAYLIST_PREVIEW_FIELDS = ("type", "playlist_title", "thumbnail", "videos")
+
+
+def encode_json(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[tuple]:
+    """`fields=title,duration` → sorted tuple of top-level keys (None = all); 400 on unknown keys."""
+    if not fields:
+        return None
+    allowed = tuple(allowed)
+    wanted = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = wanted.difference(allowed)
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown preview field(s): {', '.join(sorted(unknown))} "
+                                   f"(allowed: {', '.join(allowed)})")
+    return tuple(sorted(wanted)) or None
+
+
+def select_fields(payload: dict, fields: Optional[tuple]) -> dict:
+    if fields is None:
+        return payload
+    return {k: v for k, v in payload.items() if k in fields}
+
+
+def compact(record: dict) -> dict:
+    """Drop null / empty values — most yt-dlp format fields are unset."""
+    return {k: v for k, v in record.items() if v is not None and v != ""}
+
+
+class RenderedPreview:
+    """One encoded preview body plus its lazily built compressed variants."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self._variants: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        with self._lock:
+            data = self._variants.get(encoding)
+            if data is None:
+                if encoding == "br":
+                    data = brotli.compress(self.body, quality=PREVIEW_BROTLI_QUALITY)
+                else:
+                    data = gzip.compress(self.body, compresslevel=PREVIEW_GZIP_LEVEL, mtime=0)
+                self._variants[encoding] = data
+            return data
+
+
+class PreviewRenderer:
+    """
+    Memoizes encoded /preview bodies per cached metadata dict. The metadata
+    cache hands out the same info object until it expires or is refreshed, so
+    repeat previews skip building, serializing and compressing entirely; a new
+    extraction is a new object and re-renders. The ETag is a hash of the body,
+    so it is stable across workers and re-extractions of unchanged metadata.
+    That holds only without `urls=1`: signed URLs (per-format and the inline
+    `preview_url`) change on every extraction, so those bodies revalidate only
+    while their metadata-cache entry lives.
+    """
+
+    def __init__(self, max_entries: int = PREVIEW_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        # key → (info the body was built from, rendered body); info is held so its id() is not reused
+        self._entries: "OrderedDict[tuple, tuple[dict, RenderedPreview]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.reused = 0
+        self.not_modified = 0
+        self.encode_seconds = 0.0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+
+    def render(self, info: dict, variant: tuple, build: Callable[[], dict]) -> RenderedPreview:
+        key = (id(info), variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is info:
+                self._entries.move_to_end(key)
+                self.reused += 1
+                return entry[1]
+
+        started = time.perf_counter()
+        rendered = RenderedPreview(encode_json(build()))
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._entries[key] = (info, rendered)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.rendered += 1
+            self.encode_seconds += elapsed
+        return rendered
+
+    @staticmethod
+    def _negotiate(accept_encoding: str) -> Optional[str]:
+        offered = {}
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.strip().partition(";")
+            q = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    pass
+            offered[name.strip()] = q
+        if brotli is not None and offered.get("br", 0) > 0:
+            return "br"
+        if offered.get("gzip", 0) > 0:
+            return "gzip"
+        return None
+
+    def response(self, rendered: RenderedPreview, if_none_match: Optional[str] = None,
+                 accept_encoding: Optional[str] = None) -> Response:
+        headers = {"ETag": rendered.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+        if if_none_match:
+            # Weak comparison: compressed variants of the same body share the tag
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            if "*" in tags or rendered.etag.removeprefix("W/") in tags:
+                with self._lock:
+                    self.not_modified += 1
+                return Response(status_code=304, headers=headers)
+
+        body = rendered.body
+        encoding = None
+        if accept_encoding and len(body) >= PREVIEW_COMPRESS_MIN_BYTES:
+            encoding = self._negotiate(accept_encoding)
+        if encoding:
+            body = rendered.variant(encoding)
+            headers["Content-Encoding"] = encoding
+        with self._lock:
+            self.bytes_raw += len(rendered.body)
+            self.bytes_sent += len(body)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "rendered": self.rendered,
+                "reused": self.reused,
+                "not_modified": self.not_modified,
+                "encode_seconds": round(self.encode_seconds, 6),
+                "bytes_raw": self.bytes_raw,
+                "bytes_sent": self.bytes_sent,
+            }
+
+
+preview_renderer = PreviewRenderer()
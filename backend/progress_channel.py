@@ -0,0 +1,115 @@
+import os
+import json
+import threading
+from collections import deque
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Progress Channel Configuration
+# ────────────────────────────────────────────────
+PROGRESS_FLUSH_HZ = float(os.getenv("PROGRESS_FLUSH_HZ", "4"))
+PROGRESS_HEARTBEAT_SECS = float(os.getenv("PROGRESS_HEARTBEAT_SECS", "15"))
+# Ordered (non-coalesced) events kept between drains; terminal events never count against it
+PROGRESS_BACKLOG = int(os.getenv("PROGRESS_BACKLOG", "256"))
+
+# Never dropped, never merged
+TERMINAL_EVENTS = frozenset({"video_finished", "error", "completed", "archive_ready"})
+# Only the latest one per video matters
+COALESCED_EVENTS = frozenset({"progress", "queued"})
+
+
+def sse_frame(event: dict) -> str:
+    """One SSE message; events with an `id` carry it so clients can resume with Last-Event-ID."""
+    frame = f"data: {json.dumps(event)}\n\n"
+    return f"id: {event['id']}\n{frame}" if "id" in event else frame
+
+
+class ProgressChannel:
+    """
+    Bounded buffer between a job's download threads and its JobRecorder,
+    which drains it at the flush rate.
+
+    Progress-style events are coalesced to the latest state per video, so
+    thousands of yt-dlp hook calls per second cost a dict assignment each.
+    Everything else keeps its order in a bounded backlog (oldest non-terminal
+    dropped first). Terminal events are always delivered. A video's pending
+    progress is moved into the ordered stream just before its terminal event,
+    so the last state recorded for a finished video is its final one.
+    """
+
+    def __init__(self, backlog: int = PROGRESS_BACKLOG):
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._ordered: deque[tuple[bool, dict]] = deque()  # (protected, event)
+        self._ordinary = 0  # unprotected events in _ordered
+        self._latest: dict[tuple, dict] = {}  # (event, video_index) → latest payload
+        self._closed = False
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _coalesce_key(event: dict):
+        name = event["event"]
+        if name in COALESCED_EVENTS or (name == "log" and event.get("level") == "info"):
+            return (name, event.get("video_index"))
+        return None
+
+    # ── producer side (any thread) ─────────────────────────────────
+    def emit(self, event_type: str, **data):
+        event = {"event": event_type, **data}
+        key = self._coalesce_key(event)
+        with self._lock:
+            self.received += 1
+            if key is not None:
+                if key in self._latest:
+                    self.coalesced += 1
+                self._latest[key] = event
+                return
+
+            terminal = event_type in TERMINAL_EVENTS
+            video = event.get("video_index")
+            if terminal and video is not None:
+                # Final state of this video goes out before (and as safely as) its terminal event
+                for pending in [k for k in self._latest if k[1] == video]:
+                    self._append_locked(self._latest.pop(pending), protected=True)
+            self._append_locked(event, protected=terminal)
+
+    def _append_locked(self, event: dict, protected: bool = False):
+        self._ordered.append((protected, event))
+        if protected:
+            return
+        self._ordinary += 1
+        if self._ordinary <= self.backlog:
+            return
+        # Over budget — drop the oldest non-terminal event
+        for i, (kept, _) in enumerate(self._ordered):
+            if not kept:
+                del self._ordered[i]
+                self._ordinary -= 1
+                self.dropped += 1
+                return
+
+    def close(self):
+        """No more events; the recorder stops after its next drain."""
+        with self._lock:
+            self._closed = True
+
+    # ── consumer side (the job's recorder thread) ──────────────────
+    def drain(self) -> tuple[list[dict], bool]:
+        """Take everything pending (ordered events, then latest coalesced state) and the closed flag."""
+        with self._lock:
+            batch = [event for _, event in self._ordered] + list(self._latest.values())
+            self._ordered.clear()
+            self._latest.clear()
+            self._ordinary = 0
+            return batch, self._closed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "received": self.received,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "pending": len(self._ordered) + len(self._latest),
+            }
@@ -0,0 +1,149 @@
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from utils import parse_content_range
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Parallel Fetch Configuration
+# ────────────────────────────────────────────────
+DEFAULT_PARALLEL_CONNECTIONS = int(os.getenv("DEFAULT_PARALLEL_CONNECTIONS", "1"))
+MAX_PARALLEL_CONNECTIONS = int(os.getenv("MAX_PARALLEL_CONNECTIONS", "8"))
+DEFAULT_RANGE_CHUNK_SIZE = int(os.getenv("DEFAULT_RANGE_CHUNK_SIZE", str(4 * 1024 * 1024)))  # 4 MiB
+MIN_RANGE_CHUNK_SIZE = 256 * 1024
+MAX_RANGE_CHUNK_SIZE = 16 * 1024 * 1024
+RANGE_CHUNK_RETRIES = 2
+
+
+def clamp_parallel_settings(connections: Optional[int], chunk_size: Optional[int]) -> tuple[int, int]:
+    """
+    Apply server-side limits to the per-request connection count and chunk size.
+    """
+    connections = connections or DEFAULT_PARALLEL_CONNECTIONS
+    chunk_size = chunk_size or DEFAULT_RANGE_CHUNK_SIZE
+    connections = max(1, min(int(connections), MAX_PARALLEL_CONNECTIONS))
+    chunk_size = max(MIN_RANGE_CHUNK_SIZE, min(int(chunk_size), MAX_RANGE_CHUNK_SIZE))
+    return connections, chunk_size
+
+
+async def probe_total_size(client: httpx.AsyncClient, url: str, headers: dict) -> Optional[int]:
+    """
+    Learn the full resource size with a 1-byte range request.
+    Returns None if the server doesn't support ranges.
+    """
+    probe_headers = {**headers, "Range": "bytes=0-0"}
+    async with client.stream("GET", url, headers=probe_headers) as r:
+        r.raise_for_status()
+        if r.status_code != 206:
+            return None
+        return parse_content_range(r.headers.get("Content-Range"))[2]
+
+
+class ParallelRangeFetcher:
+    """
+    Fetch [start, end] of a URL as fixed-size byte ranges over N pooled
+    connections and yield the bytes strictly in order.
+
+    Workers may only run ahead of the consumer by a fixed window of chunks, so
+    memory stays at O(connections × chunk_size) and a slow client naturally
+    throttles the upstream fetch (backpressure). Nothing touches disk.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, url: str, headers: dict, start: int, end: int,
+                 connections: int = DEFAULT_PARALLEL_CONNECTIONS,
+                 chunk_size: int = DEFAULT_RANGE_CHUNK_SIZE):
+        self.client = client
+        self.url = url
+        self.headers = {k: v for k, v in headers.items() if k.lower() != "range"}
+        self.connections = max(1, connections)
+        self.chunk_size = chunk_size
+        self.window = self.connections * 2  # in-flight + buffered chunks
+
+        self._ranges = [
+            (offset, min(offset + chunk_size - 1, end))
+            for offset in range(start, end + 1, chunk_size)
+        ]
+        self._buffer: dict[int, bytes] = {}
+        self._next_assign = 0
+        self._next_yield = 0
+        self._error: Optional[BaseException] = None
+        self._cond = asyncio.Condition()
+
+    async def _fetch_range(self, first: int, last: int) -> bytes:
+        headers = {**self.headers, "Range": f"bytes={first}-{last}"}
+        expected = last - first + 1
+
+        for attempt in range(1, RANGE_CHUNK_RETRIES + 1):
+            try:
+                r = await self.client.get(self.url, headers=headers)
+                # 403 means the signed URL died — let the caller re-extract
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise RuntimeError(f"Upstream ignored Range for bytes={first}-{last}")
+                got_start = parse_content_range(r.headers.get("Content-Range"))[0]
+                if got_start != first or len(r.content) != expected:
+                    raise httpx.RemoteProtocolError(
+                        f"Short/misaligned range: wanted {first}+{expected}, "
+                        f"got {r.headers.get('Content-Range')!r} ({len(r.content)} bytes)"
+                    )
+                return r.content
+            except httpx.TransportError:
+                if attempt == RANGE_CHUNK_RETRIES:
+                    raise
+                await asyncio.sleep(0.25 * attempt)
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(
+                    lambda: self._error is not None
+                    or self._next_assign >= len(self._ranges)
+                    or self._next_assign < self._next_yield + self.window
+                )
+                if self._error is not None or self._next_assign >= len(self._ranges):
+                    return
+                idx = self._next_assign
+                self._next_assign += 1
+
+            try:
+                data = await self._fetch_range(*self._ranges[idx])
+            except Exception as exc:
+                async with self._cond:
+                    if self._error is None:
+                        self._error = exc
+                    self._cond.notify_all()
+                return
+
+            async with self._cond:
+                self._buffer[idx] = data
+                self._cond.notify_all()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(min(self.connections, len(self._ranges)))
+        ]
+
+        try:
+            for idx in range(len(self._ranges)):
+                async with self._cond:
+                    await self._cond.wait_for(lambda: idx in self._buffer or self._error is not None)
+                    # Chunks that arrived before a failure are still good
+                    if idx not in self._buffer:
+                        raise self._error
+                    data = self._buffer.pop(idx)
+                    self._next_yield = idx + 1
+                    self._cond.notify_all()
+                yield data
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._buffer.clear()
@@ -0,0 +1,234 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import logging
+from typing import Optional
+
+from metrics import CLEANUP_SECONDS
+from shared_state import SharedStore, HostLock, shared_store, owner_token, owner_alive, prune_owner_locks
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Reaper Configuration
+# ────────────────────────────────────────────────
+# Hard ceiling for a lease that is never released (crashed job, leaked handle)
+TEMP_LEASE_TTL = int(os.getenv("TEMP_LEASE_TTL", str(6 * 3600)))
+# Delay before a released dir is removed (0 = immediately)
+TEMP_RELEASE_GRACE = int(os.getenv("TEMP_RELEASE_GRACE", "0"))
+# Unleased tmp* dirs and leases of dead workers get this long before removal
+TEMP_ORPHAN_GRACE = int(os.getenv("TEMP_ORPHAN_GRACE", "120"))
+# Longest the reaper sleeps before rechecking leases released by other workers
+TEMP_REAPER_POLL = float(os.getenv("TEMP_REAPER_POLL", "5"))
+
+
+class TempLease:
+    def __init__(self, path: str, expires_at: float):
+        self.path = path
+        self.expires_at = expires_at
+        self.released = False
+
+
+class TempDirReaper:
+    """
+    Host-wide registry of job temp directories with explicit lease / release.
+
+    Every directory has exactly one deadline in the shared `temp_leases` table:
+    the lease TTL while the job is active, or release time + grace once it's
+    done. Any worker can lease, renew or release; only the worker holding the
+    host lock runs the reaper thread, which sleeps until the earliest deadline
+    (or a local release), so each pass costs O(expired) and never walks the
+    download tree or touches a directory whose lease is live. If that worker
+    dies, the lock — and the reaping — passes to another one.
+    """
+
+    def __init__(self, lease_ttl: int = TEMP_LEASE_TTL, release_grace: int = TEMP_RELEASE_GRACE,
+                 store: SharedStore = shared_store):
+        self.lease_ttl = lease_ttl
+        self.release_grace = release_grace
+        self.store = store
+        self._cond = threading.Condition()
+        self._host_lock = HostLock("temp-reaper")
+        self._thread: Optional[threading.Thread] = None
+        self._orphan_dirs: list[str] = []
+        self.reclaimed_bytes = 0
+        self.reclaimed_dirs = 0
+        self.expired_leases = 0
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    # ── public API ─────────────────────────────────────────────────
+    def lease(self, parent: str, prefix: str = "tmp") -> TempLease:
+        """Create a temp directory under `parent` and hold it until released."""
+        os.makedirs(parent, exist_ok=True)
+        path = tempfile.mkdtemp(dir=parent, prefix=prefix)
+        lease = TempLease(path, time.time() + self.lease_ttl)
+        self.store.execute(
+            "INSERT OR REPLACE INTO temp_leases (path, owner, deadline, released) VALUES (?, ?, ?, 0)",
+            (path, owner_token(), lease.expires_at),
+        )
+        return lease
+
+    def reclaim(self, path: str) -> TempLease:
+        """
+        Take over `path` for a resumed job (its previous owner died). Falls back
+        to a fresh directory next to it if the reaper already removed it.
+        """
+        lease = TempLease(path, time.time() + self.lease_ttl)
+        with self.store.transaction() as conn:
+            # No row means the reaper already claimed it (or is about to remove it)
+            cur = conn.execute("UPDATE temp_leases SET owner = ?, deadline = ?, released = 0 WHERE path = ?",
+                               (owner_token(), lease.expires_at, path))
+            reclaimed = cur.rowcount > 0 and os.path.isdir(path)
+        if not reclaimed:
+            return self.lease(os.path.dirname(path))
+        return lease
+
+    def renew(self, lease: TempLease):
+        """Push back the TTL of a long-running job."""
+        if lease.released:
+            return
+        lease.expires_at = time.time() + self.lease_ttl
+        self.store.execute("UPDATE temp_leases SET deadline = ? WHERE path = ? AND released = 0",
+                           (lease.expires_at, lease.path))
+
+    def release(self, lease: TempLease, grace: Optional[float] = None):
+        """Job is done with the directory; reap it after `grace` seconds."""
+        grace = self.release_grace if grace is None else grace
+        if lease.released:
+            return
+        lease.released = True
+        lease.expires_at = time.time() + grace
+        self.store.execute("UPDATE temp_leases SET deadline = ?, released = 1 WHERE path = ? AND released = 0",
+                           (lease.expires_at, lease.path))
+        self._wake()
+
+    def adopt_orphans(self, base_dir: str, grace: float = TEMP_ORPHAN_GRACE):
+        """
+        Non-recursive sweep, run by the reaper when it takes over: tmp* dirs
+        with no lease (left by an older version or a crash between mkdtemp and
+        insert) and leases held by dead processes are reaped after `grace`.
+        """
+        deadline = time.time() + grace
+        with self.store.transaction() as conn:
+            for row in conn.execute("SELECT path, owner FROM temp_leases WHERE released = 0").fetchall():
+                if not owner_alive(row["owner"]):
+                    conn.execute("UPDATE temp_leases SET deadline = ?, released = 1 WHERE path = ?",
+                                 (deadline, row["path"]))
+                    logger.info(f"🧹 [REAPER] adopted {row['path']} from dead worker {row['owner']}")
+            try:
+                names = os.listdir(base_dir)
+            except FileNotFoundError:
+                return
+            known = {row["path"] for row in conn.execute("SELECT path FROM temp_leases").fetchall()}
+            for name in names:
+                path = os.path.join(base_dir, name)
+                if name.startswith("tmp") and path not in known and os.path.isdir(path):
+                    conn.execute("INSERT INTO temp_leases (path, owner, deadline, released) VALUES (?, '', ?, 1)",
+                                 (path, deadline))
+                    logger.info(f"🧹 [REAPER] adopted orphan temp dir {path}")
+
+    def start(self, orphan_dirs: Optional[list[str]] = None):
+        """
+        Start the reaper once per host. Every worker calls this; all but one
+        block on the host lock in the background and take over if it is freed.
+        `orphan_dirs` are swept by whichever worker becomes the reaper.
+        """
+        with self._cond:
+            if self._thread is None:
+                self._orphan_dirs = list(orphan_dirs or [])
+                self._thread = threading.Thread(target=self._run, daemon=True, name="temp-reaper")
+                self._thread.start()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._host_lock.held
+
+    # ── reaper loop ────────────────────────────────────────────────
+    def _pop_expired(self) -> tuple[list[TempLease], Optional[float]]:
+        """Claim every lease past its deadline; also return the next deadline."""
+        now = time.time()
+        expired = []
+        with self.store.transaction() as conn:
+            for row in conn.execute("SELECT path, deadline, released FROM temp_leases WHERE deadline <= ?",
+                                    (now,)).fetchall():
+                lease = TempLease(row["path"], row["deadline"])
+                lease.released = bool(row["released"])
+                if not lease.released:
+                    self.expired_leases += 1
+                    logger.warning(f"⚠️ [REAPER] lease on {lease.path} expired without release")
+                expired.append(lease)
+            conn.execute("DELETE FROM temp_leases WHERE deadline <= ?", (now,))
+            row = conn.execute("SELECT MIN(deadline) AS next FROM temp_leases").fetchone()
+        return expired, row["next"]
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _run(self):
+        self._host_lock.acquire(blocking=True)
+        logger.info(f"🧹 [REAPER] temp dir reaper started (pid {os.getpid()})")
+        for base_dir in self._orphan_dirs:
+            self.adopt_orphans(base_dir)
+        prune_owner_locks()
+        while True:
+            try:
+                expired, next_deadline = self._pop_expired()
+            except Exception as e:
+                logger.warning(f"⚠️ [REAPER] lease scan failed: {e}")
+                expired, next_deadline = [], None
+
+            for lease in expired:
+                size = self._dir_size(lease.path)
+                started = time.perf_counter()
+                try:
+                    shutil.rmtree(lease.path)
+                except FileNotFoundError:
+                    size = 0
+                except Exception as e:
+                    logger.warning(f"⚠️ [REAPER] failed to remove {lease.path}: {e}")
+                    continue
+                CLEANUP_SECONDS.observe(time.perf_counter() - started)
+                with self._cond:
+                    self.reclaimed_bytes += size
+                    self.reclaimed_dirs += 1
+                logger.info(f"🧹 [REAPER] removed {lease.path} ({size} bytes)")
+
+            if expired:
+                continue
+            # Other workers can't notify us — cap the sleep so their releases are seen
+            timeout = TEMP_REAPER_POLL
+            if next_deadline is not None:
+                timeout = max(0.0, min(timeout, next_deadline - time.time()))
+            with self._cond:
+                self._cond.wait(timeout=timeout)
+
+    def stats(self) -> dict:
+        row = self.store.query_one(
+            "SELECT SUM(released = 0) AS active, SUM(released = 1) AS pending FROM temp_leases")
+        with self._cond:
+            return {
+                "active_leases": row["active"] or 0,
+                "pending_reap": row["pending"] or 0,
+                "reclaimed_bytes": self.reclaimed_bytes,
+                "reclaimed_dirs": self.reclaimed_dirs,
+                "expired_leases": self.expired_leases,
+                "leader": int(self.is_leader),
+            }
+
+
+temp_reaper = TempDirReaper()
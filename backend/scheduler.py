@@ -0,0 +1,233 @@
+import os
+import threading
+import logging
+import contextvars
+import concurrent.futures
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Scheduler Configuration
+# ────────────────────────────────────────────────
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "6"))
+# Slots bulk (playlist) jobs may never occupy, so a single-video job starts promptly.
+# Off by default: live single-video downloads stream directly and never queue here,
+# so a reserved slot would only take capacity from playlists.
+DOWNLOAD_RESERVED_INTERACTIVE = int(os.getenv("DOWNLOAD_RESERVED_INTERACTIVE", "0"))
+
+PRIORITY_INTERACTIVE = 0  # single-video requests
+PRIORITY_BULK = 1         # playlist items
+_PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+
+class DownloadJob:
+    """
+    A unit of yt-dlp / ffmpeg work. `future` resolves with the function's return value.
+    `on_position(pos)` is called with the 1-based queue position whenever it
+    changes, and with 0 once the job starts running.
+    """
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, client_id: str, priority: int,
+                 on_position: Optional[Callable[[int], None]] = None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.client_id = client_id
+        self.priority = priority
+        self.on_position = on_position
+        self.position: Optional[int] = None
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        # Submitter's context (request / job ID for logs), entered by the worker thread
+        self.context = contextvars.copy_context()
+
+
+class Deferred:
+    """
+    Returned by a job whose result is produced on another thread (a duplicate
+    download waiting on the in-flight one). The worker slot is freed at once;
+    the job's future resolves with `then(future)` when `future` completes.
+    """
+
+    def __init__(self, future: concurrent.futures.Future,
+                 then: Optional[Callable[[concurrent.futures.Future], object]] = None):
+        self.future = future
+        self.then = then or (lambda done: done.result())
+
+
+class DownloadScheduler:
+    """
+    Process-wide bounded pool for heavy download jobs.
+
+    - at most `max_workers` jobs run at once, across all requests
+    - interactive jobs always dispatch before bulk ones, and bulk jobs can't
+      take the last `reserved_interactive` slots
+    - within a priority class, clients are served round-robin so one large
+      playlist can't starve everyone queued behind it
+    """
+
+    def __init__(self, max_workers: int = DOWNLOAD_WORKERS,
+                 reserved_interactive: int = DOWNLOAD_RESERVED_INTERACTIVE):
+        self.max_workers = max(1, max_workers)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_workers - 1)
+        self._cond = threading.Condition()
+        # priority → client_id → pending jobs (dict order is the round-robin rotation)
+        self._queues: dict[int, "OrderedDict[str, deque[DownloadJob]]"] = {p: OrderedDict() for p in _PRIORITIES}
+        self._running = {p: 0 for p in _PRIORITIES}
+        self._threads: list[threading.Thread] = []
+        self.completed = 0
+        self.failed = 0
+        self.parked = 0  # deferred jobs waiting for their result off-slot
+
+    # ── queue bookkeeping (call with self._cond held) ──────────────
+    def _dispatch_order(self) -> list[DownloadJob]:
+        """Pending jobs in the exact order they would be started."""
+        order = []
+        for priority in _PRIORITIES:
+            per_client = [list(jobs) for jobs in self._queues[priority].values()]
+            depth = max((len(jobs) for jobs in per_client), default=0)
+            for i in range(depth):
+                order.extend(jobs[i] for jobs in per_client if i < len(jobs))
+        return order
+
+    def _refresh_positions(self) -> list[tuple[DownloadJob, int]]:
+        changed = []
+        for pos, job in enumerate(self._dispatch_order(), start=1):
+            if job.position != pos:
+                job.position = pos
+                changed.append((job, pos))
+        return changed
+
+    def _can_start(self, priority: int) -> bool:
+        busy = sum(self._running.values())
+        if busy >= self.max_workers:
+            return False
+        if priority == PRIORITY_BULK:
+            return self._running[PRIORITY_BULK] < self.max_workers - self.reserved_interactive
+        return True
+
+    def _next_job(self) -> Optional[DownloadJob]:
+        for priority in _PRIORITIES:
+            clients = self._queues[priority]
+            if not clients or not self._can_start(priority):
+                continue
+            client_id, jobs = next(iter(clients.items()))
+            job = jobs.popleft()
+            # Rotate: this client goes to the back of the line
+            del clients[client_id]
+            if jobs:
+                clients[client_id] = jobs
+            return job
+        return None
+
+    @staticmethod
+    def _notify(changes: list[tuple[DownloadJob, int]]):
+        for job, pos in changes:
+            if job.on_position:
+                try:
+                    job.on_position(pos)
+                except Exception as e:
+                    logger.warning(f"⚠️ [SCHEDULER] position callback failed: {e}")
+
+    # ── public API ─────────────────────────────────────────────────
+    def _ensure_workers(self):
+        while len(self._threads) < self.max_workers:
+            t = threading.Thread(target=self._worker, daemon=True, name=f"download-{len(self._threads)}")
+            self._threads.append(t)
+            t.start()
+
+    def submit(self, fn: Callable, *args, client_id: str = "anonymous", priority: int = PRIORITY_BULK,
+               on_position: Optional[Callable[[int], None]] = None, **kwargs) -> DownloadJob:
+        job = DownloadJob(fn, args, kwargs, client_id, priority, on_position)
+        with self._cond:
+            self._ensure_workers()
+            self._queues[priority].setdefault(client_id, deque()).append(job)
+            changes = self._refresh_positions()
+            self._cond.notify()
+        self._notify(changes)
+        return job
+
+    def cancel(self, job: DownloadJob) -> bool:
+        """Drop a job that hasn't started yet. Returns False if it's already running/done."""
+        with self._cond:
+            jobs = self._queues[job.priority].get(job.client_id)
+            if not jobs or job not in jobs:
+                return False
+            jobs.remove(job)
+            if not jobs:
+                del self._queues[job.priority][job.client_id]
+            changes = self._refresh_positions()
+        job.future.cancel()
+        self._notify(changes)
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.priority] += 1
+                job.position = 0
+                changes = [(job, 0)] + self._refresh_positions()
+            self._notify(changes)
+
+            deferred = None
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    result = job.context.run(job.fn, *job.args, **job.kwargs)
+                except BaseException as exc:
+                    job.future.set_exception(exc)
+                else:
+                    if isinstance(result, Deferred):
+                        deferred = result
+                    else:
+                        job.future.set_result(result)
+
+            with self._cond:
+                self._running[job.priority] -= 1
+                if deferred is not None:
+                    self.parked += 1
+                else:
+                    self._count_finished(job)
+                self._cond.notify_all()
+            if deferred is not None:
+                deferred.future.add_done_callback(lambda done, job=job, deferred=deferred:
+                                                  self._resolve_deferred(job, deferred, done))
+
+    def _count_finished(self, job: DownloadJob):
+        if job.future.cancelled() or job.future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def _resolve_deferred(self, job: DownloadJob, deferred: Deferred, done: concurrent.futures.Future):
+        # Runs on whichever thread completed `done` (or this worker, if it already had)
+        try:
+            job.future.set_result(job.context.run(deferred.then, done))
+        except BaseException as exc:
+            job.future.set_exception(exc)
+        with self._cond:
+            self.parked -= 1
+            self._count_finished(job)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "reserved_interactive": self.reserved_interactive,
+                "running_interactive": self._running[PRIORITY_INTERACTIVE],
+                "running_bulk": self._running[PRIORITY_BULK],
+                "queued_interactive": sum(len(j) for j in self._queues[PRIORITY_INTERACTIVE].values()),
+                "queued_bulk": sum(len(j) for j in self._queues[PRIORITY_BULK].values()),
+                "parked": self.parked,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+
+download_scheduler = DownloadScheduler()
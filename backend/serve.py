@@ -0,0 +1,55 @@
+"""
+Launch the API.
+
+    python serve.py                  # production: WEB_CONCURRENCY workers (default: one per core)
+    RELOAD=1 python serve.py         # development: single process with auto-reload
+
+Workers share host-local state (metadata cache, temp leases, in-progress
+archives, media cache index) through the SQLite store in `shared_state.py`;
+the temp dir reaper runs in exactly one of them.
+"""
+import os
+
+import uvicorn
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Server Configuration
+# ────────────────────────────────────────────────
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+RELOAD = os.getenv("RELOAD", "0") == "1"
+# Graceful shutdown budget for in-flight streams on restart / deploy
+GRACEFUL_SHUTDOWN_SECS = int(os.getenv("GRACEFUL_SHUTDOWN_SECS", "30"))
+
+
+def available_cores() -> int:
+    """CPUs this process may run on (respects container cpusets / taskset)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows
+        return os.cpu_count() or 1
+
+
+def worker_count() -> int:
+    configured = os.getenv("WEB_CONCURRENCY")
+    return max(1, int(configured)) if configured else available_cores()
+
+
+def main():
+    workers = 1 if RELOAD else worker_count()
+    # Workers split host-wide budgets (e.g. BANDWIDTH_GLOBAL_BPS) by this
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    print(f"🚀 Starting API on {HOST}:{PORT} | workers={workers} | reload={RELOAD}", flush=True)
+    uvicorn.run(
+        "app:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        reload=RELOAD,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import uuid
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows — single-process dev only
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Shared State Configuration
+# ────────────────────────────────────────────────
+# Everything here is host-local: workers of one server share it, separate hosts don't
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", os.path.join(os.getcwd(), "downloads", ".state"))
+SHARED_STATE_DB = os.path.join(SHARED_STATE_DIR, "shared.sqlite3")
+SHARED_STATE_BUSY_TIMEOUT = 10_000  # ms a writer waits for the lock
+SHARED_STATE_OWNERS_DIR = os.path.join(SHARED_STATE_DIR, "owners")
+# Recorded in PRAGMA user_version, for migrations once a released schema changes
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key         TEXT PRIMARY KEY,
+    expires_at  REAL NOT NULL,
+    info        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_expires ON metadata (expires_at);
+CREATE TABLE IF NOT EXISTS temp_leases (
+    path      TEXT PRIMARY KEY,
+    owner     TEXT NOT NULL,
+    deadline  REAL NOT NULL,
+    released  INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS temp_leases_deadline ON temp_leases (deadline);
+CREATE TABLE IF NOT EXISTS archives (
+    filename  TEXT PRIMARY KEY,
+    path      TEXT NOT NULL,
+    owner     TEXT NOT NULL,
+    state     TEXT NOT NULL,
+    entries   INTEGER NOT NULL DEFAULT 0,
+    updated   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    request     TEXT NOT NULL,
+    client_id   TEXT NOT NULL,
+    tmp_dir     TEXT,
+    zip_name    TEXT,
+    total       INTEGER NOT NULL DEFAULT 0,
+    owner       TEXT NOT NULL,
+    last_seq    INTEGER NOT NULL DEFAULT 0,
+    last_seen   REAL NOT NULL,
+    created     REAL NOT NULL,
+    updated     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_videos (
+    job_id    TEXT NOT NULL,
+    idx       INTEGER NOT NULL,
+    video_id  TEXT NOT NULL,
+    state     TEXT NOT NULL,
+    percent   TEXT,
+    speed     TEXT,
+    eta       TEXT,
+    position  INTEGER,
+    filename  TEXT,
+    message   TEXT,
+    log       TEXT,
+    updated   REAL NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id  TEXT NOT NULL,
+    seq     INTEGER NOT NULL,
+    event   TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE TABLE IF NOT EXISTS stream_links (
+    token       TEXT PRIMARY KEY,
+    target      TEXT NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media_cache (
+    digest        TEXT PRIMARY KEY,
+    key           TEXT NOT NULL,
+    ext           TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    filename      TEXT NOT NULL,
+    content_type  TEXT NOT NULL,
+    created       REAL NOT NULL,
+    last_access   REAL NOT NULL,
+    hits          INTEGER NOT NULL DEFAULT 0
+);
+PRAGMA user_version = %d;
+""" % SCHEMA_VERSION
+
+
+# Identifies this process as the owner of leases, archives and jobs. Unlike a pid it is
+# never reused, so a restarted container can't be mistaken for the process it replaced.
+OWNER_TOKEN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def owner_token() -> str:
+    """This process's owner token; holds its liveness lock from the first call on."""
+    _owner_lock.acquire(blocking=False)
+    return OWNER_TOKEN
+
+
+def owner_alive(token: str) -> bool:
+    """
+    True if the process that wrote `token` is still running on this host:
+    its owner lock file is still flock'd (the OS drops the lock on exit).
+    """
+    if token == OWNER_TOKEN:
+        return True
+    if fcntl is None:
+        pid = int(token.split("-", 1)[0] or 0)
+        try:
+            os.kill(pid, 0)
+        except (OSError, ValueError):
+            return False
+        return True
+    path = os.path.join(SHARED_STATE_OWNERS_DIR, f"{token}.lock")
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    # Nobody holds it — the owner is gone; tidy its lock file
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def prune_owner_locks() -> int:
+    """Remove lock files left by exited processes; returns how many went."""
+    try:
+        names = os.listdir(SHARED_STATE_OWNERS_DIR)
+    except FileNotFoundError:
+        return 0
+    return sum(not owner_alive(name[:-len(".lock")]) for name in names if name.endswith(".lock"))
+
+
+class SharedStore:
+    """
+    Host-wide state shared by all worker processes, kept in one SQLite file.
+
+    WAL mode lets readers run alongside the single writer; each thread gets its
+    own connection. Statements are short (a row or two), so the database lock
+    is never held across network or disk-heavy work.
+    """
+
+    def __init__(self, path: str = SHARED_STATE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=SHARED_STATE_BUSY_TIMEOUT / 1000, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={SHARED_STATE_BUSY_TIMEOUT}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._init_lock:
+            if not self._initialised:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                self._initialised = True
+        self._local.conn = conn
+        return conn
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self._connect().execute(sql, params)
+
+    def query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        return self._connect().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        return self._connect().execute(sql, params).fetchone()
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction that takes the lock up front (no upgrade deadlocks)."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class HostLock:
+    """
+    Exclusive advisory lock on a file in the shared state dir.
+    Held until the process exits, so the OS hands it to the next waiter if the
+    holder dies — used to run singleton background work once per host.
+    """
+
+    def __init__(self, name: str, directory: str = SHARED_STATE_DIR):
+        self.path = os.path.join(directory, f"{name}.lock")
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+
+shared_store = SharedStore()
+_owner_lock = HostLock(OWNER_TOKEN, directory=SHARED_STATE_OWNERS_DIR)
+
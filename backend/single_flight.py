@@ -0,0 +1,244 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import threading
+import logging
+import concurrent.futures
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+
+from cancellation import cancellation_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Single-flight Configuration
+# ────────────────────────────────────────────────
+SPILL_DIR = os.path.join(os.getcwd(), "downloads", ".inflight")
+# Recent bytes kept in memory so subscribers at the live edge never touch disk
+FANOUT_RING_BYTES = int(os.getenv("FANOUT_RING_BYTES", str(8 * 1024 * 1024)))
+FANOUT_READ_CHUNK = 1024 * 1024
+
+
+class SharedStream:
+    """
+    One upstream fetch fanned out to any number of subscribers.
+
+    The producer task writes every chunk to a spill file and keeps the most
+    recent ones in an in-memory ring. Subscribers start at byte 0: late joiners
+    catch up from the spill file, then follow the live tail from the ring.
+    The producer stops early once the last subscriber has gone.
+    """
+
+    def __init__(self, key: tuple, source: Callable[[], AsyncIterator[bytes]], on_done: Callable[["SharedStream"], None],
+                 publish: Optional[Callable[[str], bool]] = None):
+        self.key = key
+        self.size = 0
+        self.state = "running"  # running → [publishing →] done | failed
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.abandoned = False  # set once the last subscriber leaves mid-fetch
+        self._source = source
+        self._on_done = on_done
+        self._publish = publish
+        self._published = False  # spill file handed over (e.g. to the media cache)
+        self._ring: deque[tuple[int, bytes]] = deque()
+        self._ring_bytes = 0
+        self._cond = asyncio.Condition()
+
+        os.makedirs(SPILL_DIR, exist_ok=True)
+        fd, self.spill_path = tempfile.mkstemp(dir=SPILL_DIR, prefix="flight_")
+        self._spill = os.fdopen(fd, "wb", buffering=0)
+        self._task = asyncio.create_task(self._produce())
+
+    async def _produce(self):
+        try:
+            async for chunk in self._source():
+                await asyncio.to_thread(self._spill.write, chunk)
+                async with self._cond:
+                    self._ring.append((self.size, chunk))
+                    self._ring_bytes += len(chunk)
+                    while self._ring_bytes > FANOUT_RING_BYTES and len(self._ring) > 1:
+                        _, old = self._ring.popleft()
+                        self._ring_bytes -= len(old)
+                    self.size += len(chunk)
+                    self._cond.notify_all()
+            if self._publish:
+                self._spill.close()
+                # Subscribers have every byte and may finish; the spill file stays until publish returns
+                self.state = "publishing"
+                async with self._cond:
+                    self._cond.notify_all()
+                try:
+                    self._published = await asyncio.to_thread(self._publish, self.spill_path)
+                except Exception as e:
+                    logger.warning(f"⚠️ [FANOUT] publish failed for {self.key}: {e}")
+            self.state = "done"
+        except BaseException as exc:
+            self.state = "failed"
+            self.error = exc
+            if not isinstance(exc, asyncio.CancelledError):
+                logger.warning(f"⚠️ [FANOUT] upstream failed for {self.key}: {exc}")
+        finally:
+            self._spill.close()
+            self._on_done(self)
+            async with self._cond:
+                self._cond.notify_all()
+            self._maybe_cleanup()
+
+    def _from_ring(self, offset: int) -> Optional[bytes]:
+        for start, chunk in self._ring:
+            if start <= offset < start + len(chunk):
+                return chunk[offset - start:]
+        return None
+
+    def _maybe_cleanup(self):
+        if self._published:
+            return
+        if self.state in ("done", "failed") and self.subscribers == 0 and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        self.subscribers += 1
+        offset = 0
+        try:
+            with open(self.spill_path, "rb") as f:
+                while True:
+                    async with self._cond:
+                        await self._cond.wait_for(lambda: offset < self.size or self.state != "running")
+                        chunk = self._from_ring(offset)
+                        available = self.size - offset
+                        state = self.state
+
+                    if chunk is None and available > 0:
+                        # Behind the ring — catch up from the spill file
+                        f.seek(offset)
+                        chunk = await asyncio.to_thread(f.read, min(available, FANOUT_READ_CHUNK))
+
+                    if chunk:
+                        offset += len(chunk)
+                        yield chunk
+                        continue
+
+                    if state == "failed":
+                        raise RuntimeError("Shared upstream fetch failed") from self.error
+                    return
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and self.state == "running":
+                self.abandoned = True
+                logger.info(f"🛑 [FANOUT] last subscriber left — cancelling upstream for {self.key}")
+                cancellation_stats.record("streams_cancelled")
+                self._task.cancel()
+            self._maybe_cleanup()
+
+
+class StreamFlights:
+    """Registry of in-flight SharedStreams keyed by (video, format, mode, trim)."""
+
+    def __init__(self):
+        self._flights: dict[tuple, SharedStream] = {}
+        self.started = 0
+        self.joined = 0
+
+    def _done(self, flight: SharedStream):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def join(self, key: tuple, source: Callable[[], AsyncIterator[bytes]],
+             publish: Optional[Callable[[str], bool]] = None) -> SharedStream:
+        """
+        Attach to the running fetch for `key`, or start one from `source`.
+        `publish(spill_path)` is called after a complete fetch and may take
+        ownership of the spill file by returning True.
+        Must be called from the event loop.
+        """
+        flight = self._flights.get(key)
+        if flight is not None and flight.state == "running" and not flight.abandoned:
+            self.joined += 1
+            logger.info(f"🔁 [FANOUT] joining in-flight fetch {key} at {flight.size} bytes ({flight.subscribers} subscribers)")
+            return flight
+        flight = SharedStream(key, source, self._done, publish)
+        self._flights[key] = flight
+        self.started += 1
+        return flight
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "started": self.started, "joined": self.joined}
+
+
+class FileFlights:
+    """
+    Thread-side single-flight for downloads that end in a file (playlist items).
+    The first caller for a key downloads; concurrent callers get a pending
+    future instead of blocking, resolved with their own hard link of the result
+    (made on the leader's thread, before its file can be archived and removed).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[tuple, list[tuple[Callable[[str], str], concurrent.futures.Future]]] = {}
+        self.started = 0
+        self.joined = 0
+
+    def run(self, key: tuple, fn: Callable[[], Optional[str]],
+            adopt: Callable[[str], str]) -> concurrent.futures.Future:
+        """
+        Leader: runs `fn` on this thread and returns its (finished) future.
+        Duplicate: returns at once with a pending future — hand it to the
+        scheduler as a `Deferred` so the wait doesn't hold a worker slot.
+        """
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            waiters = self._flights.get(key)
+            if waiters is not None:
+                waiters.append((adopt, future))
+                self.joined += 1
+            else:
+                self._flights[key] = []
+                self.started += 1
+
+        if waiters is not None:
+            logger.info(f"🔁 [FANOUT] waiting on in-flight download {key}")
+            return future
+
+        path = None
+        try:
+            path = fn()
+            future.set_result(path)
+        except Exception as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                waiters = self._flights.pop(key, [])
+            for adopt_fn, waiter in waiters:
+                try:
+                    waiter.set_result(adopt_fn(path) if path else None)
+                except Exception as exc:
+                    waiter.set_exception(exc)
+        return future
+
+    def waiting(self, key: tuple) -> int:
+        """Callers currently waiting on the in-flight download for `key`."""
+        with self._lock:
+            return len(self._flights.get(key) or ())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._flights), "started": self.started, "joined": self.joined}
+
+
+def link_or_copy(src: str, dst: str) -> str:
+    """Hard-link `src` to `dst` (same filesystem), falling back to a copy."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+stream_flights = StreamFlights()
+file_flights = FileFlights()
@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import secrets
+import threading
+from typing import Optional
+
+from shared_state import SharedStore, shared_store
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Stream Link Configuration
+# ────────────────────────────────────────────────
+# Idle seconds before a seekable link dies (every request on it extends it)
+STREAM_LINK_TTL = int(os.getenv("STREAM_LINK_TTL", "3600"))
+
+
+class StreamLinkStore:
+    """
+    Short-lived tokens behind GET/HEAD /stream/{token}. Each one pins a
+    download request to a single resolved format and byte size, so every
+    Range request of a resumed download or a seeking player addresses the
+    same bytes. The upstream URL itself is not stored — it is re-resolved
+    (and re-signed) on demand. Kept in the shared store: any worker serves
+    any link.
+    """
+
+    def __init__(self, store: SharedStore = shared_store, ttl: int = STREAM_LINK_TTL):
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.resolved = 0
+        self.missing = 0
+
+    def issue(self, target: dict) -> str:
+        token = secrets.token_urlsafe(12)
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute("INSERT INTO stream_links (token, target, expires_at) VALUES (?, ?, ?)",
+                         (token, json.dumps(target), now + self.ttl))
+            conn.execute("DELETE FROM stream_links WHERE expires_at <= ?", (now,))
+        with self._lock:
+            self.issued += 1
+        return token
+
+    def resolve(self, token: str) -> Optional[dict]:
+        now = time.time()
+        row = self.store.query_one("SELECT target FROM stream_links WHERE token = ? AND expires_at > ?",
+                                   (token, now))
+        if row is None:
+            with self._lock:
+                self.missing += 1
+            return None
+        self.store.execute("UPDATE stream_links SET expires_at = ? WHERE token = ?", (now + self.ttl, token))
+        with self._lock:
+            self.resolved += 1
+        return json.loads(row["target"])
+
+    def stats(self) -> dict:
+        row = self.store.query_one("SELECT COUNT(*) AS n FROM stream_links WHERE expires_at > ?", (time.time(),))
+        with self._lock:
+            return {"active": row["n"], "issued": self.issued, "resolved": self.resolved, "missing": self.missing}
+
+
+stream_links = StreamLinkStore()
@@ -0,0 +1,65 @@
+"""
+Shared fixtures. Tests run against the fake upstream and the stub extractor
+from bench/, so nothing touches YouTube, in a scratch working directory
+(modules create downloads/, logs/ and the shared state DB under cwd at import).
+
+    cd backend
+    python -m pytest -q
+"""
+import os
+import sys
+import uuid
+import asyncio
+import tempfile
+import threading
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix="avdl-tests-"))
+
+from bench import stub_extractor
+from bench.fake_upstream import make_server
+from concurrency import close_http_client
+
+
+@pytest.fixture(scope="session")
+def upstream():
+    """Fake googlevideo server (Range, injected 403s and connection drops)."""
+    server = make_server()
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-upstream").start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub(upstream):
+    """Stub extractor aimed at the fake upstream; tests tweak the returned config in place."""
+    config = {
+        **stub_extractor.DEFAULT_CONFIG,
+        "upstream": f"http://127.0.0.1:{upstream.server_address[1]}",
+        "extract_delay": 0,
+    }
+    stub_extractor.install(config)
+    return config
+
+
+@pytest.fixture
+def video_url() -> str:
+    """A fresh video ID per test: no metadata-cache, media-cache or fault-counter carry-over."""
+    return f"https://www.youtube.com/watch?v=t{uuid.uuid4().hex[:10]}"
+
+
+@pytest.fixture
+def run():
+    """asyncio.run() that also closes the shared upstream client (it is bound to the loop)."""
+    def run_coro(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await close_http_client()
+        return asyncio.run(main())
+    return run_coro
@@ -0,0 +1,115 @@
+"""Token-bucket pacing: hard caps, weighted sharing of the global budget, body pieces."""
+import time
+import asyncio
+
+import pytest
+
+import bandwidth
+from bandwidth import (BandwidthManager, BandwidthMiddleware, Flow, TokenBucket, shape,
+                       BANDWIDTH_QUANTUM, BULK, INTERACTIVE)
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def single_worker(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+
+
+def test_token_bucket_reservations():
+    bucket = TokenBucket(1 * MB, burst_seconds=0.25)
+    assert bucket.reserve(int(bucket.capacity)) == 0.0  # the burst is free
+    assert bucket.reserve(MB // 10) == pytest.approx(0.1, abs=0.01)
+    assert bucket.ready_in() == pytest.approx(0.1, abs=0.01)
+    time.sleep(0.12)
+    assert bucket.ready_in() == 0.0
+
+
+async def _send(manager: BandwidthManager, flow: Flow, total: int) -> float:
+    started = time.monotonic()
+    manager.open(flow)
+    try:
+        for _ in range(0, total, BANDWIDTH_QUANTUM):
+            await manager.acquire(flow, BANDWIDTH_QUANTUM)
+    finally:
+        manager.close(flow)
+    return time.monotonic() - started
+
+
+def test_client_cap_paces_a_flow():
+    manager = BandwidthManager(client_bps=2 * MB)
+    # 0.5 MB of burst, then 1.5 MB at 2 MB/s
+    elapsed = asyncio.run(_send(manager, Flow("client-a", INTERACTIVE), 2 * MB))
+    assert 0.6 < elapsed < 1.2
+
+
+def test_global_budget_divides_across_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert BandwidthManager(global_bps=8 * MB).global_bps == 2 * MB
+
+
+def test_lone_bulk_flow_gets_the_whole_budget():
+    manager = BandwidthManager(global_bps=4 * MB)
+    # 1 MB of burst, then 2 MB at 4 MB/s
+    elapsed = asyncio.run(_send(manager, Flow("client-a", BULK), 3 * MB))
+    assert 0.4 < elapsed < 0.9
+
+
+def test_contended_budget_is_shared_by_weight():
+    manager = BandwidthManager(global_bps=4 * MB)
+    sent = {INTERACTIVE: 0, BULK: 0}
+
+    async def saturate(flow: Flow, until: float):
+        manager.open(flow)
+        try:
+            while time.monotonic() < until:
+                await manager.acquire(flow, BANDWIDTH_QUANTUM)
+                sent[flow.priority] += BANDWIDTH_QUANTUM
+        finally:
+            manager.close(flow)
+
+    async def main():
+        until = time.monotonic() + 1.0
+        await asyncio.gather(saturate(Flow("viewer", INTERACTIVE), until), saturate(Flow("zip", BULK), until))
+
+    asyncio.run(main())
+    ratio = sent[INTERACTIVE] / sent[BULK]
+    assert ratio == pytest.approx(bandwidth.BANDWIDTH_INTERACTIVE_WEIGHT / bandwidth.BANDWIDTH_BULK_WEIGHT, rel=0.35)
+    # Work-conserving: together they used the whole budget (plus the initial burst)
+    assert sum(sent.values()) > 3.5 * MB
+
+
+class _Request:
+    """Just enough of a Starlette request for shape()."""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+
+
+def test_middleware_paces_in_quantum_pieces():
+    body = bytes(range(256)) * 2000  # ~500 KB, one message
+    manager = BandwidthManager(client_bps=1 * MB)
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/media":
+            shape(_Request(scope), "client-a")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    async def request(path: str) -> list[dict]:
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await BandwidthMiddleware(app, manager)({"type": "http", "path": path}, None, send)
+        return messages
+
+    shaped = asyncio.run(request("/media"))[1:]
+    assert all(len(m["body"]) <= BANDWIDTH_QUANTUM for m in shaped)
+    assert [m["more_body"] for m in shaped] == [True] * (len(shaped) - 1) + [False]
+    assert b"".join(m["body"] for m in shaped) == body
+    assert manager.stats()["sent_bytes"] == len(body)
+
+    passthrough = asyncio.run(request("/other"))[1:]
+    assert [m["body"] for m in passthrough] == [body]
@@ -0,0 +1,89 @@
+"""Durable playlist jobs: event feed, final per-video state and the archive."""
+import json
+import zipfile
+import threading
+
+import downloader
+from model.download_request import PlaylistDownloadRequest
+from downloader import start_playlist_job, get_download_path
+from jobs import job_store, stream_job_events, JobRecorder
+from progress_channel import ProgressChannel
+from scheduler import DownloadScheduler
+
+FORMATS = [
+    {"format_id": "137", "ext": "mp4", "vcodec": "avc1.640028", "acodec": "none", "height": 1080, "size": 300_000},
+    {"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2", "abr": 129.5, "size": 50_000},
+]
+
+
+def _events(run, job_id: str, last_event_id: int = 0) -> list[dict]:
+    async def collect():
+        return [frame async for frame in stream_job_events(job_id, last_event_id)]
+    frames = "".join(run(collect()))
+    return [json.loads(line[len("data: "):]) for line in frames.splitlines() if line.startswith("data: ")]
+
+
+def _playlist(video_url: str, video_ids: list[str]) -> PlaylistDownloadRequest:
+    base = video_url.rsplit("=", 1)[1]
+    return PlaylistDownloadRequest(url="https://www.youtube.com/playlist?list=PLtest",
+                                   video_ids=[f"{base}{suffix}" for suffix in video_ids],
+                                   playlist_title=f"Test {base}")
+
+
+def test_playlist_job_completes_with_filenames(stub, video_url, run):
+    stub.update(formats=FORMATS)
+    # The duplicate shares (or re-uses) the first download
+    job_id = start_playlist_job(_playlist(video_url, ["a", "b", "a"]))
+    events = _events(run, job_id)
+
+    assert events[0]["event"] == "job"
+    assert events[-1]["event"] == "completed"
+    assert [e["id"] for e in events if "id" in e] == sorted(e["id"] for e in events if "id" in e)
+
+    snapshot = job_store.snapshot(job_id)
+    assert snapshot["state"] == "completed"
+    assert [v["state"] for v in snapshot["videos"]] == ["done"] * 3
+    filenames = [v["filename"] for v in snapshot["videos"]]
+    assert all(filenames)
+
+    # The recorded names are the archive's entries
+    zip_path = f"{get_download_path()}/{snapshot['zip_url'].rsplit('/', 1)[1]}"
+    with zipfile.ZipFile(zip_path) as archive:
+        assert sorted(archive.namelist()) == sorted(filenames)
+        assert archive.testzip() is None
+
+
+def test_queue_positions_reach_the_stream(stub, video_url, run, monkeypatch):
+    # One bulk slot (the other is reserved), five videos: four of them wait their turn
+    monkeypatch.setattr(downloader, "download_scheduler", DownloadScheduler(max_workers=2, reserved_interactive=1))
+    stub.update(formats=FORMATS, rate=1_000_000)
+
+    job_id = start_playlist_job(_playlist(video_url, ["a", "b", "c", "d", "e"]))
+    events = _events(run, job_id)
+
+    queued = [e for e in events if e["event"] == "queued"]
+    assert queued, [e["event"] for e in events]
+    assert all(e["position"] > 0 and e["message"].startswith(f"⏳ Video #{e['video_index'] + 1} queued")
+               for e in queued)
+    assert events[-1]["event"] == "completed"
+
+
+def test_latest_log_line_is_replayed(run):
+    job_id = job_store.create("playlist", {}, "client-a", ["a", "b"], tmp_dir="", zip_name="")
+    channel = ProgressChannel()
+    recorder = JobRecorder(job_id, channel, threading.Event())
+    recorder.start()
+    for percent in ("10.0%", "55.0%"):
+        channel.emit("log", video_index=1, level="info", message=f"[b] [download]  {percent} of 1.00MiB")
+    channel.emit("log", video_index=0, level="warning", message="[a] ⚠️ slow")
+    recorder.final_state = "completed"
+    channel.close()
+    recorder._thread.join(5)
+
+    # Info lines are coalesced to the latest per video, warnings stay in the log
+    expected = {"event": "log", "video_index": 1, "level": "info", "message": "[b] [download]  55.0% of 1.00MiB"}
+    events = _events(run, job_id)
+    assert expected in events
+    assert any(e["event"] == "log" and e["level"] == "warning" for e in events)
+    # A reconnecting client past every logged event still gets the line
+    assert expected in _events(run, job_id, last_event_id=job_store.get(job_id)["last_seq"])
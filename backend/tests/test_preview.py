@@ -0,0 +1,29 @@
+"""Preview ETags survive re-extraction unless signed URLs were asked for."""
+import json
+
+from downloader import preview_video, _PREVIEW_VIDEO_OPTS
+from metadata_cache import metadata_cache
+
+
+def _re_extracted(url: str, include_urls: bool):
+    """Two renders of the same video, each from a fresh extraction (fresh signatures)."""
+    rendered = []
+    for _ in range(2):
+        metadata_cache.invalidate(url, _PREVIEW_VIDEO_OPTS)
+        rendered.append(preview_video(url, include_urls=include_urls))
+    return rendered
+
+
+def test_etag_is_stable_across_re_extraction(stub, video_url):
+    first, second = _re_extracted(video_url, include_urls=False)
+    assert first is not second
+    assert first.etag == second.etag
+    assert "preview_url" not in json.loads(first.body)
+
+
+def test_signed_urls_only_with_urls_param(stub, video_url):
+    first, second = _re_extracted(video_url, include_urls=True)
+    payload = json.loads(first.body)
+    assert payload["preview_url"].startswith(stub["upstream"])
+    assert all("url" in f for f in payload["combined_formats"])
+    assert first.etag != second.etag
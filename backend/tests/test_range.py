@@ -0,0 +1,60 @@
+"""Range requests on plain video downloads: 206 with only those bytes, 416 past the end."""
+from bench.fake_upstream import expected_bytes
+from downloader import download_video
+from model.download_request import DownloadRequest
+
+SIZE = 2 * 1024 * 1024 + 77
+FORMAT = {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "height": 360,
+          "size": SIZE}
+
+
+def _get(run, url: str, range_header: str):
+    async def fetch():
+        req = DownloadRequest(url=url, type="single", mode="video", format_id="18")
+        response = await download_video(req, range_header=range_header)
+        body = b""
+        if hasattr(response, "body_iterator"):
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        return response, body
+    return run(fetch())
+
+
+def test_range_is_served_as_206(stub, video_url, run):
+    stub.update(formats=[FORMAT])
+    response, body = _get(run, video_url, "bytes=100-1099")
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-1099/{SIZE}"
+    assert response.headers["content-length"] == "1000"
+    assert body == expected_bytes(100, 1000)
+
+
+def test_suffix_range(stub, video_url, run):
+    stub.update(formats=[FORMAT])
+    response, body = _get(run, video_url, "bytes=-500")
+
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {SIZE - 500}-{SIZE - 1}/{SIZE}"
+    assert body == expected_bytes(SIZE - 500, 500)
+
+
+def test_range_past_the_end_is_416(stub, video_url, run):
+    stub.update(formats=[FORMAT])
+    response, body = _get(run, video_url, f"bytes={SIZE}-")
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+    assert body == b""
+
+
+def test_drop_inside_the_range_resumes_byte_exact(stub, upstream, video_url, run):
+    start = 1000
+    stub.update(formats=[FORMAT], fail403=1, drop=start + 1024 * 1024 + 5)
+    state = upstream.RequestHandlerClass.state
+    before = state.stats()["bytes_sent"]
+    response, body = _get(run, video_url, f"bytes={start}-")
+
+    assert response.status_code == 206
+    assert body == expected_bytes(start, SIZE - start)
+    # The cut really happened: part of the window was fetched twice
+    assert state.stats()["bytes_sent"] - before > SIZE - start
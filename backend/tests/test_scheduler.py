@@ -0,0 +1,50 @@
+"""Download scheduler: reserved interactive slots and queue positions."""
+import threading
+
+from scheduler import DownloadScheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+
+def _blocker(started: threading.Semaphore, release: threading.Event):
+    def run():
+        started.release()
+        release.wait(10)
+        return "bulk"
+    return run
+
+
+def test_reserved_slot_serves_interactive_jobs():
+    scheduler = DownloadScheduler(max_workers=3, reserved_interactive=1)
+    started, release = threading.Semaphore(0), threading.Event()
+    positions = []
+
+    bulk = [scheduler.submit(_blocker(started, release), client_id="playlist", priority=PRIORITY_BULK,
+                             on_position=positions.append if i == 2 else None)
+            for i in range(3)]
+    for _ in range(2):
+        assert started.acquire(timeout=5)
+    # Two bulk jobs fill the unreserved slots; the third waits even though a slot is idle
+    assert scheduler.stats()["running_bulk"] == 2
+    assert not started.acquire(timeout=0.2)
+    assert positions[-1] == 1
+
+    # ...which a single-video job then takes straight away
+    interactive = scheduler.submit(lambda: "single", client_id="viewer", priority=PRIORITY_INTERACTIVE)
+    assert interactive.future.result(timeout=5) == "single"
+    assert scheduler.stats()["queued_bulk"] == 1
+
+    release.set()
+    assert [job.future.result(timeout=5) for job in bulk] == ["bulk"] * 3
+    assert positions[-2:] == [1, 0]
+
+
+def test_no_reservation_by_default():
+    scheduler = DownloadScheduler(max_workers=2)
+    started, release = threading.Semaphore(0), threading.Event()
+
+    jobs = [scheduler.submit(_blocker(started, release), priority=PRIORITY_BULK) for _ in range(2)]
+    for _ in range(2):
+        assert started.acquire(timeout=5)
+    assert scheduler.stats()["running_bulk"] == 2
+
+    release.set()
+    assert [job.future.result(timeout=5) for job in jobs] == ["bulk"] * 2
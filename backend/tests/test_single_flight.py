@@ -0,0 +1,146 @@
+"""Single-flight: duplicate playlist downloads and concurrent streams share one upstream fetch."""
+import os
+import time
+import asyncio
+import threading
+
+import pytest
+
+import single_flight
+from scheduler import DownloadScheduler, Deferred
+from single_flight import FileFlights, StreamFlights, link_or_copy
+
+KEY = ("video", "bestvideo+bestaudio/best", "playlist", None)
+
+
+def _download(flights: FileFlights, fetch, tmp_path, index: int):
+    """What a playlist item does: lead the download, or park on the in-flight one."""
+    flight = flights.run(KEY, fetch, lambda path: link_or_copy(path, str(tmp_path / f"{index} - copy.mp4")))
+    return flight.result() if flight.done() else Deferred(flight)
+
+
+def _wait_for_waiters(flights: FileFlights, count: int):
+    deadline = time.monotonic() + 5
+    while flights.waiting(KEY) < count:
+        assert time.monotonic() < deadline, "duplicates never joined the flight"
+        time.sleep(0.01)
+
+
+def test_duplicates_do_not_hold_worker_slots(tmp_path):
+    scheduler = DownloadScheduler(max_workers=2, reserved_interactive=0)
+    flights = FileFlights()
+    started, release = threading.Event(), threading.Event()
+    leader_file = tmp_path / "1 - video.mp4"
+
+    def fetch():
+        started.set()
+        release.wait(10)
+        leader_file.write_bytes(b"media bytes")
+        return str(leader_file)
+
+    leader = scheduler.submit(_download, flights, fetch, tmp_path, 0)
+    assert started.wait(5)
+    duplicates = [scheduler.submit(_download, flights, fetch, tmp_path, i) for i in range(1, 5)]
+    _wait_for_waiters(flights, 4)
+
+    # One slot is busy with the leader; waiting duplicates must leave the other free
+    unrelated = scheduler.submit(lambda: "unrelated")
+    assert unrelated.future.result(timeout=5) == "unrelated"
+    assert scheduler.stats()["parked"] == 4
+
+    release.set()
+    assert leader.future.result(timeout=5) == str(leader_file)
+    copies = [job.future.result(timeout=5) for job in duplicates]
+    assert len(set(copies)) == 4
+    assert all(open(path, "rb").read() == b"media bytes" for path in copies)
+    stats = scheduler.stats()
+    assert (stats["parked"], stats["completed"], stats["failed"]) == (0, 6, 0)
+    assert flights.stats() == {"in_flight": 0, "started": 1, "joined": 4}
+
+
+def test_duplicates_get_nothing_when_the_leader_fails(tmp_path):
+    scheduler = DownloadScheduler(max_workers=2, reserved_interactive=0)
+    flights = FileFlights()
+    started, release = threading.Event(), threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(10)
+        raise RuntimeError("upstream gone")
+
+    leader = scheduler.submit(_download, flights, fetch, tmp_path, 0)
+    assert started.wait(5)
+    duplicate = scheduler.submit(_download, flights, fetch, tmp_path, 1)
+    _wait_for_waiters(flights, 1)
+    release.set()
+
+    with pytest.raises(RuntimeError, match="upstream gone"):
+        leader.future.result(timeout=5)
+    assert duplicate.future.result(timeout=5) is None
+
+
+# ── streams ───────────────────────────────────────────────────────
+CHUNKS = [bytes([i]) * 100_000 for i in range(20)]
+
+
+@pytest.fixture
+def spill_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(single_flight, "SPILL_DIR", str(tmp_path / "inflight"))
+    # Small ring: late joiners have to catch up from the spill file
+    monkeypatch.setattr(single_flight, "FANOUT_RING_BYTES", 250_000)
+    return tmp_path
+
+
+def _source(calls: list):
+    async def source():
+        calls.append(1)
+        for chunk in CHUNKS:
+            await asyncio.sleep(0.005)
+            yield chunk
+    return source
+
+
+async def _read(flight) -> bytes:
+    return b"".join([chunk async for chunk in flight.subscribe()])
+
+
+def test_late_joiner_shares_the_fetch(spill_dir):
+    calls = []
+
+    async def main():
+        flights = StreamFlights()
+        first = flights.join(KEY, _source(calls))
+        early = asyncio.create_task(_read(first))
+        await asyncio.sleep(0.06)  # well past the ring
+        late = flights.join(KEY, _source(calls))
+        assert late is first
+        return await asyncio.gather(early, _read(late)), flights.stats()
+
+    (early, late), stats = asyncio.run(main())
+    assert early == late == b"".join(CHUNKS)
+    assert calls == [1]
+    assert stats == {"in_flight": 0, "started": 1, "joined": 1}
+    assert os.listdir(spill_dir / "inflight") == []
+
+
+def test_slow_publish_keeps_the_spill_file(spill_dir):
+    cached = spill_dir / "cached.mp4"
+    publishing = threading.Event()
+
+    def publish(spill_path: str) -> bool:
+        publishing.set()
+        time.sleep(0.3)  # subscribers finish meanwhile
+        os.replace(spill_path, cached)
+        return True
+
+    async def main():
+        flight = StreamFlights().join(KEY, _source([]), publish=publish)
+        body = await _read(flight)
+        assert publishing.is_set() and flight.state == "publishing"
+        await flight._task
+        return body, flight
+
+    body, flight = asyncio.run(main())
+    assert body == b"".join(CHUNKS)
+    assert flight.state == "done"
+    assert cached.read_bytes() == body
@@ -0,0 +1,44 @@
+"""Streaming retries re-extract the signed URL and resume from the bytes already sent."""
+from bench.fake_upstream import expected_bytes
+from downloader import stream_youtube_video
+
+SIZE = 3 * 1024 * 1024 + 123  # not a multiple of any chunk size
+CHUNK = 1024 * 1024  # stream_youtube_video's default chunk_size
+FORMAT = {"format_id": "18", "ext": "mp4", "vcodec": "avc1.42001E", "acodec": "mp4a.40.2", "height": 360,
+          "size": SIZE}
+
+
+def _stream(run, url: str) -> bytes:
+    async def collect():
+        factory, _ = await stream_youtube_video(url, format_id="18")
+        return b"".join([chunk async for chunk in factory()])
+    return run(collect())
+
+
+def _upstream_bytes(upstream) -> int:
+    return upstream.RequestHandlerClass.state.stats()["bytes_sent"]
+
+
+def test_expired_signature_is_re_extracted(stub, upstream, video_url, run):
+    stub.update(formats=[FORMAT], fail403=1)
+    assert _stream(run, video_url) == expected_bytes(0, SIZE)
+
+
+def test_mid_body_drop_resumes_byte_exact(stub, upstream, video_url, run):
+    drop = 1_500_001
+    stub.update(formats=[FORMAT], drop=drop)
+    before = _upstream_bytes(upstream)
+
+    assert _stream(run, video_url) == expected_bytes(0, SIZE)
+    # Resumed with Range from the last yielded chunk, not restarted: only the
+    # partial chunk buffered at the cut is fetched twice
+    assert _upstream_bytes(upstream) - before == SIZE + drop % CHUNK
+
+
+def test_403_then_drop(stub, upstream, video_url, run):
+    drop = 2 * CHUNK + 7
+    stub.update(formats=[FORMAT], fail403=1, drop=drop)
+    before = _upstream_bytes(upstream)
+
+    assert _stream(run, video_url) == expected_bytes(0, SIZE)
+    assert _upstream_bytes(upstream) - before == SIZE + drop % CHUNK
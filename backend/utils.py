@@ -1,7 +1,10 @@
 
 
 import re
+import random
+import string
 import unicodedata
+from typing import Optional, Tuple
 
 def sanitize_filename(title: str) -> str:
     # Normalize unicode (convert full-width characters to half-width)
@@ -19,3 +22,62 @@ def sanitize_playlist_filename(title: str) -> str:
     return f"{safe_title}_{short_hash}.zip"
 
 
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+def parse_content_range(header: Optional[str]) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    Parse `Content-Range: bytes start-end/total` into (start, end, total).
+    Missing or malformed headers give (None, None, None); an unknown total (`*`) gives None.
+    """
+    if not header:
+        return None, None, None
+    match = _CONTENT_RANGE_RE.match(header.strip())
+    if not match:
+        return None, None, None
+    start, end, total = match.groups()
+    return int(start), int(end), (None if total == "*" else int(total))
+
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Resolve a single-range `Range: bytes=a-b | a- | -n` header against `size`
+    into an inclusive (start, end). None means "send the whole thing" (no
+    header, or a form we may ignore such as multiple ranges).
+    Raises ValueError when the range can't be satisfied (→ 416).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip().replace(" ", ""))
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise ValueError(f"Unsatisfiable range {header!r}")
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None  # syntactically invalid — ignored, like a missing header
+    if start >= size:
+        raise ValueError(f"Unsatisfiable range {header!r} for {size} bytes")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Parse "SS", "MM:SS" or "HH:MM:SS(.ms)" into seconds.
+    Raises ValueError on anything else.
+    """
+    parts = value.strip().split(":")
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    return seconds
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from concurrency import EXTRACT_WORKERS
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ YoutubeDL Pool Configuration
+# ────────────────────────────────────────────────
+# Idle instances kept per option profile (an extraction thread holds at most one)
+YDL_POOL_SIZE = int(os.getenv("YDL_POOL_SIZE", str(EXTRACT_WORKERS)))
+# Distinct option profiles pooled; the least recently used one is dropped beyond this
+YDL_POOL_MAX_PROFILES = int(os.getenv("YDL_POOL_MAX_PROFILES", "16"))
+# Build instances and compile extractor URL patterns at startup (0 = on first use)
+YDL_POOL_WARM = os.getenv("YDL_POOL_WARM", "1") != "0"
+
+# Matched once at warm-up: compiles the URL regexes tried before YouTube's, ahead of the first request
+_WARM_URLS = ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "https://www.youtube.com/playlist?list=PL0")
+
+
+def _profile_key(opts: dict) -> Optional[str]:
+    """Stable key for an option dict, or None if it must not be shared between requests."""
+    if opts.get("cookiefile") or any(callable(v) or isinstance(v, list) for v in opts.values()):
+        return None  # per-user cookies, hooks, loggers
+    return json.dumps(opts, sort_keys=True, default=repr)
+
+
+class YoutubeDLPool:
+    """
+    Reusable `YoutubeDL` instances per option profile. Building one costs tens
+    of milliseconds (option parsing, extractor registry, networking setup) and
+    the first URL match in a process compiles the extractors' URL regexes; pooled
+    instances also keep their initialized extractors and upstream connections.
+
+    An instance is used by one thread at a time: `checkout()` hands out an
+    idle one or builds a new one. Cookies are cleared on return so nothing a
+    site set for one request leaks into another, and an instance whose
+    extraction raised is discarded. Profiles with per-request state (cookie
+    files, hooks, loggers) always get a fresh instance.
+
+    `yt_dlp` is imported on first use (or by the background warm-up), not at
+    app import, so the server starts accepting requests sooner.
+    """
+
+    def __init__(self, size: int = YDL_POOL_SIZE, max_profiles: int = YDL_POOL_MAX_PROFILES):
+        self.size = size
+        self.max_profiles = max_profiles
+        self._idle: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.ready = threading.Event()
+        self.warm_seconds: Optional[float] = None
+        self.warm_error: Optional[str] = None
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.unpooled = 0
+
+    @staticmethod
+    def _build(opts: dict):
+        import yt_dlp  # deferred: the heaviest import in the app
+        # Own copy: YoutubeDL keeps a reference to its params
+        return yt_dlp.YoutubeDL(dict(opts))
+
+    def acquire(self, opts: dict):
+        """Take an instance for exclusive use; hand it back with `release()`."""
+        key = _profile_key(opts)
+        if key is not None:
+            with self._lock:
+                idle = self._idle.get(key)
+                if idle:
+                    self._idle.move_to_end(key)
+                    self.reused += 1
+                    ydl = idle.pop()
+                    ydl._pool_key = key
+                    return ydl
+        ydl = self._build(opts)
+        ydl._pool_key = key
+        with self._lock:
+            self.created += 1
+            if key is None:
+                self.unpooled += 1
+        return ydl
+
+    def release(self, ydl, reusable: bool = True):
+        key = getattr(ydl, "_pool_key", None)
+        if key is not None and reusable:
+            try:
+                ydl.cookiejar.clear()
+            except Exception:
+                reusable = False
+        if key is None or not reusable:
+            self._close(ydl)
+            if key is not None:
+                with self._lock:
+                    self.discarded += 1
+            return
+
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.size:
+                idle.append(ydl)
+            else:
+                evicted.append(ydl)
+            while len(self._idle) > self.max_profiles:
+                _, dropped = self._idle.popitem(last=False)
+                evicted.extend(dropped)
+        for extra in evicted:
+            self._close(extra)
+
+    @staticmethod
+    def _close(ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning(f"⚠️ [YDL POOL] close failed: {e}")
+
+    @contextmanager
+    def checkout(self, opts: dict):
+        ydl = self.acquire(opts)
+        try:
+            yield ydl
+        except BaseException:
+            self.release(ydl, reusable=False)
+            raise
+        else:
+            self.release(ydl)
+
+    # ── warm-up ────────────────────────────────────────────────────
+    def warm(self, profiles: Iterable[dict]):
+        """Pre-build one instance per profile and compile extractor URL patterns."""
+        started = time.perf_counter()
+        try:
+            for opts in profiles:
+                ydl = self.acquire(opts)
+                for url in _WARM_URLS:
+                    for ie_key, ie in getattr(ydl, "_ies", {}).items():
+                        if ie.suitable(url):
+                            ydl.get_info_extractor(ie_key)
+                            break
+                self.release(ydl)
+            self.warm_seconds = time.perf_counter() - started
+            logger.info(f"🔥 [YDL POOL] warmed {len(self._idle)} profile(s) in {self.warm_seconds:.2f}s")
+        except Exception as e:
+            # Not fatal: extractions build their instances on demand
+            self.warm_error = f"{type(e).__name__}: {e}"
+            logger.warning(f"⚠️ [YDL POOL] warm-up failed: {self.warm_error}")
+        finally:
+            self.ready.set()
+
+    def warm_in_background(self, profiles: Iterable[dict]):
+        if not YDL_POOL_WARM:
+            self.ready.set()
+            return
+        profiles = list(profiles)
+        threading.Thread(target=self.warm, args=(profiles,), daemon=True, name="ydl-warm").start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "profiles": len(self._idle),
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "unpooled": self.unpooled,
+                "ready": int(self.ready.is_set()),
+            }
+
+
+ydl_pool = YoutubeDLPool()
@@ -0,0 +1,206 @@
+import os
+import time
+import asyncio
+import threading
+import zipfile
+import logging
+from typing import AsyncIterator, Optional
+
+from metrics import ZIP_APPEND_SECONDS, ZIP_BYTES
+from shared_state import shared_store, owner_token, owner_alive
+
+
+logger = logging.getLogger(__name__)
+
+
+# ────────────────────────────────────────────────
+# ⚙️ Archive Configuration
+# ────────────────────────────────────────────────
+ZIP_FOLLOW_CHUNK = 1024 * 1024
+ZIP_FOLLOW_POLL_INTERVAL = 0.25
+# Finished/failed archive rows are kept this long so late followers see the outcome
+ZIP_REGISTRY_RETENTION = 3600
+
+
+class _AppendOnlyFile:
+    """
+    File wrapper that reports itself as non-seekable.
+    zipfile then writes sizes/CRC into data descriptors after each entry instead
+    of seeking back to patch local headers, so bytes already on disk never
+    change and readers can safely stream the archive while it grows.
+    """
+
+    def __init__(self, path: str):
+        self._f = open(path, "wb")
+        self._pos = 0
+
+    def write(self, data) -> int:
+        n = self._f.write(data)
+        self._pos += n
+        return n
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seekable(self) -> bool:
+        return False
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class _ArchiveFollower:
+    """Tails a growing archive file until its `state` leaves "writing"."""
+
+    path: str
+    filename: str
+    state: str
+
+    @property
+    def complete(self) -> bool:
+        return self.state == "complete"
+
+    async def poll_state(self) -> str:
+        """Current state, read without blocking the event loop."""
+        return self.state
+
+    async def follow(self, chunk_size: int = ZIP_FOLLOW_CHUNK,
+                     poll_interval: float = ZIP_FOLLOW_POLL_INTERVAL) -> AsyncIterator[bytes]:
+        """
+        Stream the archive from byte 0, waiting for new entries until it is finalized.
+        """
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if chunk:
+                    yield chunk
+                    continue
+                state = await self.poll_state()
+                if state == "complete":
+                    # finalize() flushed everything before flipping state — drain the tail
+                    while chunk := await asyncio.to_thread(f.read, chunk_size):
+                        yield chunk
+                    return
+                if state == "failed":
+                    raise RuntimeError(f"Archive {self.filename} failed while streaming")
+                await asyncio.sleep(poll_interval)
+
+
+class StreamingZipArchive(_ArchiveFollower):
+    """
+    Playlist ZIP built incrementally: each finished video is appended (STORED,
+    ZIP64-capable — MP4s don't compress) and its source file deleted right away,
+    so disk holds roughly one copy instead of two and the archive is
+    downloadable from the first finished video onwards.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.state = "writing"  # writing → complete | failed
+        self.entries = 0
+        self._lock = threading.Lock()
+        self._fp = _AppendOnlyFile(path)
+        self._zip = zipfile.ZipFile(self._fp, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+
+    def add_file(self, src_path: str, arcname: Optional[str] = None, remove_source: bool = True):
+        arcname = arcname or os.path.basename(src_path)
+        with self._lock:
+            if self.state != "writing":
+                raise RuntimeError(f"Archive {self.filename} is {self.state}")
+            written = self._fp.tell()
+            with ZIP_APPEND_SECONDS.time():
+                self._zip.write(src_path, arcname)
+                self._fp.flush()
+            ZIP_BYTES.inc(self._fp.tell() - written)
+            self.entries += 1
+            _publish(self)
+        if remove_source:
+            os.remove(src_path)
+        logger.info(f"📦 [ZIP] appended '{arcname}' to {self.filename} ({self.entries} entries)")
+
+    def finalize(self):
+        with self._lock:
+            self._zip.close()
+            self._fp.close()
+            self.state = "complete"
+            _publish(self)
+        _active_archives.pop(self.filename, None)
+        logger.info(f"✅ [ZIP] finalized {self.filename} ({self.entries} entries)")
+
+    def abort(self):
+        with self._lock:
+            if self.state != "writing":
+                return
+            self.state = "failed"
+            self._zip.fp = None  # stop ZipFile.__del__ from writing an end record
+            try:
+                self._fp.close()
+            finally:
+                _publish(self)
+                _active_archives.pop(self.filename, None)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        logger.warning(f"⚠️ [ZIP] aborted {self.filename}")
+
+
+class SharedArchive(_ArchiveFollower):
+    """
+    Read-only view of an archive being written by another worker.
+    State comes from the shared registry (refreshed on a worker thread while
+    following); a writer that died mid-archive counts as failed.
+    """
+
+    def __init__(self, filename: str, path: str, owner: str, state: str = "writing"):
+        self.filename = filename
+        self.path = path
+        self.owner = owner
+        self.state = state
+
+    async def poll_state(self) -> str:
+        self.state = await asyncio.to_thread(self._load_state)
+        return self.state
+
+    def _load_state(self) -> str:
+        row = shared_store.query_one("SELECT state FROM archives WHERE filename = ?", (self.filename,))
+        if row is None:
+            return "failed"
+        if row["state"] == "writing" and not owner_alive(self.owner):
+            return "failed"
+        return row["state"]
+
+
+def _publish(archive: StreamingZipArchive):
+    """Mirror an archive's state into the host-wide registry (so any worker can serve it)."""
+    shared_store.execute(
+        "INSERT OR REPLACE INTO archives (filename, path, owner, state, entries, updated) VALUES (?, ?, ?, ?, ?, ?)",
+        (archive.filename, archive.path, owner_token(), archive.state, archive.entries, time.time()),
+    )
+
+
+# filename → archive being written by this process
+_active_archives: dict[str, StreamingZipArchive] = {}
+
+
+def open_archive(path: str) -> StreamingZipArchive:
+    archive = StreamingZipArchive(path)
+    _active_archives[archive.filename] = archive
+    shared_store.execute("DELETE FROM archives WHERE state != 'writing' AND updated < ?",
+                         (time.time() - ZIP_REGISTRY_RETENTION,))
+    _publish(archive)
+    return archive
+
+
+def get_active_archive(filename: str) -> Optional[_ArchiveFollower]:
+    """The archive still being written under `filename`, by this or any other worker."""
+    local = _active_archives.get(filename)
+    if local is not None:
+        return local
+    row = shared_store.query_one("SELECT path, owner FROM archives WHERE filename = ? AND state = 'writing'",
+                                 (filename,))
+    if row is None:
+        return None
+    return SharedArchive(filename, row["path"], row["owner"])
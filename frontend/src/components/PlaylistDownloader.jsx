@@ -14,26 +14,75 @@ export default function PlaylistDownloader() {
   const [downloadLogs, setDownloadLogs] = useState([]);
   const [isDownloading, setIsDownloading] = useState(false);
   const [progressMap, setProgressMap] = useState({});
+  const [nextOffset, setNextOffset] = useState(null);
   const logContainerRef = useRef(null);
+  const zipStartedRef = useRef(false);
+
+  // 📦 Open the ZIP link once (archive streams while later videos finish)
+  const startZipDownload = (zipUrl) => {
+    if (!zipUrl || zipStartedRef.current) return;
+    zipStartedRef.current = true;
+    const link = document.createElement("a");
+    link.href = `${BACKEND_URL}${zipUrl}`;
+    link.setAttribute("download", "");
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+  };
+
+  // 🧭 Stream one page of playlist entries (NDJSON) — rows render as they arrive
+  const fetchPlaylistPage = async (offset) => {
+    const params = new URLSearchParams({ url, offset: String(offset) });
+    const response = await fetch(`${BACKEND_URL}/preview/playlist?${params}`, {
+      headers: { 'ngrok-skip-browser-warning': '1' },
+    });
+    if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder("utf-8");
+    let buffer = "";
+    let received = 0;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+
+      const entries = [];
+      for (const line of lines) {
+        if (!line.trim()) continue;
+        const json = JSON.parse(line);
+        if (json.event === "playlist") {
+          setPlaylistTitle(json.playlist_title || "");
+        } else if (json.event === "entry") {
+          entries.push(json);
+        } else if (json.event === "page_end") {
+          setNextOffset(json.has_more ? json.next_offset : null);
+        } else if (json.event === "error") {
+          throw new Error(json.message);
+        }
+      }
+      if (entries.length) {
+        received += entries.length;
+        setPlaylist((prev) => [...prev, ...entries]);
+        setSelectedVideos((prev) => [...prev, ...entries.map((v) => v.id)]); // Select all
+      }
+    }
+    return received;
+  };
 
-  // 🧭 Fetch playlist metadata
   const fetchPlaylist = async () => {
     if (!url.trim()) return alert("Paste a valid YouTube playlist link!");
     setLoading(true);
+    setPlaylist([]);
+    setSelectedVideos([]);
+    setNextOffset(null);
     try {
-      const res = await axios.get(`${BACKEND_URL}/preview`, {
-        params: { url, type: "playlist" },
-        headers: { 
-          'Accept': 'application/json',
-          'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': '1'
-        }
-      });
-      const videos = res.data.videos || [];
-      setPlaylist(videos);
-      setSelectedVideos(videos.map((v) => v.id)); // Select all
-      setPlaylistTitle(res.data.playlist_title || "");
-      if (videos.length === 0) alert("No videos found in playlist!");
+      const received = await fetchPlaylistPage(0);
+      if (received === 0) alert("No videos found in playlist!");
     } catch (err) {
       console.error(err);
       alert("❌ Failed to fetch playlist!");
@@ -42,6 +91,19 @@ export default function PlaylistDownloader() {
     }
   };
 
+  const loadMore = async () => {
+    if (nextOffset === null) return;
+    setLoading(true);
+    try {
+      await fetchPlaylistPage(nextOffset);
+    } catch (err) {
+      console.error(err);
+      alert("❌ Failed to load more videos!");
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // ✅ Toggle video selection
   const toggleSelect = (id) => {
     setSelectedVideos((prev) =>
@@ -59,30 +121,90 @@ export default function PlaylistDownloader() {
 
     setIsDownloading(true);
     setDownloadLogs(["🚀 Starting playlist download..."]);
+    zipStartedRef.current = false;
 
-    try {
-      const response = await fetch(`${BACKEND_URL}/downloadplaylist`, {
-        method: "POST",
-        headers: { 
-          'Accept': 'application/json',
-          'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': '1'
-        },
-        body: JSON.stringify({
-          url,
-          download_path: downloadPath,
-          mode: "playlist",
-          video_ids: selectedVideos,
-          playlist_title: playlistTitle,
-        }),
-      });
+    // 🔁 The job outlives the connection: keep its id and the last event seen,
+    // and if the stream drops before the job ends, reconnect with Last-Event-ID
+    let jobId = null;
+    let lastEventId = null;
+    let finished = false;
 
-      if (!response.ok || !response.body) {
-        setDownloadLogs((prev) => [...prev, "❌ Failed to start download"]);
-        setIsDownloading(false);
-        return;
+    const handleEvent = (json) => {
+      let logEntry = "";
+
+      switch (json.event) {
+        case "job":
+          jobId = json.job_id;
+          logEntry = `🧾 Job ${json.job_id} started`;
+          break;
+
+        case "status":
+          logEntry = `ℹ️ ${json.message}`;
+          break;
+
+        case "resumed":
+          // The server restarted mid-job and rebuilds the ZIP — fetch it again when ready
+          logEntry = `${json.message}`;
+          zipStartedRef.current = false;
+          break;
+
+        case "progress": {
+          logEntry = `⬇️ ${json.filename} | ${json.percent} @ ${json.speed} (ETA ${json.eta})`;
+          const match = json.filename.match(/^(\d+)\s*-/);
+          if (match) {
+            const index = parseInt(match[1]) - 1;
+            const video = playlist[index];
+            if (video?.id) {
+              setProgressMap((prev) => ({
+                ...prev,
+                [video.id]: json.percent,
+              }));
+            }
+          }
+          break;
+        }
+
+        case "queued":
+          logEntry = `${json.message}`;
+          break;
+
+        case "video_finished":
+          logEntry = `✅ Finished: ${json.filename}`;
+          break;
+
+        case "log":
+          logEntry = `${json.message}`;
+          break;
+
+        case "archive_ready":
+          logEntry = `📦 ${json.message}`;
+          startZipDownload(json.zip_url);
+          break;
+
+        case "completed":
+          logEntry = `✅ ${json.message}`;
+          // ✅ FIXED: use zip_url instead of zip_filename
+          startZipDownload(json.zip_url);
+          finished = true;
+          setIsDownloading(false);
+          break;
+
+        case "error":
+          logEntry = `❌ ${json.message}`;
+          if (json.video_index === undefined) {
+            finished = true;
+            setIsDownloading(false);
+          }
+          break;
+
+        default:
+          logEntry = JSON.stringify(json);
       }
 
+      setDownloadLogs((prev) => [...prev, logEntry]);
+    };
+
+    const readStream = async (response) => {
       const reader = response.body.getReader();
       const decoder = new TextDecoder("utf-8");
       let buffer = "";
@@ -96,72 +218,73 @@ export default function PlaylistDownloader() {
         buffer = parts.pop();
 
         for (const part of parts) {
-          if (!part.startsWith("data:")) continue;
+          let data = null;
+          for (const line of part.split("\n")) {
+            if (line.startsWith("id:")) lastEventId = line.slice(3).trim();
+            else if (line.startsWith("data:")) data = line.slice(5).trim();
+          }
+          if (!data) continue;
 
           try {
-            const json = JSON.parse(part.replace("data: ", ""));
-            let logEntry = "";
-
-            switch (json.event) {
-              case "status":
-                logEntry = `ℹ️ ${json.message}`;
-                break;
-
-              case "progress": {
-                logEntry = `⬇️ ${json.filename} | ${json.percent} @ ${json.speed} (ETA ${json.eta})`;
-                const match = json.filename.match(/^(\d+)\s*-/);
-                if (match) {
-                  const index = parseInt(match[1]) - 1;
-                  const video = playlist[index];
-                  if (video?.id) {
-                    setProgressMap((prev) => ({
-                      ...prev,
-                      [video.id]: json.percent,
-                    }));
-                  }
-                }
-                break;
-              }
-
-              case "video_finished":
-                logEntry = `✅ Finished: ${json.filename}`;
-                break;
-
-              case "log":
-                logEntry = `${json.message}`;
-                break;
-
-              case "completed":
-                logEntry = `✅ ${json.message}`;
-                // ✅ FIXED: use zip_url instead of zip_filename
-                if (json.zip_url) {
-                  const link = document.createElement("a");
-                  link.href = `${BACKEND_URL}${json.zip_url}`;
-                  link.setAttribute("download", "");
-                  document.body.appendChild(link);
-                  link.click();
-                  document.body.removeChild(link);
-                }
-                setIsDownloading(false);
-                break;
-
-              case "error":
-                logEntry = `❌ ${json.message}`;
-                setIsDownloading(false);
-                break;
-
-              default:
-                logEntry = JSON.stringify(json);
-            }
-
-            setDownloadLogs((prev) => [...prev, logEntry]);
+            handleEvent(JSON.parse(data));
           } catch (err) {
             console.error("SSE parse error:", err);
           }
         }
       }
+    };
+
+    try {
+      const response = await fetch(`${BACKEND_URL}/downloadplaylist`, {
+        method: "POST",
+        headers: { 
+          'Accept': 'application/json',
+          'Content-Type': 'application/json',
+          'ngrok-skip-browser-warning': '1'
+        },
+        body: JSON.stringify({
+          url,
+          download_path: downloadPath,
+          mode: "playlist",
+          video_ids: selectedVideos,
+          playlist_title: playlistTitle,
+        }),
+      });
+
+      if (!response.ok || !response.body) {
+        setDownloadLogs((prev) => [...prev, "❌ Failed to start download"]);
+        setIsDownloading(false);
+        return;
+      }
+
+      await readStream(response);
     } catch (err) {
       console.error("Stream error:", err);
+    }
+
+    // 🔌 Dropped before the job ended — resume from the last event we saw
+    for (let attempt = 1; !finished && jobId && attempt <= 8; attempt++) {
+      const delay = Math.min(1000 * 2 ** (attempt - 1), 15000);
+      setDownloadLogs((prev) => [...prev, `🔌 Connection lost — reconnecting in ${delay / 1000}s...`]);
+      await new Promise((resolve) => setTimeout(resolve, delay));
+      try {
+        const response = await fetch(`${BACKEND_URL}/jobs/${jobId}/events`, {
+          headers: {
+            'Accept': 'text/event-stream',
+            'ngrok-skip-browser-warning': '1',
+            ...(lastEventId ? { 'Last-Event-ID': lastEventId } : {}),
+          },
+        });
+        if (response.status === 404) break;
+        if (!response.ok || !response.body) continue;
+        attempt = 0;  // connected — the backoff starts over on the next drop
+        await readStream(response);
+      } catch (err) {
+        console.error("Reconnect error:", err);
+      }
+    }
+
+    if (!finished) {
       setDownloadLogs((prev) => [...prev, "❌ Stream error occurred."]);
       setIsDownloading(false);
     }
@@ -225,7 +348,7 @@ export default function PlaylistDownloader() {
                 Title: <b>{playlistTitle}</b>
               </p>
               <p className="text-sm text-gray-600">
-                Total Videos: <b>{playlist.length}</b> | Duration:{" "}
+                Total Videos: <b>{playlist.length}{nextOffset !== null ? "+" : ""}</b> | Duration:{" "}
                 <b>{formatTime(totalDuration)}</b>
               </p>
             </div>
@@ -287,6 +410,18 @@ export default function PlaylistDownloader() {
             ))}
           </div>
 
+          {nextOffset !== null && (
+            <div className="flex justify-center mt-3">
+              <button
+                onClick={loadMore}
+                disabled={loading}
+                className="px-4 py-2 rounded bg-gray-200 hover:bg-gray-300"
+              >
+                {loading ? "⏳ Loading..." : "Load more videos"}
+              </button>
+            </div>
+          )}
+
           {/* Download Button */}
           <div className="flex justify-end mt-4">
             <button
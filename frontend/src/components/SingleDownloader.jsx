@@ -15,6 +15,7 @@ export default function SingleDownloader() {
   const [selectedVideo, setSelectedVideo] = useState("");
   const [selectedAudio, setSelectedAudio] = useState("");
   const [mode, setMode] = useState("merged");
+  const [audioCodec, setAudioCodec] = useState("mp3");
   const [downloading, setDownloading] = useState(false);
   const [progress, setProgress] = useState(0);
   const [fetchType, setFetchType] = useState("single");
@@ -38,7 +39,7 @@ export default function SingleDownloader() {
     setPreview(null);
     try {
       const res = await axios.get(`${BACKEND_URL}/preview`, { 
-        params: { url, type: fetchType } ,
+        params: { url, type: fetchType, urls: 1 } ,  // urls=1 → preview_url for the inline player
         headers: { 
           'Accept': 'application/json',
           'Content-Type': 'application/json',
@@ -88,24 +89,47 @@ export default function SingleDownloader() {
     setDownloading(true);
     setProgress(0);
 
+    const request = {
+      type: preview.type,
+      url,
+      mode,
+      video_id: selectedVideo,
+      audio_id: selectedAudio,
+      audio_codec: mode === "audio" ? audioCodec : undefined,
+      start_time: secondsToTime(startTime),
+      end_time: secondsToTime(endTime),
+    };
+    const headers = {
+      'Accept': 'application/json',
+      'Content-Type': 'application/json',
+      'ngrok-skip-browser-warning': '1'
+    };
+
+    // 🔗 Untrimmed single-format videos: hand a seekable link to the browser's
+    // download manager, which can pause / resume it (backend answers 409 otherwise)
+    if (mode === "video") {
+      try {
+        const { data } = await axios.post(`${BACKEND_URL}/download/link`, request, { headers });
+        const a = document.createElement("a");
+        a.href = `${BACKEND_URL}${data.url}`;
+        a.setAttribute("download", data.filename);
+        document.body.appendChild(a);
+        a.click();
+        a.remove();
+        setShowDownloadModal(false);
+        setDownloading(false);
+        return;
+      } catch (err) {
+        if (err.response?.status !== 409) console.error(err);
+      }
+    }
+
     try {
       const response = await axios.post(
         `${BACKEND_URL}/download`,
+        request,
         {
-          type: preview.type,
-          url,
-          mode,
-          video_id: selectedVideo,
-          audio_id: selectedAudio,
-          start_time: secondsToTime(startTime),
-          end_time: secondsToTime(endTime),
-        },
-        {
-        headers: { 
-          'Accept': 'application/json',
-          'Content-Type': 'application/json',
-          'ngrok-skip-browser-warning': '1'
-        },
+        headers,
         responseType: "blob",
         onDownloadProgress: (e) => e.total && setProgress(Math.round((e.loaded * 100) / e.total)),
         }
@@ -115,7 +139,8 @@ export default function SingleDownloader() {
       const downloadUrl = window.URL.createObjectURL(blob);
       const a = document.createElement("a");
       a.href = downloadUrl;
-      a.download = `${preview.title || "video"}_${secondsToTime(startTime)}_to_${secondsToTime(endTime)}.mp4`;
+      const ext = mode === "audio" ? audioCodec : "mp4";
+      a.download = `${preview.title || "video"}_${secondsToTime(startTime)}_to_${secondsToTime(endTime)}.${ext}`;
       document.body.appendChild(a);
       a.click();
       a.remove();
@@ -177,7 +202,7 @@ export default function SingleDownloader() {
               onLoadedMetadata={handleLoadedMetadata}
               className="w-full max-w-2xl rounded-lg"
               poster={preview.thumbnail}
-              src={preview.combined_formats?.[0]?.url || preview.video_formats?.[0]?.url}
+              src={preview.preview_url}
             ></video>
 
             <h2 className="text-lg font-semibold mt-3">{preview.title}</h2>
@@ -247,6 +272,21 @@ export default function SingleDownloader() {
                   </div>
                 )}
 
+                {mode === "audio" && (
+                  <div className="mb-3">
+                    <label className="font-medium">Audio Codec:</label>
+                    <select
+                      value={audioCodec}
+                      onChange={(e) => setAudioCodec(e.target.value)}
+                      className="border p-2 rounded mt-2 w-full"
+                    >
+                      <option value="mp3">MP3</option>
+                      <option value="opus">Opus</option>
+                      <option value="aac">AAC</option>
+                    </select>
+                  </div>
+                )}
+
                 {/* Trimming Slider */}
                 {duration > 0 && (
                   <div className="w-full mt-6 border-t pt-4">